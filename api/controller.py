@@ -1,17 +1,69 @@
-import threading
-from monitoring import start_monitoring_cameras_with_fallback
+import asyncio
+from functools import partial
+from api.jobs import JobManager
+from monitoring import (
+    PATROL_CAPTURE_MODE,
+    camera_scheduler,
+    list_inventory_cameras,
+    load_controller,
+    start_monitoring_cameras_with_fallback,
+)
+from runtime.admission import PRIORITIES
+from runtime.patrol import PatrolScheduler
 
 # Para controlar threads abertas e evitar conflitos, vamos guardar as threads ativas
 active_threads = []
 
-async def handle_set_cameras(camera_id: int, recorder_guid: str):
+job_manager = JobManager(start_monitoring_cameras_with_fallback)
+
+# Varreduras da patrulha no modo de captura barato (keyframes), escalando só com candidato
+patrol = PatrolScheduler(partial(start_monitoring_cameras_with_fallback, capture_mode=PATROL_CAPTURE_MODE,
+                                 report_errors=False),
+                         list_inventory_cameras)
+
+
+async def handle_set_cameras(camera_id: int, recorder_guid: str, priority: str = "alarm"):
     # Pode ser uma lista para futuras expansões
     cameras_to_start = [(camera_id, recorder_guid)]
 
-    # Iniciar monitoramento das câmeras recebidas
-    threads = start_monitoring_cameras_with_fallback(cameras_to_start)
+    # Iniciar monitoramento das câmeras recebidas (fora do event loop: acessa banco e cria threads)
+    threads = await asyncio.to_thread(start_monitoring_cameras_with_fallback, cameras_to_start, PRIORITIES[priority])
 
     # Guardar as threads ativas para controle futuro, caso queira parar depois
     active_threads.extend(threads)
 
     return {"message": "Monitoramento iniciado para a(s) câmera(s)", "cameras": cameras_to_start}
+
+
+async def handle_set_cameras_batch(cameras, priority: str = "routine"):
+    # Remove duplicadas mantendo a ordem
+    cameras_to_start = list(dict.fromkeys((c.camera_id, c.recorder_guid) for c in cameras))
+    job = job_manager.submit(cameras_to_start, priority=PRIORITIES[priority])
+    return {"message": "Monitoramento agendado", "job_id": job.id, "total": len(cameras_to_start)}
+
+
+async def handle_job_status(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return None
+    return job.to_dict()
+
+
+async def handle_scheduler_status():
+    return {**camera_scheduler.stats(), "sampling": load_controller.stats()}
+
+
+async def handle_patrol_start(cameras=None, budget=None):
+    cameras_to_patrol = [(c.camera_id, c.recorder_guid) for c in cameras] if cameras else None
+    started = patrol.start(cameras_to_patrol, budget)
+    message = "Patrulha iniciada" if started else "Patrulha já em execução (configuração atualizada)"
+    return {"message": message, "cameras": len(cameras_to_patrol) if cameras_to_patrol else "todas"}
+
+
+async def handle_patrol_stop():
+    patrol.stop()
+    return {"message": "Patrulha interrompida"}
+
+
+async def handle_patrol_status():
+    return patrol.stats()
@@ -0,0 +1,101 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_STORED_JOBS = 1000
+JOB_SETUP_WORKERS = 4
+
+JOB_STATUS_PENDING = "pending"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_FINISHED = "finished"
+JOB_STATUS_FAILED = "failed"
+
+CAMERA_STATUS_PENDING = "pending"
+CAMERA_STATUS_NOT_FOUND = "not_found"
+
+
+class Job:
+    def __init__(self, cameras):
+        self.id = uuid.uuid4().hex
+        self.cameras = cameras
+        self.created_at = time.time()
+        self.status = JOB_STATUS_PENDING
+        self.error = None
+        self.threads = None
+
+    def current_status(self):
+        """Status do job a partir das câmeras: só termina quando a última análise terminar."""
+        if self.status != JOB_STATUS_RUNNING or self.threads is None:
+            return self.status
+        if any(thread.finished_at is None for thread in self.threads):
+            return JOB_STATUS_RUNNING
+        return JOB_STATUS_FINISHED
+
+    def to_dict(self):
+        threads = {}
+        for thread in self.threads or []:
+            threads[(thread.dguard_camera_id, thread.recorder_guid)] = thread
+
+        cameras = []
+        for camera_id, recorder_guid in self.cameras:
+            thread = threads.get((camera_id, recorder_guid))
+            entry = {"camera_id": camera_id, "recorder_guid": recorder_guid}
+            if thread is None:
+                entry["status"] = CAMERA_STATUS_PENDING if self.threads is None else CAMERA_STATUS_NOT_FOUND
+            else:
+                entry.update({
+                    "camera_name": thread.camera_name,
+                    "recorder_name": thread.recorder_name,
+                    "status": thread.status,
+                    "person_detected": thread.person_detected,
+                    "queued_at": thread.queued_at,
+                    "started_at": thread.started_at,
+                    "finished_at": thread.finished_at,
+                })
+            cameras.append(entry)
+
+        return {
+            "job_id": self.id,
+            "status": self.current_status(),
+            "error": self.error,
+            "created_at": self.created_at,
+            "cameras": cameras,
+        }
+
+
+class JobManager:
+    """
+    Recebe lotes de câmeras, faz o trabalho bloqueante (banco, criação das
+    threads) fora do event loop do uvicorn e guarda o progresso por job.
+    """
+
+    def __init__(self, start_cameras, max_jobs=MAX_STORED_JOBS, workers=JOB_SETUP_WORKERS):
+        self.start_cameras = start_cameras
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="JobSetup")
+
+    def submit(self, cameras, **start_kwargs):
+        job = Job(cameras)
+        with self.lock:
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.max_jobs:
+                self.jobs.popitem(last=False)
+        self.executor.submit(self._run, job, start_kwargs)
+        return job
+
+    def _run(self, job, start_kwargs):
+        job.status = JOB_STATUS_RUNNING
+        try:
+            # Continua "running" até as análises das câmeras terminarem (ver current_status)
+            job.threads = self.start_cameras(job.cameras, **start_kwargs)
+        except Exception as e:
+            job.error = str(e)
+            job.status = JOB_STATUS_FAILED
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
@@ -1,6 +1,8 @@
-from fastapi import APIRouter
+from typing import List, Literal, Optional
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from api.controller import handle_set_cameras
+from api.controller import (handle_job_status, handle_patrol_start, handle_patrol_status, handle_patrol_stop,
+                            handle_scheduler_status, handle_set_cameras, handle_set_cameras_batch)
 
 router = APIRouter()
 
@@ -8,9 +10,63 @@ router = APIRouter()
 class CameraRequest(BaseModel):
     camera_id: int
     recorder_guid: str
+    # "alarm" passa na frente das checagens de rotina na fila de análise
+    priority: Literal["alarm", "routine"] = "alarm"
+
+
+class BatchCameraRequest(BaseModel):
+    cameras: List[CameraRequest]
+    priority: Literal["alarm", "routine"] = "routine"
+
+
+class PatrolCamera(BaseModel):
+    camera_id: int
+    recorder_guid: str
+
+
+class PatrolRequest(BaseModel):
+    # Sem lista: patrulha todo o inventário do database.db
+    cameras: Optional[List[PatrolCamera]] = None
+    budget: Optional[int] = None
 
 
 @router.post("/set-cameras")
 async def set_cameras(request: CameraRequest):
     # Passa para o controller que executa o monitoramento
-    return await handle_set_cameras(request.camera_id, request.recorder_guid)
+    return await handle_set_cameras(request.camera_id, request.recorder_guid, request.priority)
+
+
+@router.post("/set-cameras/batch")
+async def set_cameras_batch(request: BatchCameraRequest):
+    # Retorna na hora com o id do job; o progresso é consultado em /jobs/{job_id}
+    return await handle_set_cameras_batch(request.cameras, request.priority)
+
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    status = await handle_job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return status
+
+
+@router.get("/scheduler")
+async def scheduler_status():
+    # Profundidade da fila e tempos de espera do scheduler de câmeras
+    return await handle_scheduler_status()
+
+
+@router.post("/patrol/start")
+async def patrol_start(request: PatrolRequest):
+    return await handle_patrol_start(request.cameras, request.budget)
+
+
+@router.post("/patrol/stop")
+async def patrol_stop():
+    return await handle_patrol_stop()
+
+
+@router.get("/patrol")
+async def patrol_status():
+    # Intervalo de revisita alcançado por câmera
+    return await handle_patrol_status()
@@ -0,0 +1,119 @@
+"""
+Compara latência e precisão dos backends de inferência em frames das nossas câmeras.
+
+Uso:
+    python -m benchmarks.backend_benchmark --frames models/calibration
+    python -m benchmarks.backend_benchmark --frames models/calibration --backends pytorch onnx onnx-int8 openvino-int8
+    python -m benchmarks.backend_benchmark --frames models/calibration --backends onnx onnx-dynamic openvino openvino-dynamic
+
+Sufixos: -int8 (quantizado) e -dynamic (export com forma dinâmica em vez da
+entrada fixa INPUT_SIZE), combináveis: openvino-int8-dynamic.
+
+A precisão é medida contra o PyTorch FP32 (referência): uma detecção conta como
+acerto quando tem IoU >= 0.5 com uma pessoa detectada pela referência.
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from detection.postprocess import boxes_to_arrays
+from detection.tracker import iou_matrix
+from inference.backends import BACKEND_PYTORCH, DEFAULT_MODEL_PATH, INPUT_SIZE, load_model
+
+CONFIDENCE_THRESHOLD = 0.5
+IOU_MATCH = 0.5
+
+
+def parse_backend(name):
+    backend, *flags = name.split("-")
+    return backend, "int8" in flags, "dynamic" in flags
+
+
+def count_matches(reference, candidate):
+    ious = iou_matrix(reference, candidate)
+    matched = 0
+    used = set()
+    for i in range(len(reference)):
+        if ious.shape[1] == 0:
+            break
+        j = int(np.argmax(ious[i]))
+        if ious[i, j] >= IOU_MATCH and j not in used:
+            used.add(j)
+            matched += 1
+    return matched
+
+
+def run_backend(model, frames, warmup=3):
+    kwargs = dict(classes=[0], conf=CONFIDENCE_THRESHOLD, imgsz=INPUT_SIZE, verbose=False)
+    for frame in frames[:warmup]:
+        model(frame, **kwargs)
+
+    latencies = []
+    detections = []
+    for frame in frames:
+        started = time.perf_counter()
+        result = model(frame, **kwargs)
+        latencies.append((time.perf_counter() - started) * 1000)
+        detections.append(boxes_to_arrays(result)[0])
+    return latencies, detections
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de backends de inferência")
+    parser.add_argument("--frames", required=True, help="Pasta com frames .jpg das câmeras")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--backends", nargs="+", default=["pytorch", "onnx", "onnx-int8", "openvino", "openvino-int8"])
+    parser.add_argument("--calibration", default=None, help="Pasta de frames para calibração INT8 (padrão: --frames)")
+    parser.add_argument("--limit", type=int, default=200)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.frames, "*.jpg")))[:args.limit]
+    frames = [frame for frame in (cv2.imread(path) for path in paths) if frame is not None]
+    if not frames:
+        print(f"Nenhum frame encontrado em {args.frames}")
+        return
+
+    calibration_dir = args.calibration or args.frames
+    reference = None
+    rows = []
+
+    names = args.backends if "pytorch" in args.backends else ["pytorch"] + args.backends
+    for name in names:
+        backend, int8, dynamic = parse_backend(name)
+        try:
+            model = load_model(backend, args.model, int8=int8, calibration_dir=calibration_dir, dynamic=dynamic)
+        except Exception as e:
+            print(f"[{name}] indisponível: {e}")
+            continue
+
+        latencies, detections = run_backend(model, frames)
+        if backend == BACKEND_PYTORCH and not int8:
+            reference = detections
+
+        ref_total = sum(len(d) for d in reference) if reference else 0
+        cand_total = sum(len(d) for d in detections)
+        matched = sum(count_matches(r, c) for r, c in zip(reference, detections)) if reference else 0
+
+        rows.append({
+            "backend": name,
+            "mean_ms": statistics.mean(latencies),
+            "p50_ms": statistics.median(latencies),
+            "p95_ms": sorted(latencies)[int(0.95 * (len(latencies) - 1))],
+            "recall": matched / ref_total if ref_total else 1.0,
+            "precision": matched / cand_total if cand_total else 1.0,
+        })
+
+    print(f"\n{len(frames)} frames, entrada {INPUT_SIZE[1]}x{INPUT_SIZE[0]}, referência: pytorch FP32\n")
+    print(f"{'backend':<16}{'média ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'recall':>10}{'precisão':>10}")
+    for row in rows:
+        print(f"{row['backend']:<16}{row['mean_ms']:>10.1f}{row['p50_ms']:>10.1f}{row['p95_ms']:>10.1f}"
+              f"{row['recall']:>10.1%}{row['precision']:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Compara o crawl de inventário serial x concorrente contra uma API do Station falsa local.
+
+Uso:
+    python -m benchmarks.crawler_benchmark --recorders 50 --cameras 16 --latency 0.05
+
+O modo serial é o próprio StationCrawler com uma requisição por vez, que
+reproduz a ordem de chamadas do camera_fetcher.build_full_recorder_list.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from camera_discovery.concurrent_fetcher import StationCrawler
+
+
+def make_handler(recorders, cameras, streams, latency):
+    routes = [
+        (re.compile(r"^/servers$"), lambda m: {
+            "servers": [{"name": f"REC_{i}", "guid": f"{{REC-{i}}}"} for i in range(recorders)]
+        }),
+        (re.compile(r"^/servers/([^/]+)/cameras$"), lambda m: {
+            "cameras": [{"name": f"cam_{c}", "id": c} for c in range(cameras)]
+        }),
+        (re.compile(r"^/servers/([^/]+)/cameras/(\d+)/streams$"), lambda m: {
+            "streams": [{"id": s} for s in range(streams)]
+        }),
+        (re.compile(r"^/servers/([^/]+)/cameras/(\d+)/streams/(\d+)/remote-url$"), lambda m: {
+            "remoteUrl": {
+                "url": f"rtsp://10.0.0.1/{m.group(1)}/{m.group(2)}/{m.group(3)}",
+                "username": "user",
+                "password": "pass"
+            }
+        }),
+    ]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency)
+            for pattern, build in routes:
+                match = pattern.match(self.path)
+                if match:
+                    body = json.dumps(build(match)).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+            self.send_error(404)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def run(base_url, **crawler_kwargs):
+    crawler = StationCrawler(base_url=base_url, headers={}, **crawler_kwargs)
+    started = time.perf_counter()
+    data = crawler.crawl()
+    elapsed = time.perf_counter() - started
+    crawler.close()
+    return data, elapsed, crawler.requests_made
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do crawl de inventário")
+    parser.add_argument("--recorders", type=int, default=20)
+    parser.add_argument("--cameras", type=int, default=16)
+    parser.add_argument("--streams", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.02, help="Latência simulada por requisição (s)")
+    parser.add_argument("--in-flight", type=int, default=16)
+    parser.add_argument("--per-recorder", type=int, default=4)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0),
+                                 make_handler(args.recorders, args.cameras, args.streams, args.latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    try:
+        serial, serial_time, serial_requests = run(base_url, max_in_flight=1, max_per_recorder=None, max_recorders=1)
+        concurrent, concurrent_time, concurrent_requests = run(
+            base_url, max_in_flight=args.in_flight, max_per_recorder=args.per_recorder
+        )
+    finally:
+        server.shutdown()
+
+    print(f"\nInventário: {args.recorders} recorders x {args.cameras} câmeras x {args.streams} streams, "
+          f"latência {args.latency * 1000:.0f}ms")
+    print(f"Serial:      {serial_time:7.2f}s ({serial_requests} requisições)")
+    print(f"Concorrente: {concurrent_time:7.2f}s ({concurrent_requests} requisições, "
+          f"{args.in_flight} em voo, {args.per_recorder} por recorder)")
+    print(f"Ganho:       {serial_time / concurrent_time:7.1f}x")
+    print(f"Mesma saída: {'sim' if serial == concurrent else 'NÃO'}")
+
+
+if __name__ == "__main__":
+    main()
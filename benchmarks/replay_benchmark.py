@@ -0,0 +1,523 @@
+"""
+Benchmark do pipeline de câmera sem câmeras RTSP: arquivos de vídeo locais (ou
+o testsrc do ffmpeg, opcionalmente com uma imagem de pessoa se movendo)
+alimentam a CameraThread de produção (monitoring.py) por uma sessão de stream
+lida do arquivo. Motion gate, recorte de ROI, tracking, amostragem adaptativa e
+a confirmação do modo keyframe entram na medição exatamente como rodam nas
+câmeras. A API do Station não é chamada; os eventos que iriam para ela são
+contados por variante.
+
+Uso:
+    python -m benchmarks.replay_benchmark --videos gravacoes/*.mp4 --cameras 8 --duration 60
+    python -m benchmarks.replay_benchmark --synthetic --person-image pessoa.png --cameras 4 \\
+        --variant "full:capture_mode=full" --variant "scaled:capture_mode=scaled,analysis_fps=5" \\
+        --variant "keyframe:capture_mode=keyframe" --variant "tracking:tracking=true,roi_crop=true"
+    python -m benchmarks.replay_benchmark --videos gravacoes/*.mp4 --output atual.json --baseline base.json
+
+Cada --variant sobrescreve parâmetros da linha de comando (capture_mode,
+analysis_fps, process_every, batch, batch_size, backend, int8, cameras,
+motion_gate, tracking, roi_crop, adaptive_sampling). Os resultados são
+comparados com a primeira variante e, se informado, com um --baseline salvo
+antes (--output); pioras acima de --tolerance são marcadas como regressão, e
+com --baseline o processo sai com código 1 para acusar a regressão.
+
+Precisa do zones.json e do database.db do servidor, como o próprio monitoring.py.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import types
+
+import cv2
+import numpy as np
+import psutil
+
+# Sem login no Station: o config real autentica na importação
+if "config.config" not in sys.modules:
+    _config = types.ModuleType("config.config")
+    _config.HEADERS = {}
+    sys.modules["config.config"] = _config
+
+import events.coalescer as coalescer  # noqa: E402
+import monitoring  # noqa: E402
+from detection.roi import compile_rois  # noqa: E402
+from detection.zones import CompiledZone  # noqa: E402
+from inference.backends import (  # noqa: E402
+    BACKEND_PYTORCH,
+    DEFAULT_MODEL_PATH,
+    INPUT_SIZE,
+    is_static,
+    load_model,
+    model_batch_limit,
+)
+from inference.batch_engine import BatchInferenceEngine  # noqa: E402
+from streams.ffmpeg_reader import (  # noqa: E402
+    CAPTURE_MODE_FULL,
+    CAPTURE_MODES,
+    SCALED_CAPTURE_MODES,
+    FreshestFFmpegFrame,
+    build_ffmpeg_cmd,
+    log_ffmpeg_errors,
+)
+from streams.session_manager import StreamSession, StreamSessionManager  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+RESIZE_WIDTH = monitoring.RESIZE_WIDTH
+RESIZE_HEIGHT = monitoring.RESIZE_HEIGHT
+RECORDER_GUID = "replay"
+SYNTHETIC_SIZE = (1920, 1080)
+SYNTHETIC_FPS = 25
+MEMORY_SAMPLE_INTERVAL = 0.5
+
+# Zona padrão: metade de baixo do frame, como as zonas "side" do zones.json
+DEFAULT_ZONE = {"type": "side", "line": [[0, 180], [640, 180]], "side": "bottom"}
+
+# frame_age: idade do frame ao chegar no detector; total: do frame entregue pelo
+# reader até a CameraThread pedir o próximo (só frames que foram ao detector)
+STAGES = ("frame_age", "inference", "total")
+
+# (métrica, maior é melhor)
+COMPARED_METRICS = [
+    ("processed_fps", True),
+    ("cameras_per_core", True),
+    ("inference_p95_ms", False),
+    ("total_p95_ms", False),
+    ("frame_age_p95_ms", False),
+    ("peak_memory_mb", False),
+]
+
+
+class VariantRecorder:
+    """O que a variante em execução mediu; trocado a cada variante."""
+
+    def __init__(self):
+        self.timings = {stage: [] for stage in STAGES}
+        self.events = []
+        self.sessions = []
+
+
+_recorder = VariantRecorder()
+_frame_state = threading.local()
+
+
+def _stub_dispatch(camera_id, recorder_guid):
+    return True
+
+
+coalescer.dispatch_event = _stub_dispatch
+
+_report_event = monitoring.report_event
+_run_inference = monitoring.run_inference
+
+
+def _counted_report_event(camera_id, recorder_guid, kind):
+    emitted = _report_event(camera_id, recorder_guid, kind)
+    if emitted:
+        _recorder.events.append(kind)
+    return emitted
+
+
+def _timed_run_inference(frame, camera_key=None, imgsz=None):
+    frame_info = getattr(_frame_state, "frame", None)
+    if frame_info is not None and not _frame_state.inferred:
+        _recorder.timings["frame_age"].append(time.time() - frame_info[0])
+    started = time.perf_counter()
+    result = _run_inference(frame, camera_key, imgsz)
+    _recorder.timings["inference"].append(time.perf_counter() - started)
+    _frame_state.inferred = True
+    return result
+
+
+# A CameraThread procura estes nomes no módulo a cada chamada
+monitoring.report_event = _counted_report_event
+monitoring.run_inference = _timed_run_inference
+
+
+def _escape_filter_path(path):
+    return path.replace("\\", "/").replace(":", "\\:").replace("'", "\\'")
+
+
+def source_input_args(source, person_image=None):
+    if source != "synthetic":
+        return ["-re", "-stream_loop", "-1", "-i", source]
+
+    width, height = SYNTHETIC_SIZE
+    graph = f"testsrc2=size={width}x{height}:rate={SYNTHETIC_FPS}"
+    if person_image:
+        # Pessoa atravessando o frame, para o YOLO ter o que detectar
+        graph = (f"{graph}[bg];movie='{_escape_filter_path(person_image)}',loop=-1:1[p];"
+                 f"[bg][p]overlay=x='mod(t*120,W)':y=H/3")
+    return ["-re", "-f", "lavfi", "-i", graph]
+
+
+def source_resolution(source):
+    if source == "synthetic":
+        return SYNTHETIC_SIZE
+    capture = cv2.VideoCapture(source)
+    try:
+        return int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    finally:
+        capture.release()
+
+
+def replay_cmd(source, capture_mode, analysis_fps, person_image=None, full_size=None):
+    """Mesmos argumentos de saída do ffmpeg de produção, trocando só a entrada RTSP."""
+    cmd = build_ffmpeg_cmd("SOURCE", capture_mode, analysis_fps, RESIZE_WIDTH, RESIZE_HEIGHT, full_size=full_size)
+    start = cmd.index("-rtsp_transport")
+    end = cmd.index("SOURCE") + 1
+    return cmd[:start] + source_input_args(source, person_image) + cmd[end:]
+
+
+class ReplayReader(FreshestFFmpegFrame):
+    """Reader de produção que marca cada frame entregue, para medir idade e tempo de processamento."""
+
+    def read_next(self, after_seq=0, timeout=None):
+        frame_info = getattr(_frame_state, "frame", None)
+        if frame_info is not None and _frame_state.inferred:
+            _recorder.timings["total"].append(time.perf_counter() - frame_info[1])
+        _frame_state.frame = None
+
+        frame_ref = super().read_next(after_seq, timeout)
+        if frame_ref is not None:
+            _frame_state.frame = (frame_ref.timestamp, time.perf_counter())
+            _frame_state.inferred = False
+        return frame_ref
+
+
+class ReplaySession(StreamSession):
+    """Sessão de produção lendo um arquivo (ou o testsrc2) no lugar do RTSP; rtsp_url é o caminho."""
+
+    person_image = None
+    decoded = 0
+    dropped = 0
+
+    def _open(self):
+        if self.capture_mode in SCALED_CAPTURE_MODES:
+            self.width, self.height = self.analysis_width, self.analysis_height
+        else:
+            self.width, self.height = source_resolution(self.rtsp_url)
+
+        cmd = replay_cmd(self.rtsp_url, self.capture_mode, self.analysis_fps, self.person_image,
+                         full_size=(self.width, self.height))
+        try:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=4096)
+        except OSError as e:
+            logger.error(f"[REPLAY] {self.camera_name}: erro ao iniciar ffmpeg: {e}")
+            return False
+
+        self.reader = ReplayReader(proc, self.width, self.height,
+                                   metrics_labels=(self.dguard_camera_id, self.recorder_guid))
+        threading.Thread(
+            target=log_ffmpeg_errors,
+            args=(proc.stderr, self.camera_name, self.recorder_name, self.dguard_camera_id, self.recorder_guid,
+                  self._stream_error),
+            daemon=True
+        ).start()
+        self.opened_at = time.time()
+        _recorder.sessions.append(self)
+        return True
+
+    def close(self):
+        if self.reader is not None:
+            self.decoded = self.reader.latest_seq + self.reader.dropped
+            self.dropped = self.reader.dropped + self.reader.overwritten
+        super().close()
+
+
+class ReplaySessionManager(StreamSessionManager):
+    session_class = ReplaySession
+
+
+class LockedModel:
+    """Modelo chamado direto (sem lote), como monitoring.model; o YOLO não é thread-safe, então serializa."""
+
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            return self.model(*args, **kwargs)
+
+
+class ResourceSampler(threading.Thread):
+    """Pico de memória (processo + ffmpegs) e CPU total consumida durante a variante."""
+
+    def __init__(self):
+        super().__init__(daemon=True, name="ResourceSampler")
+        self.process = psutil.Process()
+        self.peak_rss = 0
+        self.children_cpu = {}
+        self.running = True
+
+    def _sample(self):
+        rss = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+                times = child.cpu_times()
+                self.children_cpu[child.pid] = times.user + times.system
+            except psutil.Error:
+                continue
+        self.peak_rss = max(self.peak_rss, rss)
+
+    def run(self):
+        while self.running:
+            self._sample()
+            time.sleep(MEMORY_SAMPLE_INTERVAL)
+
+    def stop(self):
+        self._sample()
+        self.running = False
+        self.join(timeout=5)
+
+
+def _percentile_ms(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return 1000 * values[int(fraction * (len(values) - 1))]
+
+
+def configure_monitoring(config, model, keys, zone):
+    """Aplica a variante nas configurações globais que a CameraThread lê."""
+    monitoring.USE_INFERENCE_PROCESSES = False
+    monitoring.PROCESS_EVERY = config["process_every"]
+    monitoring.STATIC_INPUT = is_static(config["backend"])
+    if config["batch"]:
+        engine = BatchInferenceEngine(model, batch_size=config["batch_size"], max_wait=monitoring.BATCH_MAX_WAIT,
+                                      stats_interval=10 ** 9, model_batch=model_batch_limit(config["backend"]),
+                                      classes=[0], conf=monitoring.CONFIDENCE_THRESHOLD, imgsz=INPUT_SIZE)
+        monitoring.model, monitoring.inference_engine = model, engine
+    else:
+        engine = None
+        monitoring.model, monitoring.inference_engine = LockedModel(model), None
+
+    settings = {name: config[name] for name in ("capture_mode", "analysis_fps", "motion_gate", "tracking",
+                                                 "roi_crop", "adaptive_sampling")}
+    monitoring.CAMERA_SETTINGS = {key: dict(settings) for key in keys}
+    monitoring.COMPILED_ZONES = {key: CompiledZone(zone) for key in keys}
+    monitoring.ZONE_ROIS = compile_rois({key: zone for key in keys})
+    return engine
+
+
+def run_variant(name, config, sources, model, args):
+    global _recorder
+    print(f"\n[{name}] {config['cameras']} câmeras por {args.duration}s: {config}")
+    _recorder = VariantRecorder()
+    # Janelas de agrupamento não atravessam variantes
+    with coalescer.coalescer.lock:
+        coalescer.coalescer.last_emitted.clear()
+        coalescer.coalescer.merged.clear()
+
+    keys = [(index, RECORDER_GUID) for index in range(config["cameras"])]
+    engine = configure_monitoring(config, model, keys, args.zone)
+    ReplaySession.person_image = args.person_image
+    sessions = ReplaySessionManager(max_sessions=2 * config["cameras"], idle_timeout=10 * args.duration)
+    monitoring.stream_sessions = sessions
+
+    # Aquece o modelo fora da medição
+    blank = np.zeros((RESIZE_HEIGHT, RESIZE_WIDTH, 3), np.uint8)
+    for _ in range(3):
+        _run_inference(blank)
+
+    cameras = [
+        monitoring.CameraThread(sources[index % len(sources)], f"replay-{index}", index, index, RECORDER_GUID,
+                                "replay", analysis_window=args.duration)
+        for index in range(config["cameras"])
+    ]
+    monitoring.load_controller.active_cameras = lambda: sum(camera.is_alive() for camera in cameras)
+
+    sampler = ResourceSampler()
+    process = psutil.Process()
+    cpu_before = process.cpu_times()
+    sampler.start()
+
+    started = time.time()
+    for camera in cameras:
+        camera.start()
+    for camera in cameras:
+        camera.join()
+    wall = time.time() - started
+
+    sampler.stop()
+    sessions.close_all()
+    if engine is not None:
+        engine.stop()
+    cpu_after = process.cpu_times()
+    cpu_seconds = (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system)
+    cpu_seconds += sum(sampler.children_cpu.values())
+
+    for camera in cameras:
+        if camera.stream_error:
+            print(f"  câmera {camera.dguard_camera_id} ({camera.rtsp_url}): {camera.stream_error}")
+
+    timings = _recorder.timings
+    processed = len(timings["frame_age"])
+    cores_used = cpu_seconds / wall if wall else 0.0
+
+    result = {
+        "name": name,
+        "config": config,
+        "duration_s": wall,
+        "processed_frames": processed,
+        "processed_fps": processed / wall if wall else 0.0,
+        "decoded_fps": sum(session.decoded for session in _recorder.sessions) / wall if wall else 0.0,
+        "dropped_frames": sum(session.dropped for session in _recorder.sessions),
+        "cameras_with_person": sum(camera.person_detected for camera in cameras),
+        "person_alerts": _recorder.events.count(coalescer.EVENT_PERSON),
+        "cpu_cores_used": cores_used,
+        "cameras_per_core": config["cameras"] / cores_used if cores_used else None,
+        "peak_memory_mb": sampler.peak_rss / 2 ** 20,
+        "stub_station_events": sum(1 for kind in _recorder.events if kind in coalescer.DISPATCHED_KINDS),
+    }
+    for stage in STAGES:
+        values = timings[stage]
+        result[f"{stage}_mean_ms"] = 1000 * statistics.mean(values) if values else None
+        result[f"{stage}_p50_ms"] = _percentile_ms(values, 0.5)
+        result[f"{stage}_p95_ms"] = _percentile_ms(values, 0.95)
+    return result
+
+
+def print_result(result):
+    print(f"  frames processados: {result['processed_frames']} ({result['processed_fps']:.1f} fps) | "
+          f"decodificados: {result['decoded_fps']:.1f} fps | descartados: {result['dropped_frames']}")
+    print(f"  câmeras com pessoa: {result['cameras_with_person']} | alertas de pessoa: {result['person_alerts']} | "
+          f"eventos para o Station: {result['stub_station_events']}")
+    print(f"  CPU: {result['cpu_cores_used']:.2f} núcleos | câmeras por núcleo: "
+          f"{result['cameras_per_core'] or 0:.2f} | pico de memória: {result['peak_memory_mb']:.0f} MB")
+    print(f"  {'etapa':<12}{'média ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage in STAGES:
+        if result[f"{stage}_mean_ms"] is None:
+            continue
+        print(f"  {stage:<12}{result[f'{stage}_mean_ms']:>10.1f}{result[f'{stage}_p50_ms']:>10.1f}"
+              f"{result[f'{stage}_p95_ms']:>10.1f}")
+
+
+def compare(result, reference, tolerance, label):
+    """Imprime as diferenças contra a referência e devolve as regressões."""
+    regressions = []
+    print(f"\n[{result['name']}] comparado com {label}:")
+    for metric, higher_is_better in COMPARED_METRICS:
+        current, previous = result.get(metric), reference.get(metric)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > tolerance:
+            flag = "  <-- REGRESSÃO"
+            regressions.append((result["name"], metric, previous, current))
+        print(f"  {metric:<20}{previous:>12.2f} -> {current:>12.2f} ({change:+.1%}){flag}")
+    return regressions
+
+
+def parse_variant(spec, base):
+    name, _, overrides = spec.partition(":")
+    config = dict(base)
+    for item in filter(None, overrides.split(",")):
+        key, _, value = item.partition("=")
+        key = key.strip()
+        if key not in config:
+            raise SystemExit(f"Parâmetro desconhecido na variante {name!r}: {key}")
+        default = base[key]
+        if isinstance(default, bool):
+            config[key] = value.strip().lower() in ("1", "true", "sim", "yes")
+        elif isinstance(default, int):
+            config[key] = int(value)
+        else:
+            config[key] = value.strip()
+    return name, config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline de câmera com vídeos locais")
+    parser.add_argument("--videos", nargs="*", default=[], help="Arquivos de vídeo (aceita glob)")
+    parser.add_argument("--synthetic", action="store_true", help="Usa o testsrc2 do ffmpeg como fonte")
+    parser.add_argument("--person-image", default=None, help="PNG de pessoa sobreposto ao testsrc2")
+    parser.add_argument("--cameras", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--capture-mode", default=CAPTURE_MODE_FULL, choices=CAPTURE_MODES)
+    parser.add_argument("--analysis-fps", type=int, default=5)
+    parser.add_argument("--process-every", type=int, default=5)
+    parser.add_argument("--no-batch", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--motion-gate", action="store_true")
+    parser.add_argument("--tracking", action="store_true")
+    parser.add_argument("--roi-crop", action="store_true")
+    parser.add_argument("--no-adaptive-sampling", action="store_true")
+    parser.add_argument("--backend", default=BACKEND_PYTORCH)
+    parser.add_argument("--int8", action="store_true")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--zone", type=json.loads, default=DEFAULT_ZONE, help="Zona em JSON (coordenadas 640x360)")
+    parser.add_argument("--variant", action="append", default=[], help='"nome:chave=valor,..." (repetível)')
+    parser.add_argument("--output", default=None, help="Salva os resultados em JSON")
+    parser.add_argument("--baseline", default=None, help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Piora relativa aceita (padrão 10%%)")
+    args = parser.parse_args()
+
+    sources = [path for pattern in args.videos for path in sorted(glob.glob(pattern))]
+    if args.synthetic or not sources:
+        sources.append("synthetic")
+    missing = [s for s in sources if s != "synthetic" and not os.path.exists(s)]
+    if missing:
+        raise SystemExit(f"Vídeos não encontrados: {missing}")
+
+    base = {
+        "capture_mode": args.capture_mode,
+        "analysis_fps": args.analysis_fps,
+        "process_every": args.process_every,
+        "batch": not args.no_batch,
+        "batch_size": args.batch_size,
+        "motion_gate": args.motion_gate,
+        "tracking": args.tracking,
+        "roi_crop": args.roi_crop,
+        "adaptive_sampling": not args.no_adaptive_sampling,
+        "backend": args.backend,
+        "int8": args.int8,
+        "cameras": args.cameras,
+    }
+    variants = [parse_variant(spec, base) for spec in args.variant] or [("base", base)]
+
+    models = {}
+    results = []
+    for name, config in variants:
+        model_key = (config["backend"], config["int8"])
+        if model_key not in models:
+            models[model_key] = load_model(config["backend"], args.model, int8=config["int8"])
+        result = run_variant(name, config, sources, models[model_key], args)
+        print_result(result)
+        results.append(result)
+
+    regressions = []
+    for result in results[1:]:
+        regressions += compare(result, results[0], args.tolerance, f"a variante {results[0]['name']!r}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = {r["name"]: r for r in json.load(f)["results"]}
+        for result in results:
+            if result["name"] in baseline:
+                regressions += compare(result, baseline[result["name"]], args.tolerance, args.baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"created_at": time.time(), "cpu_count": os.cpu_count(), "sources": sources,
+                       "results": results}, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados salvos em {args.output}")
+
+    if regressions and args.baseline:
+        print(f"\n{len(regressions)} regressão(ões) acima de {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
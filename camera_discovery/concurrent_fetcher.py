@@ -0,0 +1,210 @@
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from guids.station_guids import STATION_BASE_URL
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+MAX_IN_FLIGHT = 16        # requisições simultâneas no total
+MAX_PER_RECORDER = 4      # requisições simultâneas por recorder (None = sem limite)
+MAX_RECORDERS = 8         # recorders processados em paralelo
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+REQUEST_TIMEOUT = 15
+
+UNAVAILABLE_REMOTE = {
+    "url": "Indisponível",
+    "username": "Indisponível",
+    "password": "Indisponível"
+}
+
+
+class StationCrawler:
+    """
+    Versão concorrente do build_full_recorder_list do camera_fetcher: mesma
+    estrutura de saída, mas com requisições em paralelo (limitadas no total e
+    por recorder), conexões reaproveitadas e retry com backoff.
+    """
+
+    def __init__(self, base_url=STATION_BASE_URL, headers=None, max_in_flight=MAX_IN_FLIGHT,
+                 max_per_recorder=MAX_PER_RECORDER, max_recorders=MAX_RECORDERS, retries=RETRIES,
+                 backoff_factor=BACKOFF_FACTOR, timeout=REQUEST_TIMEOUT):
+        if headers is None:
+            # Import tardio: config.config faz login no Station ao ser importado
+            from config.config import HEADERS
+            headers = HEADERS
+
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.max_per_recorder = max_per_recorder
+        self.max_recorders = max_recorders
+
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        self.session.verify = False
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET",)
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.in_flight = threading.BoundedSemaphore(max_in_flight)
+        self.recorder_limits = defaultdict(
+            lambda: threading.BoundedSemaphore(max_per_recorder) if max_per_recorder else None
+        )
+        self.recorder_limits_lock = threading.Lock()
+        self.requests_made = 0
+        self.counter_lock = threading.Lock()
+
+    def _recorder_limit(self, recorder_guid):
+        if recorder_guid is None:
+            return None
+        with self.recorder_limits_lock:
+            return self.recorder_limits[recorder_guid]
+
+    def _get_json(self, path, recorder_guid=None):
+        url = f"{self.base_url}{path}"
+        recorder_limit = self._recorder_limit(recorder_guid)
+
+        if recorder_limit:
+            recorder_limit.acquire()
+        try:
+            with self.in_flight:
+                with self.counter_lock:
+                    self.requests_made += 1
+                response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.exceptions.RequestException, ValueError) as err:
+            print(f"[GET Error] {err} - URL: {url}")
+            return None
+        finally:
+            if recorder_limit:
+                recorder_limit.release()
+
+    def get_recorders(self):
+        data = self._get_json("/servers")
+        if not data:
+            return []
+        return [{"name": r.get("name"), "guid": r.get("guid")} for r in data.get("servers", [])]
+
+    def get_cameras_by_recorder(self, recorder_guid, recorder_name):
+        data = self._get_json(f"/servers/{recorder_guid}/cameras", recorder_guid)
+        if not data:
+            print(f"⚠️ Erro: sem resposta ao buscar câmeras do recorder {recorder_name} ({recorder_guid})")
+            return []
+        return [{"name": c.get("name"), "id": c.get("id")} for c in data.get("cameras", [])]
+
+    def get_stream_ids(self, recorder_guid, camera_id):
+        data = self._get_json(f"/servers/{recorder_guid}/cameras/{camera_id}/streams", recorder_guid)
+        if not data:
+            return None
+        streams = data.get("streams", [])
+        return [stream.get("id") for stream in streams if "id" in stream] or None
+
+    def get_remote_url(self, recorder_guid, camera_id, stream_id):
+        data = self._get_json(
+            f"/servers/{recorder_guid}/cameras/{camera_id}/streams/{stream_id}/remote-url", recorder_guid
+        )
+        if not data:
+            return {}
+        remote = data.get("remoteUrl", {})
+        return {
+            "url": remote.get("url"),
+            "username": remote.get("username"),
+            "password": remote.get("password"),
+        }
+
+    def _build_camera_entry(self, recorder, camera, url_pool):
+        camera_entry = {
+            "name": camera.get("name", "Indisponível"),
+            "id": camera.get("id", "Indisponível"),
+            "streams": []
+        }
+
+        stream_ids = self.get_stream_ids(recorder["guid"], camera["id"])
+        if not stream_ids:
+            camera_entry["streams"].append({"streamId": "Indisponível", "remoteUrl": dict(UNAVAILABLE_REMOTE)})
+            return camera_entry
+
+        futures = [
+            (stream_id, url_pool.submit(self.get_remote_url, recorder["guid"], camera["id"], stream_id))
+            for stream_id in stream_ids
+        ]
+        for stream_id, future in futures:
+            remote = future.result()
+            if not remote or not remote.get("url"):
+                remote = dict(UNAVAILABLE_REMOTE)
+            camera_entry["streams"].append({"streamId": stream_id, "remoteUrl": remote})
+        return camera_entry
+
+    def _build_recorder_entry(self, recorder, camera_pool, url_pool):
+        recorder_entry = {
+            "name": recorder.get("name", "Indisponível"),
+            "guid": recorder.get("guid", "Indisponível"),
+            "cameras": []
+        }
+
+        cameras = self.get_cameras_by_recorder(recorder["guid"], recorder["name"])
+        if not cameras:
+            recorder_entry["cameras"].append({"name": "Indisponível", "id": "Indisponível", "streams": []})
+            return recorder_entry
+
+        futures = [camera_pool.submit(self._build_camera_entry, recorder, camera, url_pool) for camera in cameras]
+        recorder_entry["cameras"] = [future.result() for future in futures]
+        print(f"Found {len(cameras)} cameras for recorder {recorder['name']}.")
+        return recorder_entry
+
+    def crawl(self, skip_guids=(), on_recorder_done=None, recorders=None):
+        """
+        Monta a lista completa de recorders/câmeras/streams. skip_guids permite
+        retomar um crawl interrompido; on_recorder_done(entry) é chamado assim
+        que cada recorder termina (útil para checkpoints).
+        """
+        if recorders is None:
+            recorders = self.get_recorders()
+        print(f"Found {len(recorders)} recorders.")
+        skip_guids = set(skip_guids)
+        pending = [r for r in recorders if r["guid"] not in skip_guids]
+        callback_lock = threading.Lock()
+
+        # Pools separados por nível: tarefas de um nível só esperam o nível de baixo, sem deadlock
+        with ThreadPoolExecutor(max_workers=self.max_recorders) as recorder_pool, \
+                ThreadPoolExecutor(max_workers=self.max_in_flight) as camera_pool, \
+                ThreadPoolExecutor(max_workers=self.max_in_flight) as url_pool:
+
+            def run_recorder(recorder):
+                entry = self._build_recorder_entry(recorder, camera_pool, url_pool)
+                if on_recorder_done:
+                    with callback_lock:
+                        on_recorder_done(entry)
+                return entry
+
+            futures = [recorder_pool.submit(run_recorder, recorder) for recorder in pending]
+            results = [future.result() for future in futures]
+
+        return results
+
+    def close(self):
+        self.session.close()
+
+
+def build_full_recorder_list_concurrent(**crawler_kwargs):
+    crawler = StationCrawler(**crawler_kwargs)
+    try:
+        data = crawler.crawl()
+    finally:
+        crawler.close()
+    print("Estrutura completa montada com sucesso.")
+    return data
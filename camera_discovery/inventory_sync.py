@@ -0,0 +1,251 @@
+import json
+import os
+
+from camera_discovery.concurrent_fetcher import StationCrawler
+from db.camera_registry import invalidate_all
+from db.schema import DB_PATH, bump_inventory_version, connect
+
+CHECKPOINT_FILE = "inventory_sync_checkpoint.jsonl"
+UNAVAILABLE = "Indisponível"
+
+
+def load_checkpoint(path=CHECKPOINT_FILE):
+    """Lê os recorders já sincronizados; ignora uma última linha incompleta (crawl interrompido)."""
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    if entries:
+        print(f"🔄 Retomando sincronização: {len(entries)} recorders já aplicados em {path}")
+    return entries
+
+
+def append_checkpoint(entry, path=CHECKPOINT_FILE):
+    # Append-only: uma linha por recorder, sem reescrever o arquivo inteiro
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _is_valid_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _empty_summary():
+    return {key: 0 for key in (
+        "recorders_inserted", "recorders_updated", "recorders_deleted",
+        "cameras_inserted", "cameras_updated", "cameras_deleted",
+        "streams_inserted", "streams_updated", "streams_deleted",
+    )}
+
+
+def _delete_streams(cursor, stream_row_ids):
+    if not stream_row_ids:
+        return
+    params = [(row_id,) for row_id in stream_row_ids]
+    cursor.executemany("DELETE FROM stream_metadata WHERE stream_id = ?", params)
+    cursor.executemany("DELETE FROM stream_stats WHERE stream_id = ?", params)
+    cursor.executemany("DELETE FROM streams WHERE id = ?", params)
+
+
+def _delete_cameras(cursor, camera_row_ids):
+    if not camera_row_ids:
+        return 0
+    stream_rows = []
+    for camera_row_id in camera_row_ids:
+        stream_rows += [row[0] for row in cursor.execute("SELECT id FROM streams WHERE camera_id = ?", (camera_row_id,))]
+    _delete_streams(cursor, stream_rows)
+    cursor.executemany("DELETE FROM cameras WHERE id = ?", [(row_id,) for row_id in camera_row_ids])
+    return len(stream_rows)
+
+
+def _apply_recorder_changes(cursor, entry, server_id, summary):
+    guid = entry["guid"]
+    row = cursor.execute("SELECT id, name FROM recorders WHERE guid = ?", (guid,)).fetchone()
+    if row is None:
+        cursor.execute("INSERT INTO recorders (name, guid, server_id) VALUES (?, ?, ?)",
+                       (entry.get("name"), guid, server_id))
+        recorder_row_id = cursor.lastrowid
+        summary["recorders_inserted"] += 1
+    else:
+        recorder_row_id, name = row
+        if entry.get("name") and entry["name"] != name:
+            cursor.execute("UPDATE recorders SET name = ? WHERE id = ?", (entry["name"], recorder_row_id))
+            summary["recorders_updated"] += 1
+
+    cameras = [c for c in entry.get("cameras", []) if _is_valid_id(c.get("id"))]
+    if not cameras:
+        # Listagem de câmeras falhou ou veio vazia: não mexe nas câmeras existentes
+        return
+
+    existing_cameras = {
+        camera_id: (row_id, name)
+        for row_id, camera_id, name in cursor.execute(
+            "SELECT id, camera_id, name FROM cameras WHERE recorder_id = ?", (recorder_row_id,)
+        )
+    }
+
+    seen_cameras = set()
+    for camera in cameras:
+        camera_id = camera["id"]
+        seen_cameras.add(camera_id)
+
+        if camera_id in existing_cameras:
+            camera_row_id, name = existing_cameras[camera_id]
+            if camera.get("name") and camera["name"] != name:
+                cursor.execute("UPDATE cameras SET name = ? WHERE id = ?", (camera["name"], camera_row_id))
+                summary["cameras_updated"] += 1
+        else:
+            cursor.execute("INSERT INTO cameras (name, camera_id, recorder_id) VALUES (?, ?, ?)",
+                           (camera.get("name"), camera_id, recorder_row_id))
+            camera_row_id = cursor.lastrowid
+            summary["cameras_inserted"] += 1
+
+        streams = [s for s in camera.get("streams", []) if _is_valid_id(s.get("streamId"))]
+        if not streams:
+            continue  # Streams indisponíveis: mantém os do banco
+
+        existing_streams = {
+            stream_id: (row_id, (url, username, password))
+            for row_id, stream_id, url, username, password in cursor.execute(
+                "SELECT id, stream_id, url, username, password FROM streams WHERE camera_id = ?",
+                (camera_row_id,)
+            )
+        }
+
+        inserts, updates = [], []
+        seen_streams = set()
+        for stream in streams:
+            stream_id = stream["streamId"]
+            seen_streams.add(stream_id)
+            remote = stream.get("remoteUrl") or {}
+            if not remote.get("url") or remote["url"] == UNAVAILABLE:
+                continue  # remote-url falhou: mantém o valor atual
+            values = (remote.get("url"), remote.get("username"), remote.get("password"))
+
+            if stream_id not in existing_streams:
+                inserts.append((stream_id, *values, camera_row_id))
+            elif existing_streams[stream_id][1] != values:
+                updates.append((*values, existing_streams[stream_id][0]))
+
+        cursor.executemany(
+            "INSERT INTO streams (stream_id, url, username, password, camera_id) VALUES (?, ?, ?, ?, ?)", inserts
+        )
+        cursor.executemany("UPDATE streams SET url = ?, username = ?, password = ? WHERE id = ?", updates)
+        # URL mudou: metadata em cache e histórico de custo/falhas não valem mais
+        cursor.executemany("DELETE FROM stream_metadata WHERE stream_id = ?", [(u[-1],) for u in updates])
+        cursor.executemany("DELETE FROM stream_stats WHERE stream_id = ?", [(u[-1],) for u in updates])
+
+        removed = [row_id for stream_id, (row_id, _) in existing_streams.items() if stream_id not in seen_streams]
+        _delete_streams(cursor, removed)
+
+        summary["streams_inserted"] += len(inserts)
+        summary["streams_updated"] += len(updates)
+        summary["streams_deleted"] += len(removed)
+
+    removed_cameras = [row_id for camera_id, (row_id, _) in existing_cameras.items() if camera_id not in seen_cameras]
+    summary["streams_deleted"] += _delete_cameras(cursor, removed_cameras)
+    summary["cameras_deleted"] += len(removed_cameras)
+
+
+def apply_recorder_entry(conn, entry, server_id=None, summary=None):
+    """
+    Aplica no banco só as diferenças de um recorder (inserts/updates/deletes),
+    numa única transação. Dados que o Station não conseguiu informar
+    ("Indisponível") nunca apagam o que já está no banco.
+    """
+    summary = summary if summary is not None else _empty_summary()
+    guid = entry.get("guid")
+    if not guid or guid == UNAVAILABLE:
+        return summary
+
+    changes_before = sum(summary.values())
+    with conn:
+        _apply_recorder_changes(conn.cursor(), entry, server_id, summary)
+        changed = sum(summary.values()) != changes_before
+        if changed:
+            bump_inventory_version(conn)
+
+    if changed:
+        invalidate_all()
+    return summary
+
+
+def delete_missing_recorders(conn, live_guids, summary):
+    with conn:
+        cursor = conn.cursor()
+        stale = [(row_id, guid) for row_id, guid in cursor.execute("SELECT id, guid FROM recorders")
+                 if guid not in live_guids]
+        for recorder_row_id, guid in stale:
+            camera_rows = [row[0] for row in cursor.execute(
+                "SELECT id FROM cameras WHERE recorder_id = ?", (recorder_row_id,)
+            )]
+            summary["streams_deleted"] += _delete_cameras(cursor, camera_rows)
+            summary["cameras_deleted"] += len(camera_rows)
+            cursor.execute("DELETE FROM recorders WHERE id = ?", (recorder_row_id,))
+            summary["recorders_deleted"] += 1
+        if stale:
+            bump_inventory_version(conn)
+
+    if stale:
+        invalidate_all()
+    return summary
+
+
+def _server_id(conn, server_name):
+    if not server_name:
+        return None
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO servers (name) VALUES (?)", (server_name,))
+    return conn.execute("SELECT id FROM servers WHERE name = ?", (server_name,)).fetchone()[0]
+
+
+def sync_inventory(db_path=DB_PATH, server_name=None, checkpoint_path=CHECKPOINT_FILE, crawler=None):
+    """
+    Sincronização incremental: compara o inventário ao vivo do Station com as
+    tabelas recorders/cameras/streams e aplica só o que mudou, um recorder por
+    transação. Cada recorder aplicado vai para um checkpoint append-only, e um
+    crawl interrompido continua de onde parou.
+    """
+    # O callback roda nas threads do crawler, que já serializa as chamadas
+    conn = connect(db_path, check_same_thread=False)
+    summary = _empty_summary()
+    server_id = _server_id(conn, server_name)
+
+    # Recorders no checkpoint já foram aplicados antes da linha ser gravada
+    done_guids = {entry["guid"] for entry in load_checkpoint(checkpoint_path)}
+
+    def on_recorder_done(entry):
+        apply_recorder_entry(conn, entry, server_id, summary)
+        append_checkpoint(entry, checkpoint_path)
+
+    own_crawler = crawler is None
+    crawler = crawler or StationCrawler()
+    try:
+        live_recorders = crawler.get_recorders()
+        if not live_recorders:
+            print("Nenhum recorder encontrado; banco não foi alterado.")
+            return summary
+
+        crawled = crawler.crawl(skip_guids=done_guids, on_recorder_done=on_recorder_done, recorders=live_recorders)
+        delete_missing_recorders(conn, {r["guid"] for r in live_recorders}, summary)
+    finally:
+        if own_crawler:
+            crawler.close()
+        conn.close()
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    print(f"✅ Sincronização concluída ({len(crawled)} recorders consultados): {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    sync_inventory()
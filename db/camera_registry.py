@@ -0,0 +1,124 @@
+import logging
+import threading
+import time
+import weakref
+
+from db.schema import DB_PATH, connect, get_inventory_version
+
+logger = logging.getLogger(__name__)
+
+VERSION_CHECK_INTERVAL = 5  # segundos entre checagens de mudança no inventário
+UNAVAILABLE_URL = "indisponível"
+
+_registries = weakref.WeakSet()
+
+
+class CameraRegistry:
+    """
+    Inventário de câmeras em memória, carregado uma vez do database.db:
+    resolve (dguard_camera_id, recorder_guid) -> dados da câmera e streams em
+    O(1). É recarregado quando a sincronização de inventário muda o banco.
+    """
+
+    def __init__(self, db_path=DB_PATH, version_check_interval=VERSION_CHECK_INTERVAL):
+        self.db_path = db_path
+        self.version_check_interval = version_check_interval
+        self.lock = threading.Lock()
+        self.cameras = None
+        self.version = None
+        self.last_check = 0.0
+        _registries.add(self)
+
+    def load(self):
+        conn = connect(self.db_path)
+        try:
+            version = get_inventory_version(conn)
+            rows = conn.execute("""
+                SELECT
+                    c.id,
+                    c.camera_id AS dguard_camera_id,
+                    c.name,
+                    s.url,
+                    s.username,
+                    s.password,
+                    r.guid,
+                    r.name AS recorder_name,
+                    s.stream_id,
+                    s.id AS stream_db_id
+                FROM cameras c
+                JOIN streams s ON s.camera_id = c.id AND s.stream_id IN (0,1)
+                JOIN recorders r ON c.recorder_id = r.id
+                WHERE s.url != ?
+            """, (UNAVAILABLE_URL,)).fetchall()
+        finally:
+            conn.close()
+
+        cameras = {}
+        for (camera_id, dguard_camera_id, camera_name, rtsp_url, username, password, recorder_guid,
+             recorder_name, stream_id, stream_db_id) in rows:
+            key = (dguard_camera_id, recorder_guid)
+            if key not in cameras:
+                cameras[key] = {
+                    "camera_id": camera_id,
+                    "dguard_camera_id": dguard_camera_id,
+                    "camera_name": camera_name,
+                    "recorder_guid": recorder_guid,
+                    "recorder_name": recorder_name,
+                    "streams": {}
+                }
+            cameras[key]["streams"][stream_id] = (rtsp_url, username, password, stream_db_id)
+
+        with self.lock:
+            self.cameras = cameras
+            self.version = version
+            self.last_check = time.time()
+        logger.info(f"[REGISTRY] {len(cameras)} câmeras carregadas do banco (versão {version})")
+        return cameras
+
+    def invalidate(self):
+        with self.lock:
+            self.cameras = None
+
+    def _ensure_fresh(self):
+        with self.lock:
+            cameras = self.cameras
+            due = time.time() - self.last_check >= self.version_check_interval
+            if due:
+                self.last_check = time.time()
+
+        if cameras is None:
+            return self.load()
+
+        if due:
+            conn = connect(self.db_path)
+            try:
+                version = get_inventory_version(conn)
+            finally:
+                conn.close()
+            if version != self.version:
+                logger.info("[REGISTRY] Inventário alterado no banco, recarregando")
+                return self.load()
+        return cameras
+
+    def get(self, dguard_camera_id, recorder_guid):
+        return self._ensure_fresh().get((dguard_camera_id, recorder_guid))
+
+    def get_many(self, camera_recorder_list):
+        cameras = self._ensure_fresh()
+        found = []
+        seen = set()
+        for key in camera_recorder_list:
+            key = tuple(key)
+            if key in cameras and key not in seen:
+                seen.add(key)
+                found.append(cameras[key])
+        return found
+
+    def all(self):
+        return list(self._ensure_fresh().values())
+
+
+def invalidate_all():
+    """Invalida todos os registries deste processo (chamado pela sincronização de inventário)."""
+    for registry in list(_registries):
+        registry.invalidate()
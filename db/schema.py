@@ -0,0 +1,75 @@
+import sqlite3
+import threading
+
+DB_PATH = "database.db"
+
+# Bancos cujo schema já foi conferido neste processo
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def connect(db_path=DB_PATH, **kwargs):
+    kwargs.setdefault("timeout", 10)
+    conn = sqlite3.connect(db_path, **kwargs)
+    if db_path not in _schema_ready:
+        with _schema_lock:
+            if db_path not in _schema_ready:
+                ensure_schema(conn)
+                _schema_ready.add(db_path)
+    return conn
+
+
+def ensure_schema(conn):
+    """Cria as tabelas auxiliares e índices que não vieram no database.db original."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(stream_stats)")}
+    if columns and "capture_mode" not in columns:
+        # Versão antiga, uma linha por stream com os modos de captura misturados nas médias
+        conn.execute("DROP TABLE stream_stats")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS stream_metadata (
+            stream_id INTEGER PRIMARY KEY,
+            width INTEGER,
+            height INTEGER,
+            codec TEXT,
+            fps REAL,
+            updated_at REAL,
+            FOREIGN KEY (stream_id) REFERENCES streams (id)
+        );
+
+        CREATE TABLE IF NOT EXISTS stream_stats (
+            stream_id INTEGER NOT NULL,
+            capture_mode TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            failure_rate REAL NOT NULL DEFAULT 0,
+            decode_cost REAL,
+            decoded_fps REAL,
+            last_failure_at REAL,
+            updated_at REAL,
+            PRIMARY KEY (stream_id, capture_mode),
+            FOREIGN KEY (stream_id) REFERENCES streams (id)
+        );
+
+        CREATE TABLE IF NOT EXISTS inventory_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_recorders_guid ON recorders (guid);
+        CREATE INDEX IF NOT EXISTS idx_cameras_recorder_camera ON cameras (recorder_id, camera_id);
+        CREATE INDEX IF NOT EXISTS idx_cameras_camera_id ON cameras (camera_id);
+        CREATE INDEX IF NOT EXISTS idx_streams_camera_stream ON streams (camera_id, stream_id);
+    """)
+
+
+def get_inventory_version(conn):
+    row = conn.execute("SELECT value FROM inventory_meta WHERE key = 'inventory_version'").fetchone()
+    return row[0] if row else 0
+
+
+def bump_inventory_version(conn):
+    """Sinaliza para os CameraRegistry (inclusive de outros processos) que o inventário mudou."""
+    conn.execute("""
+        INSERT INTO inventory_meta (key, value) VALUES ('inventory_version', 1)
+        ON CONFLICT(key) DO UPDATE SET value = value + 1
+    """)
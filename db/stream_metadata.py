@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+
+from db.schema import connect
+from streams.ffmpeg_reader import probe_stream
+
+logger = logging.getLogger(__name__)
+
+METADATA_TTL = 24 * 3600  # segundos até a metadata ser considerada velha
+PROBE_TIMEOUT = 10  # segundos
+MAX_BACKGROUND_PROBES = 4  # ffprobes simultâneos em segundo plano
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+_probe_slots = threading.BoundedSemaphore(MAX_BACKGROUND_PROBES)
+
+
+def load_stream_metadata(stream_db_id):
+    conn = connect()
+    try:
+        row = conn.execute(
+            "SELECT width, height, codec, fps, updated_at FROM stream_metadata WHERE stream_id = ?",
+            (stream_db_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+    if not row:
+        return None
+    width, height, codec, fps, updated_at = row
+    return {"width": width, "height": height, "codec": codec, "fps": fps, "updated_at": updated_at}
+
+
+def save_stream_metadata(stream_db_id, metadata):
+    conn = connect()
+    try:
+        with conn:
+            conn.execute(
+                """
+                INSERT INTO stream_metadata (stream_id, width, height, codec, fps, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(stream_id) DO UPDATE SET
+                    width = excluded.width,
+                    height = excluded.height,
+                    codec = excluded.codec,
+                    fps = excluded.fps,
+                    updated_at = excluded.updated_at
+                """,
+                (stream_db_id, metadata["width"], metadata["height"], metadata.get("codec"),
+                 metadata.get("fps"), time.time())
+            )
+    finally:
+        conn.close()
+
+
+def invalidate_stream_metadata(stream_db_id):
+    conn = connect()
+    try:
+        with conn:
+            conn.execute("DELETE FROM stream_metadata WHERE stream_id = ?", (stream_db_id,))
+    finally:
+        conn.close()
+
+
+def refresh_stream_metadata(stream_db_id, rtsp_url, camera_name=None, recorder_name=None):
+    metadata = probe_stream(rtsp_url, camera_name, recorder_name, timeout=PROBE_TIMEOUT)
+    if metadata:
+        save_stream_metadata(stream_db_id, metadata)
+    return metadata
+
+
+def refresh_in_background(stream_db_id, rtsp_url, camera_name, recorder_name):
+    with _refreshing_lock:
+        if stream_db_id in _refreshing:
+            return
+        _refreshing.add(stream_db_id)
+
+    def refresh():
+        try:
+            with _probe_slots:
+                refresh_stream_metadata(stream_db_id, rtsp_url, camera_name, recorder_name)
+        except Exception as e:
+            logger.error(f"[METADATA] Erro ao atualizar metadata de {camera_name} ({recorder_name}): {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(stream_db_id)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def get_stream_metadata(stream_db_id, rtsp_url, camera_name=None, recorder_name=None):
+    """
+    Retorna width/height/codec/fps do stream. Usa o cache do database.db quando
+    existe; se estiver vencido, devolve o valor antigo e atualiza em segundo
+    plano. Só roda o ffprobe de forma bloqueante para streams nunca vistos.
+    """
+    try:
+        metadata = load_stream_metadata(stream_db_id)
+    except Exception as e:
+        logger.error(f"[METADATA] Erro ao ler cache de metadata: {e}")
+        metadata = None
+
+    if metadata:
+        if time.time() - (metadata["updated_at"] or 0) > METADATA_TTL:
+            refresh_in_background(stream_db_id, rtsp_url, camera_name, recorder_name)
+        return metadata
+
+    metadata = probe_stream(rtsp_url, camera_name, recorder_name, timeout=PROBE_TIMEOUT)
+    if metadata:
+        try:
+            save_stream_metadata(stream_db_id, metadata)
+        except Exception as e:
+            logger.error(f"[METADATA] Erro ao salvar metadata de {camera_name} ({recorder_name}): {e}")
+    return metadata
@@ -0,0 +1,86 @@
+import time
+
+from db.schema import connect
+
+STATS_ALPHA = 0.3  # peso da análise mais recente nas médias móveis
+QUERY_CHUNK = 500  # ids por consulta (limite de parâmetros do SQLite)
+
+
+def load_stream_selection_info(stream_db_ids, capture_mode):
+    """
+    Resolução (stream_metadata) e histórico medido (stream_stats) de cada
+    stream no modo de captura pedido, numa consulta só para todas as câmeras
+    do acionamento.
+    """
+    stream_db_ids = [i for i in dict.fromkeys(stream_db_ids) if i is not None]
+    info = {}
+    if not stream_db_ids:
+        return info
+
+    conn = connect()
+    try:
+        for start in range(0, len(stream_db_ids), QUERY_CHUNK):
+            chunk = stream_db_ids[start:start + QUERY_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(f"""
+                SELECT s.id, m.width, m.height, m.fps, t.attempts, t.failures, t.failure_rate,
+                       t.decode_cost, t.decoded_fps, t.last_failure_at
+                FROM streams s
+                LEFT JOIN stream_metadata m ON m.stream_id = s.id
+                LEFT JOIN stream_stats t ON t.stream_id = s.id AND t.capture_mode = ?
+                WHERE s.id IN ({placeholders})
+            """, [capture_mode, *chunk]).fetchall()
+            for (stream_db_id, width, height, fps, attempts, failures, failure_rate,
+                 decode_cost, decoded_fps, last_failure_at) in rows:
+                info[stream_db_id] = {
+                    "width": width,
+                    "height": height,
+                    "fps": fps,
+                    "attempts": attempts or 0,
+                    "failures": failures or 0,
+                    "failure_rate": failure_rate or 0.0,
+                    "decode_cost": decode_cost,
+                    "decoded_fps": decoded_fps,
+                    "last_failure_at": last_failure_at,
+                }
+    finally:
+        conn.close()
+    return info
+
+
+def record_stream_result(stream_db_id, capture_mode, success, decode_cost=None, decoded_fps=None):
+    """
+    Registra uma tentativa de análise no stream, separada por modo de captura
+    (keyframe custa uma fração do full). failure_rate e decode_cost são médias
+    móveis exponenciais, então o stream volta a ser escolhido depois que a
+    câmera se recupera.
+    """
+    if stream_db_id is None:
+        return
+    now = time.time()
+    failed = 0 if success else 1
+    conn = connect()
+    try:
+        with conn:
+            conn.execute(
+                f"""
+                INSERT INTO stream_stats (stream_id, capture_mode, attempts, failures, failure_rate, decode_cost,
+                                          decoded_fps, last_failure_at, updated_at)
+                VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(stream_id, capture_mode) DO UPDATE SET
+                    attempts = attempts + 1,
+                    failures = failures + excluded.failures,
+                    failure_rate = failure_rate * (1 - {STATS_ALPHA}) + excluded.failure_rate * {STATS_ALPHA},
+                    decode_cost = CASE
+                        WHEN excluded.decode_cost IS NULL THEN decode_cost
+                        WHEN decode_cost IS NULL THEN excluded.decode_cost
+                        ELSE decode_cost * (1 - {STATS_ALPHA}) + excluded.decode_cost * {STATS_ALPHA}
+                    END,
+                    decoded_fps = COALESCE(excluded.decoded_fps, decoded_fps),
+                    last_failure_at = COALESCE(excluded.last_failure_at, last_failure_at),
+                    updated_at = excluded.updated_at
+                """,
+                (stream_db_id, capture_mode, failed, float(failed), decode_cost, decoded_fps, None if success else now, now)
+            )
+    finally:
+        conn.close()
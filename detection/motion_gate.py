@@ -0,0 +1,78 @@
+import time
+
+import cv2
+import numpy as np
+
+from detection.zones import zone_mask
+from runtime.metrics import MOTION_GATE_CHECKED, MOTION_GATE_SKIPPED
+
+
+class MotionGate:
+    """
+    Filtro barato antes do YOLO: compara o frame (reduzido e em tons de cinza)
+    com um fundo de média móvel e só libera a inferência quando uma fração
+    mínima de pixels mudou. Opcionalmente considera apenas a zona da câmera.
+    """
+
+    def __init__(self, sensitivity=25, min_changed_ratio=0.002, width=160,
+                 background_rate=0.05, zone_config=None, max_skip_seconds=None):
+        self.sensitivity = sensitivity
+        self.min_changed_ratio = min_changed_ratio
+        self.width = width
+        self.background_rate = background_rate
+        self.zone_config = zone_config
+        self.max_skip_seconds = max_skip_seconds
+
+        self.background = None
+        self.mask = None
+        self.mask_area = 0
+        self.last_open = 0.0
+        self.last_changed_ratio = 0.0
+        self.checked = 0
+        self.skipped = 0
+
+    def _prepare(self, frame):
+        height = max(1, round(frame.shape[0] * self.width / frame.shape[1]))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def should_infer(self, frame):
+        gray = self._prepare(frame)
+        now = time.time()
+
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            if self.zone_config:
+                self.mask = zone_mask(self.zone_config, gray.shape[1], gray.shape[0])
+                self.mask_area = int(self.mask.sum())
+            self.last_open = now
+            self._count(skipped=False)
+            return True  # Primeiro frame sempre passa
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        changed = diff > self.sensitivity
+        if self.mask is not None and self.mask_area:
+            changed_ratio = np.count_nonzero(changed & self.mask) / self.mask_area
+        else:
+            changed_ratio = np.count_nonzero(changed) / changed.size
+        self.last_changed_ratio = changed_ratio
+
+        cv2.accumulateWeighted(gray, self.background, self.background_rate)
+
+        open_gate = changed_ratio >= self.min_changed_ratio
+        if not open_gate and self.max_skip_seconds and now - self.last_open >= self.max_skip_seconds:
+            open_gate = True  # Inferência periódica mesmo sem movimento
+
+        if open_gate:
+            self.last_open = now
+        self._count(skipped=not open_gate)
+        return open_gate
+
+    def _count(self, skipped):
+        # Totais do processo inteiro (todas as câmeras) ficam no /metrics
+        self.checked += 1
+        MOTION_GATE_CHECKED.inc()
+        if skipped:
+            self.skipped += 1
+            MOTION_GATE_SKIPPED.inc()
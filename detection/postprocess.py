@@ -0,0 +1,44 @@
+import numpy as np
+
+EMPTY_BOXES = np.zeros((0, 4), dtype=np.float32)
+EMPTY_CONF = np.zeros((0,), dtype=np.float32)
+
+
+def boxes_to_arrays(results):
+    """
+    Converte o(s) Results do ultralytics em arrays NumPy (xyxy, conf) numa só
+    transferência, em vez de converter caixa por caixa.
+    """
+    if not isinstance(results, (list, tuple)):
+        results = [results]
+
+    xyxy_parts = []
+    conf_parts = []
+    for result in results:
+        boxes = result.boxes
+        if boxes is None or len(boxes) == 0:
+            continue
+        xyxy_parts.append(boxes.xyxy.cpu().numpy())
+        conf_parts.append(boxes.conf.cpu().numpy())
+
+    if not xyxy_parts:
+        return EMPTY_BOXES, EMPTY_CONF
+    return np.concatenate(xyxy_parts).astype(np.float32), np.concatenate(conf_parts).astype(np.float32)
+
+
+def filter_detections(xyxy, conf, zone=None, min_conf=None):
+    """
+    Filtra todas as caixas de uma vez: confiança mínima (caso o modelo não
+    tenha filtrado) e centro dentro da zona compilada da câmera.
+    """
+    keep = np.ones(len(conf), dtype=bool)
+    if min_conf is not None:
+        keep &= conf >= min_conf
+
+    if zone is not None and keep.any():
+        xi = xyxy.astype(np.int32)
+        cx = (xi[:, 0] + xi[:, 2]) // 2
+        cy = (xi[:, 1] + xi[:, 3]) // 2
+        keep &= zone.contains(cx, cy)
+
+    return xyxy[keep], conf[keep]
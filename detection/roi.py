@@ -0,0 +1,85 @@
+import math
+
+import numpy as np
+
+from detection.zones import ZONE_HEIGHT, ZONE_WIDTH, zone_mask
+
+ROI_PADDING = 0.15         # margem relativa ao tamanho da ROI (pessoas na borda da zona)
+ROI_MIN_PADDING = 24       # margem mínima em pixels (coordenadas do zones.json)
+ROI_MAX_FRACTION = 0.6     # acima disso da área do frame não compensa recortar
+MODEL_STRIDE = 32
+
+
+def _ceil_stride(value, stride=MODEL_STRIDE):
+    return max(stride, int(math.ceil(value / stride)) * stride)
+
+
+class ZoneROI:
+    """
+    Retângulo envolvente da zona (com margem) em coordenadas 640x360. O recorte
+    é feito no frame na resolução em que ele chegou (original no modo "full"),
+    então pessoas pequenas ficam com mais pixels, e a entrada do modelo
+    encolhe para o tamanho do recorte. As caixas voltam para as coordenadas
+    das zonas com to_zone_coords().
+    """
+
+    def __init__(self, config, padding=ROI_PADDING, min_padding=ROI_MIN_PADDING, max_fraction=ROI_MAX_FRACTION):
+        self.box = None
+        mask = zone_mask(config, ZONE_WIDTH, ZONE_HEIGHT)
+        ys, xs = np.nonzero(mask)
+        if len(xs) == 0:
+            return
+
+        x1, x2 = int(xs.min()), int(xs.max()) + 1
+        y1, y2 = int(ys.min()), int(ys.max()) + 1
+        pad_x = max(min_padding, padding * (x2 - x1))
+        pad_y = max(min_padding, padding * (y2 - y1))
+        x1 = max(0, int(x1 - pad_x))
+        y1 = max(0, int(y1 - pad_y))
+        x2 = min(ZONE_WIDTH, int(x2 + pad_x))
+        y2 = min(ZONE_HEIGHT, int(y2 + pad_y))
+
+        if (x2 - x1) * (y2 - y1) <= max_fraction * ZONE_WIDTH * ZONE_HEIGHT:
+            self.box = (x1, y1, x2, y2)
+
+    @property
+    def useful(self):
+        return self.box is not None
+
+    def _frame_box(self, frame):
+        height, width = frame.shape[:2]
+        sx = width / ZONE_WIDTH
+        sy = height / ZONE_HEIGHT
+        x1, y1, x2, y2 = self.box
+        return int(x1 * sx), int(y1 * sy), int(math.ceil(x2 * sx)), int(math.ceil(y2 * sy)), sx, sy
+
+    def crop(self, frame):
+        """View (sem cópia) da ROI no frame, em qualquer resolução."""
+        x1, y1, x2, y2, _, _ = self._frame_box(frame)
+        return frame[y1:y2, x1:x2]
+
+    def imgsz(self, crop, max_imgsz):
+        """Entrada do modelo para o recorte: o tamanho dele em múltiplos do stride, limitado a max_imgsz."""
+        height, width = crop.shape[:2]
+        max_h, max_w = max_imgsz
+        scale = min(1.0, max_h / height, max_w / width)
+        return _ceil_stride(height * scale), _ceil_stride(width * scale)
+
+    def to_zone_coords(self, xyxy, frame):
+        """Caixas no recorte -> coordenadas 640x360 do frame inteiro."""
+        if len(xyxy) == 0:
+            return xyxy
+        x1, y1, _, _, sx, sy = self._frame_box(frame)
+        offset = np.array([x1, y1, x1, y1], dtype=np.float32)
+        scale = np.array([sx, sy, sx, sy], dtype=np.float32)
+        return (xyxy + offset) / scale
+
+
+def compile_rois(zones, **kwargs):
+    """ROI por câmera; câmeras cuja zona cobre quase o frame inteiro ficam de fora."""
+    rois = {}
+    for key, config in zones.items():
+        roi = ZoneROI(config, **kwargs)
+        if roi.useful:
+            rois[key] = roi
+    return rois
@@ -0,0 +1,128 @@
+import itertools
+
+import numpy as np
+
+TRACK_IOU_THRESHOLD = 0.3   # IoU mínimo para associar detecção a um track
+TRACK_MAX_AGE = 2.0         # segundos sem detecção antes de descartar o track (mínimo)
+TRACK_MAX_AGE_UPDATES = 3   # rodadas do detector sem detecção antes de descartar o track
+TRACK_MIN_HITS = 1          # detecções para o track valer como pessoa (1 = igual ao modo sem tracking)
+VELOCITY_SMOOTHING = 0.5
+
+
+def iou_matrix(a, b):
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+class Track:
+    __slots__ = ("id", "box", "velocity", "conf", "updated_at", "predicted_at", "hits", "alerted")
+
+    def __init__(self, track_id, box, conf, timestamp):
+        self.id = track_id
+        self.box = box.astype(np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)  # pixels/segundo em x1, y1, x2, y2
+        self.conf = float(conf)
+        self.updated_at = timestamp
+        self.predicted_at = timestamp
+        self.hits = 1
+        self.alerted = False
+
+    def predict(self, timestamp):
+        dt = timestamp - self.predicted_at
+        if dt > 0:
+            self.box = self.box + self.velocity * dt
+            self.predicted_at = timestamp
+
+    def update(self, box, conf, timestamp):
+        dt = timestamp - self.updated_at
+        if dt > 0:
+            measured = (box - self.box) / dt + self.velocity
+            self.velocity = VELOCITY_SMOOTHING * measured + (1 - VELOCITY_SMOOTHING) * self.velocity
+        self.box = box.astype(np.float32)
+        self.conf = float(conf)
+        self.updated_at = self.predicted_at = timestamp
+        self.hits += 1
+
+
+class IoUTracker:
+    """
+    Tracker leve por câmera: o YOLO roda só nos keyframes (update) e, entre
+    eles, as caixas são propagadas com a velocidade estimada de cada track
+    (predict), sem olhar a imagem. A associação é gulosa por IoU sobre as
+    caixas já propagadas. Cada pessoa recebe um id estável, e
+    new_tracks_in_zone() devolve cada track uma única vez.
+
+    A idade máxima de um track acompanha o intervalo real entre rodadas do
+    detector (amostragem adaptativa, motion gate): no mínimo max_age e no
+    mínimo max_age_updates rodadas sem detecção.
+    """
+
+    def __init__(self, iou_threshold=TRACK_IOU_THRESHOLD, max_age=TRACK_MAX_AGE, min_hits=TRACK_MIN_HITS,
+                 max_age_updates=TRACK_MAX_AGE_UPDATES):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.max_age_updates = max_age_updates
+        self.min_hits = min_hits
+        self.last_update = None
+        self.update_interval = 0.0
+        self.tracks = []
+        self.ids = itertools.count(1)
+        self.created = 0
+
+    def effective_max_age(self):
+        return max(self.max_age, self.max_age_updates * self.update_interval)
+
+    def predict(self, timestamp):
+        for track in self.tracks:
+            track.predict(timestamp)
+        max_age = self.effective_max_age()
+        self.tracks = [t for t in self.tracks if timestamp - t.updated_at <= max_age]
+        return self.tracks
+
+    def update(self, xyxy, conf, timestamp):
+        if self.last_update is not None:
+            self.update_interval = timestamp - self.last_update
+        self.last_update = timestamp
+        self.predict(timestamp)
+
+        unmatched = set(range(len(conf)))
+        if self.tracks and len(conf):
+            ious = iou_matrix(np.stack([t.box for t in self.tracks]), xyxy)
+            # Pares com maior IoU primeiro
+            for flat in np.argsort(-ious, axis=None):
+                track_index, det_index = np.unravel_index(flat, ious.shape)
+                if ious[track_index, det_index] < self.iou_threshold:
+                    break
+                track = self.tracks[track_index]
+                if det_index not in unmatched or track.updated_at == timestamp:
+                    continue
+                track.update(xyxy[det_index], conf[det_index], timestamp)
+                unmatched.discard(det_index)
+
+        for det_index in sorted(unmatched):
+            self.tracks.append(Track(next(self.ids), xyxy[det_index], conf[det_index], timestamp))
+            self.created += 1
+        return self.tracks
+
+    def new_tracks_in_zone(self, zone=None):
+        """Tracks confirmados com centro na zona que ainda não geraram alerta (marca como alertados)."""
+        candidates = [t for t in self.tracks if not t.alerted and t.hits >= self.min_hits]
+        if not candidates:
+            return []
+        if zone is not None:
+            boxes = np.stack([t.box for t in candidates]).astype(np.int32)
+            cx = (boxes[:, 0] + boxes[:, 2]) // 2
+            cy = (boxes[:, 1] + boxes[:, 3]) // 2
+            inside = zone.contains(cx, cy)
+            candidates = [t for t, keep in zip(candidates, inside) if keep]
+        for track in candidates:
+            track.alerted = True
+        return candidates
@@ -0,0 +1,89 @@
+import json
+from ast import literal_eval
+
+import cv2
+import numpy as np
+
+# Resolução em que as coordenadas do zones.json foram desenhadas
+ZONE_WIDTH = 640
+ZONE_HEIGHT = 360
+
+
+class CompiledZone:
+    """
+    Zona do zones.json pré-processada uma única vez por câmera:
+    "side" vira coeficientes de semiplano (a*x + b*y + c) e "area" vira uma
+    máscara na resolução das zonas. contains() testa vários pontos de uma vez.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.type = config["type"]
+        self.coefficients = None
+        self.sign = 0
+        self.mask = None
+
+        if self.type == "side":
+            (x1, y1), (x2, y2) = config["line"]
+            dx = x2 - x1
+            dy = y2 - y1
+            side = config["side"]
+
+            if side in ("top", "bottom") and dy != 0:
+                # Linha inclinada em top/bottom: compara só com o y inicial da linha
+                self.coefficients = (0.0, 1.0, float(-y1))
+                self.sign = -1 if side == "top" else 1
+            else:
+                # Produto vetorial dx*(y - y1) - dy*(x - x1)
+                self.coefficients = (float(-dy), float(dx), float(dy * x1 - dx * y1))
+                self.sign = {"left": 1, "right": -1, "top": 1, "bottom": -1}.get(side, 0)
+
+        elif self.type == "area":
+            self.mask = np.zeros((ZONE_HEIGHT, ZONE_WIDTH), np.uint8)
+            cv2.fillPoly(self.mask, [np.array(config["polygon"], np.int32)], 1)
+            self.mask = self.mask.astype(bool)
+
+    def contains(self, xs, ys):
+        xs = np.asarray(xs, dtype=np.float32)
+        ys = np.asarray(ys, dtype=np.float32)
+
+        if self.coefficients is not None and self.sign:
+            a, b, c = self.coefficients
+            value = a * xs + b * ys + c
+            return value > 0 if self.sign > 0 else value < 0
+
+        if self.mask is not None:
+            xi = np.clip(xs.astype(np.int32), 0, ZONE_WIDTH - 1)
+            yi = np.clip(ys.astype(np.int32), 0, ZONE_HEIGHT - 1)
+            return self.mask[yi, xi]
+
+        return np.zeros(xs.shape, dtype=bool)
+
+
+def load_zones(path="zones.json"):
+    """Lê o zones.json convertendo as chaves "(camera_id, \"{guid}\")" para tuplas."""
+    with open(path, "r") as f:
+        return {literal_eval(key): config for key, config in json.load(f).items()}
+
+
+def compile_zones(zones):
+    return {key: CompiledZone(config) for key, config in zones.items()}
+
+
+def points_in_zone(xs, ys, config):
+    """
+    Versão vetorizada do teste de zona: recebe arrays de coordenadas
+    (no sistema do zones.json) e devolve um array booleano.
+    """
+    zone = config if isinstance(config, CompiledZone) else CompiledZone(config)
+    return zone.contains(xs, ys)
+
+
+def zone_mask(config, width, height):
+    """Máscara booleana (height x width) da zona, reamostrada para a resolução pedida."""
+    sx = ZONE_WIDTH / width
+    sy = ZONE_HEIGHT / height
+    xs = (np.arange(width, dtype=np.float32) + 0.5) * sx
+    ys = (np.arange(height, dtype=np.float32) + 0.5) * sy
+    grid_x, grid_y = np.meshgrid(xs, ys)
+    return points_in_zone(grid_x, grid_y, config)
@@ -0,0 +1,70 @@
+import logging
+import threading
+import time
+
+from events.dispatcher import dispatch_event
+from runtime.metrics import EVENTS_EMITTED, EVENTS_SUPPRESSED
+
+logger = logging.getLogger(__name__)
+
+EVENT_PERSON = "person"
+EVENT_STREAM_ERROR = "stream_error"
+
+# Janela (segundos) em que acionamentos repetidos da mesma câmera viram um só evento
+COALESCE_WINDOWS = {
+    EVENT_PERSON: 30,         # antigo event_delay do monitoring.py
+    EVENT_STREAM_ERROR: 300,
+}
+
+# Tipos que agendam evento no Station; "person" hoje só gera o alerta no log
+DISPATCHED_KINDS = {EVENT_STREAM_ERROR}
+
+
+class EventCoalescer:
+    """
+    Agrupa acionamentos por (dguard_camera_id, recorder_guid) e tipo, valendo
+    para o processo inteiro (não só para a vida de uma CameraThread). O
+    primeiro acionamento de uma janela é emitido; os seguintes são suprimidos
+    e contados até a janela fechar (totais por tipo no /metrics).
+    """
+
+    def __init__(self, windows=None):
+        self.windows = dict(COALESCE_WINDOWS if windows is None else windows)
+        self.lock = threading.Lock()
+        self.last_emitted = {}
+        self.merged = {}
+
+    def should_emit(self, camera_id, recorder_guid, kind):
+        key = (camera_id, recorder_guid, kind)
+        now = time.monotonic()
+        window = self.windows.get(kind, 0)
+
+        with self.lock:
+            last = self.last_emitted.get(key)
+            if last is not None and now - last < window:
+                self.merged[key] = self.merged.get(key, 0) + 1
+                EVENTS_SUPPRESSED.labels(kind).inc()
+                return False
+
+            merged = self.merged.pop(key, 0)
+            self.last_emitted[key] = now
+            EVENTS_EMITTED.labels(kind).inc()
+
+        if merged:
+            logger.info(f"[EVENTS] {merged} acionamento(s) '{kind}' agrupados para a câmera {camera_id} ({recorder_guid})")
+        return True
+
+
+coalescer = EventCoalescer()
+
+
+def report_event(camera_id, recorder_guid, kind):
+    """
+    Registra um acionamento. Retorna True se ele deve ser emitido (primeiro da
+    janela); para os tipos em DISPATCHED_KINDS o evento já é enviado ao Station.
+    """
+    if not coalescer.should_emit(camera_id, recorder_guid, kind):
+        return False
+    if kind in DISPATCHED_KINDS:
+        dispatch_event(camera_id, recorder_guid)
+    return True
@@ -0,0 +1,144 @@
+import heapq
+import logging
+import queue
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.config import HEADERS
+from events.scheduler import REQUEST_TIMEOUT, delete_event, set_event_schedule
+from runtime.metrics import STATION_REQUEST_FAILURES, STATION_REQUEST_LATENCY
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDING_EVENTS = 1000
+HTTP_POOL_SIZE = 4
+
+
+def _station_operation(url):
+    # Poucos valores fixos para não explodir a cardinalidade (a URL tem o horário)
+    if "scheduled-times" in url:
+        return "scheduled_times"
+    if "fullscreen-camera" in url:
+        return "fullscreen_camera"
+    return "other"
+
+
+def _record_station_response(response, *args, **kwargs):
+    labels = (response.request.method, _station_operation(response.request.url))
+    STATION_REQUEST_LATENCY.labels(*labels).observe(response.elapsed.total_seconds())
+    if response.status_code >= 400:
+        STATION_REQUEST_FAILURES.labels(*labels).inc()
+
+
+def _record_station_exception(error):
+    request = getattr(error, "request", None)
+    if request is None:
+        STATION_REQUEST_FAILURES.labels("unknown", "other").inc()
+    else:
+        STATION_REQUEST_FAILURES.labels(request.method, _station_operation(request.url)).inc()
+
+
+class EventDispatcher(threading.Thread):
+    """
+    Único worker que fala com a API do Station. Quem aciona um evento só
+    enfileira e retorna na hora; o worker usa uma requests.Session com pool
+    de conexões e guarda as remoções pendentes num heap de horários, em vez
+    de uma thread dormindo por evento.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING_EVENTS, pool_size=HTTP_POOL_SIZE):
+        super().__init__(daemon=True, name="EventDispatcher")
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.pending_deletes = []  # heap de (horário monotônico, formatted_time); só o worker mexe
+        self.running = True
+
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        self.session.verify = False
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.hooks["response"].append(_record_station_response)
+
+        self.start()
+
+    def dispatch(self, camera_id, recorder_guid):
+        try:
+            self.queue.put_nowait((camera_id, recorder_guid))
+            return True
+        except queue.Full:
+            logger.warning(f"[EVENTS] Fila de eventos cheia, descartando evento da câmera {camera_id} ({recorder_guid})")
+            return False
+
+    def _schedule_delete(self, formatted_time, delay_seconds=10):
+        heapq.heappush(self.pending_deletes, (time.monotonic() + delay_seconds, formatted_time))
+
+    def _run_due_deletes(self, force=False):
+        now = time.monotonic()
+        while self.pending_deletes and (force or self.pending_deletes[0][0] <= now):
+            _, formatted_time = heapq.heappop(self.pending_deletes)
+            try:
+                delete_event(formatted_time, session=self.session)
+            except requests.exceptions.Timeout as e:
+                _record_station_exception(e)
+                logger.error(f"[EVENTS] Station não respondeu em {REQUEST_TIMEOUT}s ao deletar evento {formatted_time}")
+            except requests.exceptions.RequestException as e:
+                _record_station_exception(e)
+                logger.error(f"[EVENTS] Erro ao deletar evento {formatted_time}: {e}")
+
+    def run(self):
+        while self.running:
+            timeout = 1.0
+            if self.pending_deletes:
+                timeout = max(0.0, min(timeout, self.pending_deletes[0][0] - time.monotonic()))
+
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is not None:
+                camera_id, recorder_guid = item
+                try:
+                    set_event_schedule(camera_id, recorder_guid, session=self.session,
+                                       schedule_delete=self._schedule_delete)
+                except requests.exceptions.Timeout as e:
+                    _record_station_exception(e)
+                    logger.error(f"[EVENTS] Station não respondeu em {REQUEST_TIMEOUT}s ao agendar evento da câmera "
+                                 f"{camera_id} ({recorder_guid})")
+                except requests.exceptions.RequestException as e:
+                    _record_station_exception(e)
+                    logger.error(f"[EVENTS] Erro ao agendar evento da câmera {camera_id} ({recorder_guid}): {e}")
+                except Exception as e:
+                    logger.exception(f"[EVENTS] Erro inesperado ao agendar evento: {e}")
+
+            self._run_due_deletes()
+
+        # Não deixa eventos agendados para trás ao encerrar
+        self._run_due_deletes(force=True)
+
+    def stop(self):
+        self.running = False
+        if self.is_alive():
+            self.join(timeout=10)
+        self.session.close()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = EventDispatcher()
+        return _dispatcher
+
+
+def dispatch_event(camera_id, recorder_guid):
+    """Enfileira o evento para o Station sem bloquear quem chamou."""
+    return get_dispatcher().dispatch(camera_id, recorder_guid)
@@ -5,27 +5,44 @@ from config.config import HEADERS
 from guids.station_guids import STATION_PEOPLE_DETECTION_EVENT, STATION_BASE_URL, STATION_SOURCE, STATION_SOURCE_FULLTIME
 import threading
 
+# (conexão, leitura) em segundos: um Station travado não segura a fila de eventos
+REQUEST_TIMEOUT = (5, 10)
+
+
+def delete_event(formatted_time, session=None):
+    http = session or requests
+    delete_event_url = (
+        f"{STATION_BASE_URL}/custom-events/"
+        f"{STATION_PEOPLE_DETECTION_EVENT}/scheduled-times/{formatted_time}"
+    )
+    delete_response = http.delete(
+        delete_event_url, headers=HEADERS, verify=False, timeout=REQUEST_TIMEOUT
+    )
+
+    if delete_response.status_code == 204:
+        print(f"Evento com horário {formatted_time} deletado com sucesso!")
+    else:
+        print(f"Erro ao deletar evento: {delete_response.status_code} - {delete_response.text}")
+    return delete_response
+
 
 def delay_deleting_event(formatted_time, delay_seconds=10):
     def delete():
         time.sleep(delay_seconds)
-        delete_event_url = (
-            f"{STATION_BASE_URL}/custom-events/"
-            f"{STATION_PEOPLE_DETECTION_EVENT}/scheduled-times/{formatted_time}"
-        )
-        delete_response = requests.delete(
-            delete_event_url, headers=HEADERS, verify=False
-        )
-
-        if delete_response.status_code == 204:
-            print(f"Evento com horário {formatted_time} deletado com sucesso!")
-        else:
-            print(f"Erro ao deletar evento: {delete_response.status_code} - {delete_response.text}")
+        delete_event(formatted_time)
 
     threading.Thread(target=delete, daemon=True).start()
 
 
-def set_event_schedule(camera_id, recorder_guid, max_retries=5):
+def set_event_schedule(camera_id, recorder_guid, max_retries=5, session=None, schedule_delete=None):
+    """
+    Agenda o evento de detecção no Station e aciona a tela cheia da câmera.
+    session: requests.Session reaproveitada (padrão: requests sem pool).
+    schedule_delete: função (formatted_time, delay_seconds) que agenda a remoção
+    do evento; por padrão abre uma thread que dorme até a hora de deletar.
+    """
+    http = session or requests
+    schedule_delete = schedule_delete or delay_deleting_event
     now = datetime.now()
     scheduled_time = now  # + timedelta(seconds=5)
 
@@ -39,7 +56,7 @@ def set_event_schedule(camera_id, recorder_guid, max_retries=5):
         )
 
         data = {"scheduledTime": formatted_time}
-        response = requests.post(add_event_url, headers=HEADERS, json=data, verify=False)
+        response = http.post(add_event_url, headers=HEADERS, json=data, verify=False, timeout=REQUEST_TIMEOUT)
 
         if response.status_code in (200, 201):
             print("Evento agendado com sucesso! Time sent:", data)
@@ -72,7 +89,7 @@ def set_event_schedule(camera_id, recorder_guid, max_retries=5):
         "legendShadowColor": "FF0000"
     }
 
-    response = requests.put(update_camera_url, headers=HEADERS, json=data, verify=False)
+    response = http.put(update_camera_url, headers=HEADERS, json=data, verify=False, timeout=REQUEST_TIMEOUT)
 
     if response.status_code in (200, 201):
         print("Ação de câmera em tela cheia agendada com sucesso!")
@@ -80,6 +97,6 @@ def set_event_schedule(camera_id, recorder_guid, max_retries=5):
         print(f"Erro ao agendar ação de câmera em tela cheia: {response.status_code} - {response.text}")
 
     # 3. Deletar evento depois, sem travar
-    delay_deleting_event(formatted_time, delay_seconds=10)
+    schedule_delete(formatted_time, delay_seconds=10)
 
     return response, None
@@ -0,0 +1,182 @@
+import glob
+import logging
+import os
+import subprocess
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+logger = logging.getLogger(__name__)
+
+BACKEND_PYTORCH = "pytorch"
+BACKEND_ONNX = "onnx"
+BACKEND_OPENVINO = "openvino"
+BACKENDS = (BACKEND_PYTORCH, BACKEND_ONNX, BACKEND_OPENVINO)
+
+DEFAULT_MODEL_PATH = "models/yolov8n.pt"
+
+# Entrada retangular fixa (altura, largura): 640x360 arredondado para o stride 32
+INPUT_SIZE = (384, 640)
+
+# ONNX/OpenVINO exportados com forma estática (lote 1, INPUT_SIZE) por padrão:
+# é o que permite as otimizações de forma fixa do ORT/OpenVINO. Com forma
+# dinâmica o modelo aceita lotes e outras entradas (recorte de ROI, amostragem
+# adaptativa); compare os dois com benchmarks/backend_benchmark.py.
+STATIC_EXPORT_BATCH = 1
+
+
+def is_static(backend, dynamic=False):
+    return backend != BACKEND_PYTORCH and not dynamic
+
+
+def model_batch_limit(backend, dynamic=False):
+    """Máximo de frames por chamada ao modelo (None = sem limite)."""
+    return STATIC_EXPORT_BATCH if is_static(backend, dynamic) else None
+
+
+def _exported_path(model_path, backend, int8, dynamic=False, imgsz=INPUT_SIZE):
+    base, _ = os.path.splitext(model_path)
+    suffix = "_int8" if int8 else ""
+    # Forma no nome: um export dinâmico antigo nunca é carregado como estático
+    suffix += "_dynamic" if dynamic else f"_{imgsz[1]}x{imgsz[0]}"
+    if backend == BACKEND_ONNX:
+        return f"{base}{suffix}.onnx"
+    return f"{base}{suffix}_openvino_model"
+
+
+def save_calibration_frames(rtsp_urls, output_dir, frames_per_camera=20, interval=2,
+                            width=640, height=360, timeout=60):
+    """
+    Salva frames das nossas próprias câmeras (já na resolução de análise) para
+    calibrar a quantização INT8.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for index, rtsp_url in enumerate(rtsp_urls):
+        cmd = [
+            "ffmpeg", "-loglevel", "error", "-y",
+            "-rtsp_transport", "tcp",
+            "-i", rtsp_url,
+            "-vf", f"fps=1/{interval},scale={width}:{height}",
+            "-frames:v", str(frames_per_camera),
+            os.path.join(output_dir, f"cam{index:03d}_%03d.jpg")
+        ]
+        try:
+            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=timeout, check=True)
+        except (subprocess.SubprocessError, OSError) as e:
+            logger.error(f"[CALIBRATION] Falha ao capturar frames da câmera {index}: {e}")
+
+    return sorted(glob.glob(os.path.join(output_dir, "*.jpg")))
+
+
+def preprocess(frame, imgsz=INPUT_SIZE):
+    """Letterbox + BGR->RGB + CHW normalizado, igual ao pré-processamento do ultralytics."""
+    target_h, target_w = imgsz
+    h, w = frame.shape[:2]
+    scale = min(target_h / h, target_w / w)
+    new_w, new_h = round(w * scale), round(h * scale)
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    canvas = np.full((target_h, target_w, 3), 114, np.uint8)
+    top = (target_h - new_h) // 2
+    left = (target_w - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+
+    tensor = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return np.ascontiguousarray(tensor[None])
+
+
+def _quantize_onnx_int8(fp32_path, int8_path, calibration_images, imgsz):
+    try:
+        import onnxruntime
+        from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    except ImportError as e:
+        raise RuntimeError("Quantização INT8 em ONNX requer o pacote onnxruntime") from e
+
+    input_name = onnxruntime.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.images = iter(calibration_images)
+
+        def get_next(self):
+            for path in self.images:
+                frame = cv2.imread(path)
+                if frame is not None:
+                    return {input_name: preprocess(frame, imgsz)}
+            return None
+
+    quantize_static(
+        fp32_path,
+        int8_path,
+        FrameReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+    return int8_path
+
+
+def _write_calibration_yaml(calibration_dir, names):
+    yaml_path = os.path.join(calibration_dir, "calibration.yaml")
+    lines = [f"path: {os.path.abspath(calibration_dir)}", "train: .", "val: .", "names:"]
+    lines += [f"  {idx}: {name}" for idx, name in names.items()]
+    with open(yaml_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return yaml_path
+
+
+def export_model(backend, model_path=DEFAULT_MODEL_PATH, int8=False, calibration_dir=None, imgsz=INPUT_SIZE,
+                 dynamic=False):
+    """Exporta o modelo PyTorch para ONNX/OpenVINO (opcionalmente INT8) e devolve o caminho gerado."""
+    if backend not in (BACKEND_ONNX, BACKEND_OPENVINO):
+        raise ValueError(f"Backend sem exportação: {backend}")
+
+    target = _exported_path(model_path, backend, int8, dynamic, imgsz)
+    if os.path.exists(target):
+        return target
+
+    calibration_images = sorted(glob.glob(os.path.join(calibration_dir, "*.jpg"))) if calibration_dir else []
+    if int8 and not calibration_images:
+        raise ValueError("Quantização INT8 requer frames de calibração (veja save_calibration_frames)")
+
+    model = YOLO(model_path)
+    shape = "dinâmica" if dynamic else f"fixa {imgsz}"
+    logger.info(f"[BACKEND] Exportando {model_path} para {backend}{' INT8' if int8 else ''} com entrada {shape}")
+
+    # Estático: lote e entrada fixos no grafo
+    shape_kwargs = {"dynamic": True} if dynamic else {"dynamic": False, "batch": STATIC_EXPORT_BATCH}
+
+    if backend == BACKEND_ONNX:
+        fp32_path = model.export(format="onnx", imgsz=imgsz, simplify=True, **shape_kwargs)
+        if not int8:
+            os.replace(fp32_path, target)
+            return target
+        return _quantize_onnx_int8(fp32_path, target, calibration_images, imgsz)
+
+    kwargs = {}
+    if int8:
+        kwargs["data"] = _write_calibration_yaml(calibration_dir, model.names)
+    exported = model.export(format="openvino", imgsz=imgsz, int8=int8, **shape_kwargs, **kwargs)
+    if exported != target and os.path.exists(exported):
+        os.replace(exported, target)
+    return target
+
+
+def load_model(backend=BACKEND_PYTORCH, model_path=DEFAULT_MODEL_PATH, int8=False, calibration_dir=None,
+               imgsz=INPUT_SIZE, dynamic=False):
+    """
+    Carrega o YOLO no backend pedido. Para ONNX/OpenVINO o modelo é exportado
+    na primeira vez; o objeto devolvido tem a mesma interface de YOLO().
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de inferência desconhecido: {backend} (opções: {', '.join(BACKENDS)})")
+
+    if backend == BACKEND_PYTORCH:
+        return YOLO(model_path)
+
+    path = export_model(backend, model_path, int8=int8, calibration_dir=calibration_dir, imgsz=imgsz,
+                        dynamic=dynamic)
+    logger.info(f"[BACKEND] Carregando modelo {path}")
+    return YOLO(path, task="detect")
@@ -0,0 +1,161 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class _InferenceRequest:
+    __slots__ = ("frame", "camera_key", "imgsz", "future", "enqueued_at")
+
+    def __init__(self, frame, camera_key, imgsz=None):
+        self.frame = frame
+        self.camera_key = camera_key
+        self.imgsz = imgsz
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchInferenceEngine(threading.Thread):
+    """
+    Junta os frames de todas as CameraThreads numa fila e roda o YOLO em lote.
+    O lote é enviado quando atinge batch_size ou quando o frame mais antigo
+    espera mais que max_wait segundos. Cada resultado volta para a câmera
+    através do Future retornado por submit(). model_batch limita os frames por
+    chamada ao modelo (exports estáticos de ONNX/OpenVINO têm lote fixo).
+    """
+
+    def __init__(self, model, batch_size=8, max_wait=0.05, stats_interval=60, model_batch=None, **model_kwargs):
+        super().__init__(daemon=True, name="BatchInferenceEngine")
+        self.model = model
+        self.batch_size = batch_size
+        self.model_batch = model_batch or batch_size
+        self.max_wait = max_wait
+        self.stats_interval = stats_interval
+        self.model_kwargs = model_kwargs
+        self.queue = queue.Queue()
+        self.running = True
+
+        self.stats_lock = threading.Lock()
+        self._reset_stats()
+        self._last_stats_log = time.time()
+        self.start()
+
+    def _reset_stats(self):
+        self.batches = 0
+        self.frames = 0
+        self.total_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.total_inference = 0.0
+
+    def submit(self, frame, camera_key=None, imgsz=None):
+        request = _InferenceRequest(frame, camera_key, imgsz)
+        self.queue.put(request)
+        return request.future
+
+    def infer(self, frame, camera_key=None, timeout=None, imgsz=None):
+        return self.submit(frame, camera_key, imgsz).result(timeout=timeout)
+
+    def _collect_batch(self):
+        try:
+            first = self.queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        if first is None:
+            return []
+
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                break
+            batch.append(request)
+        return batch
+
+    def run(self):
+        while self.running:
+            batch = self._collect_batch()
+            if batch:
+                self._run_batch(batch)
+            self._maybe_log_stats()
+
+    def _run_batch(self, batch):
+        started = time.perf_counter()
+        waits = [started - request.enqueued_at for request in batch]
+
+        # Frames com entrada do modelo diferente (amostragem adaptativa) vão em sublotes
+        groups = {}
+        for request in batch:
+            groups.setdefault(request.imgsz, []).append(request)
+
+        chunks = []
+        for imgsz, requests in groups.items():
+            for start in range(0, len(requests), self.model_batch):
+                chunks.append((imgsz, requests[start:start + self.model_batch]))
+
+        for imgsz, requests in chunks:
+            kwargs = self.model_kwargs if imgsz is None else {**self.model_kwargs, "imgsz": imgsz}
+            try:
+                results = self.model([request.frame for request in requests], verbose=False, **kwargs)
+            except Exception as e:
+                logger.exception(f"[BATCH] Erro ao executar inferência em lote ({len(requests)} frames): {e}")
+                for request in requests:
+                    request.future.set_exception(e)
+                continue
+
+            for request, result in zip(requests, results):
+                request.future.set_result(result)
+
+        elapsed = time.perf_counter() - started
+
+        with self.stats_lock:
+            self.batches += 1
+            self.frames += len(batch)
+            self.total_wait += sum(waits)
+            self.max_queue_wait = max(self.max_queue_wait, max(waits))
+            self.total_inference += elapsed
+
+    def stats(self):
+        with self.stats_lock:
+            batches = self.batches or 1
+            frames = self.frames or 1
+            return {
+                "batches": self.batches,
+                "frames": self.frames,
+                "fill_ratio": self.frames / (batches * self.batch_size),
+                "avg_queue_wait_ms": 1000 * self.total_wait / frames,
+                "max_queue_wait_ms": 1000 * self.max_queue_wait,
+                "avg_batch_inference_ms": 1000 * self.total_inference / batches,
+                "queue_depth": self.queue.qsize(),
+            }
+
+    def _maybe_log_stats(self):
+        if time.time() - self._last_stats_log < self.stats_interval:
+            return
+        self._last_stats_log = time.time()
+
+        if self.frames:
+            s = self.stats()
+            logger.info(
+                f"[BATCH] Lotes: {s['batches']} | Frames: {s['frames']} | "
+                f"Preenchimento: {s['fill_ratio']:.0%} | "
+                f"Espera na fila: média {s['avg_queue_wait_ms']:.1f}ms, máx {s['max_queue_wait_ms']:.1f}ms | "
+                f"Inferência por lote: {s['avg_batch_inference_ms']:.1f}ms"
+            )
+            with self.stats_lock:
+                self._reset_stats()
+
+    def stop(self):
+        self.running = False
+        self.queue.put(None)
+        if self.is_alive():
+            self.join(timeout=5)
@@ -0,0 +1,231 @@
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Maior frame aceito por slot de memória compartilhada (1080p BGR)
+MAX_FRAME_BYTES = 1920 * 1080 * 3
+WORKER_CHECK_INTERVAL = 1.0  # segundos entre checagens de workers mortos
+WORKER_HANG_TIMEOUT = 60     # segundos com um pedido sem resposta até o worker ser considerado travado
+
+
+def _worker_main(worker_index, shm_names, request_queue, result_queue, backend, model_path, int8,
+                 calibration_dir, predict_kwargs, torch_threads, max_batch, dynamic):
+    # Importa aqui para o processo pai não pagar por isso duas vezes
+    import torch
+    from detection.postprocess import boxes_to_arrays
+    from inference.backends import load_model
+
+    torch.set_num_threads(torch_threads)
+    model = load_model(backend, model_path, int8=int8, calibration_dir=calibration_dir, dynamic=dynamic)
+    slots = [shared_memory.SharedMemory(name=name) for name in shm_names]
+
+    try:
+        while True:
+            item = request_queue.get()
+            if item is None:
+                break
+
+            # Junta o que já estiver na fila num lote, sem esperar
+            batch = [item]
+            while len(batch) < max_batch:
+                try:
+                    item = request_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    request_queue.put(None)
+                    break
+                batch.append(item)
+
+            # Entradas do modelo diferentes (amostragem adaptativa) rodam em sublotes
+            groups = {}
+            for request in batch:
+                groups.setdefault(request[3], []).append(request)
+
+            for imgsz, requests in groups.items():
+                kwargs = predict_kwargs if imgsz is None else {**predict_kwargs, "imgsz": imgsz}
+                frames = [np.ndarray(shape, np.uint8, buffer=slots[slot].buf) for _, slot, shape, _ in requests]
+                try:
+                    results = model(frames, verbose=False, **kwargs)
+                    for (request_id, _, _, _), result in zip(requests, results):
+                        xyxy, conf = boxes_to_arrays(result)
+                        result_queue.put((request_id, xyxy, conf, None))
+                except Exception as e:
+                    for request_id, _, _, _ in requests:
+                        result_queue.put((request_id, None, None, f"worker {worker_index}: {e!r}"))
+                finally:
+                    del frames
+    finally:
+        for shm in slots:
+            shm.close()
+
+
+class InferenceProcessPool:
+    """
+    N processos de inferência, cada um com o próprio interpretador e pool de
+    threads do PyTorch. Os frames vão para slots de multiprocessing.shared_memory
+    (sem pickle dos arrays); pela fila só trafegam índices e as detecções.
+
+    Cada worker tem a própria fila de pedidos, então o coletor sabe o que
+    estava com um worker que morreu (OOM, segfault no ORT/OpenVINO): os
+    pedidos dele falham, os slots voltam para o pool e o worker é recriado.
+    """
+
+    def __init__(self, num_workers=None, torch_threads=1, slots_per_worker=4, max_batch=4,
+                 backend="pytorch", model_path="models/yolov8n.pt", int8=False, calibration_dir=None,
+                 max_frame_bytes=MAX_FRAME_BYTES, dynamic=False, **predict_kwargs):
+        self.num_workers = num_workers or max(1, (os.cpu_count() or 1) // torch_threads)
+        self.max_frame_bytes = max_frame_bytes
+
+        self.ctx = mp.get_context("spawn")
+        self.result_queue = self.ctx.Queue()
+
+        self.slots = [shared_memory.SharedMemory(create=True, size=max_frame_bytes)
+                      for _ in range(self.num_workers * slots_per_worker)]
+        self.free_slots = queue.Queue()
+        for index in range(len(self.slots)):
+            self.free_slots.put(index)
+
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.request_ids = itertools.count()
+        self.running = True
+
+        self.worker_args = (backend, model_path, int8, calibration_dir, predict_kwargs, torch_threads, max_batch,
+                            dynamic)
+        self.request_queues = [None] * self.num_workers
+        self.processes = [None] * self.num_workers
+        self.restarts = 0
+        for worker_index in range(self.num_workers):
+            self._start_worker(worker_index)
+
+        self.collector = threading.Thread(target=self._collect_results, daemon=True, name="InferenceCollector")
+        self.collector.start()
+        logger.info(f"[WORKERS] {self.num_workers} processos de inferência iniciados "
+                    f"({torch_threads} thread(s) PyTorch cada, {len(self.slots)} slots)")
+
+    def _start_worker(self, worker_index):
+        # Fila nova: pedidos na fila de um worker morto já foram dados como falha
+        request_queue = self.ctx.Queue()
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(worker_index, [shm.name for shm in self.slots], request_queue, self.result_queue,
+                  *self.worker_args),
+            daemon=True,
+            name=f"InferenceWorker-{worker_index}"
+        )
+        process.start()
+        self.request_queues[worker_index] = request_queue
+        self.processes[worker_index] = process
+
+    def fits(self, frame):
+        return frame.nbytes <= self.max_frame_bytes
+
+    def submit(self, frame, camera_key=None, imgsz=None, timeout=None):
+        if not self.fits(frame):
+            raise ValueError(f"Frame de {frame.nbytes} bytes excede o slot de {self.max_frame_bytes} bytes")
+
+        # Bloqueia se todos os slots estiverem em uso (contrapressão), no máximo `timeout` segundos
+        try:
+            slot = self.free_slots.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"nenhum slot de inferência livre em {timeout}s") from None
+        np.ndarray(frame.shape, np.uint8, buffer=self.slots[slot].buf)[:] = frame
+
+        future = Future()
+        request_id = next(self.request_ids)
+        with self.pending_lock:
+            # Worker com menos pedidos pendentes
+            load = [0] * self.num_workers
+            for _, _, worker_index, _ in self.pending.values():
+                load[worker_index] += 1
+            worker_index = load.index(min(load))
+            self.pending[request_id] = (future, slot, worker_index, time.monotonic())
+            self.request_queues[worker_index].put((request_id, slot, frame.shape, imgsz))
+        return future
+
+    def infer(self, frame, camera_key=None, timeout=None, imgsz=None):
+        # Mesmo prazo para conseguir o slot e para a resposta
+        deadline = None if timeout is None else time.monotonic() + timeout
+        future = self.submit(frame, camera_key, imgsz, timeout=timeout)
+        return future.result(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for worker_index, process in enumerate(self.processes):
+            if not self.running:
+                return
+            if process.is_alive():
+                with self.pending_lock:
+                    oldest = min((entry[3] for entry in self.pending.values() if entry[2] == worker_index),
+                                 default=None)
+                if oldest is not None and now - oldest > WORKER_HANG_TIMEOUT:
+                    # Vivo mas travado: os slots dele nunca voltariam; mata e recria na próxima checagem
+                    logger.error(f"[WORKERS] Worker {worker_index} sem resposta há {now - oldest:.0f}s, encerrando")
+                    process.kill()
+                continue
+
+            with self.pending_lock:
+                lost = {request_id: entry for request_id, entry in self.pending.items() if entry[2] == worker_index}
+                for request_id in lost:
+                    del self.pending[request_id]
+                self._start_worker(worker_index)
+            self.restarts += 1
+            logger.error(f"[WORKERS] Worker {worker_index} morreu (exitcode {process.exitcode}); "
+                         f"{len(lost)} pedido(s) falharam, worker recriado")
+
+            for future, slot, _, _ in lost.values():
+                self.free_slots.put(slot)
+                future.set_exception(RuntimeError(f"worker {worker_index} morreu (exitcode {process.exitcode})"))
+
+    def _collect_results(self):
+        last_check = time.monotonic()
+        while self.running:
+            if time.monotonic() - last_check >= WORKER_CHECK_INTERVAL:
+                last_check = time.monotonic()
+                self._check_workers()
+            try:
+                item = self.result_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if item is None:
+                break
+
+            request_id, xyxy, conf, error = item
+            with self.pending_lock:
+                future, slot, _, _ = self.pending.pop(request_id, (None, None, None, None))
+            if slot is not None:
+                self.free_slots.put(slot)
+            if future is None:
+                continue
+
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result((xyxy, conf))
+
+    def stop(self):
+        self.running = False
+        for request_queue in self.request_queues:
+            request_queue.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+        self.result_queue.put(None)
+        self.collector.join(timeout=5)
+
+        for shm in self.slots:
+            shm.close()
+            shm.unlink()
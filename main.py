@@ -1,9 +1,28 @@
 from fastapi import FastAPI
+from fastapi.responses import Response
 from api.routes import router as api_router
+from api.controller import patrol
+from runtime.metrics import CONTENT_TYPE, render as render_metrics
 import uvicorn
 
+# Inicia a patrulha contínua junto com o servidor
+PATROL_ON_STARTUP = False
+
 app = FastAPI()
 app.include_router(api_router)
 
+
+@app.on_event("startup")
+async def start_patrol():
+    if PATROL_ON_STARTUP:
+        patrol.start()
+
+
+@app.get("/metrics")
+async def metrics():
+    # Formato texto do Prometheus
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
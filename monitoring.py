@@ -1,18 +1,32 @@
-import sqlite3
-import subprocess
 import threading
 import time
 import cv2
 import json
 import os
 import logging
-import numpy as np
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime
 from urllib.parse import urlparse, urlunparse
 from ast import literal_eval
-from ultralytics import YOLO
-from events.scheduler import set_event_schedule
+from events.coalescer import EVENT_PERSON, EVENT_STREAM_ERROR, coalescer, report_event
+from inference.backends import BACKEND_PYTORCH, INPUT_SIZE, is_static, load_model, model_batch_limit
+from inference.batch_engine import BatchInferenceEngine
+from inference.process_pool import InferenceProcessPool
+from detection.motion_gate import MotionGate
+from detection.postprocess import EMPTY_BOXES, EMPTY_CONF, boxes_to_arrays, filter_detections
+from detection.roi import compile_rois
+from detection.tracker import IoUTracker
+from detection.zones import compile_zones
+from streams.ffmpeg_reader import CAPTURE_MODE_FULL, CAPTURE_MODE_KEYFRAME, CAPTURE_MODE_SCALED, SCALED_CAPTURE_MODES
+from streams.session_manager import StreamSessionManager
+from db.camera_registry import CameraRegistry
+from db.schema import connect
+from db.stream_metadata import refresh_in_background
+from db.stream_stats import load_stream_selection_info, record_stream_result
+from streams.selection import rank_streams
+from runtime.adaptive_sampling import LoadController
+from runtime.admission import PRIORITY_ALARM, PRIORITY_ROUTINE, AdmissionScheduler
+from runtime import metrics
 
 # Caminho para salvar os logs fora do projeto
 log_dir = r"C:\Users\dcalebe\Documents\Logs-Deteccao"
@@ -41,6 +55,12 @@ logger.addHandler(file_handler)
 logger.addHandler(console_handler)
 
 SHOW_VIDEO = False
+
+CAMERA_STATUS_QUEUED = "queued"
+CAMERA_STATUS_RUNNING = "running"
+CAMERA_STATUS_DETECTED = "detected"
+CAMERA_STATUS_NO_DETECTION = "no_detection"
+CAMERA_STATUS_ERROR = "error"
 CONFIDENCE_THRESHOLD = 0.5
 RESIZE_WIDTH = 640
 RESIZE_HEIGHT = 360
@@ -48,55 +68,225 @@ PROCESS_EVERY = 5
 event_delay = 30
 MAX_ACTIVE_CAMERAS = 10
 
-model = YOLO('models/yolov8n.pt')
+# Modo de captura padrão ("full", "scaled" ou "keyframe", ver streams/ffmpeg_reader.py)
+DEFAULT_CAPTURE_MODE = CAPTURE_MODE_FULL
+ANALYSIS_FPS = 5
+
+# Modo "keyframe": primeira passada barata; pessoa num keyframe abre o stream
+# neste modo para confirmar em taxa cheia, com pelo menos esta janela
+KEYFRAME_ESCALATION_MODE = CAPTURE_MODE_SCALED
+KEYFRAME_ESCALATION_WINDOW = 10  # segundos
+
+# Varreduras da patrulha usam o modo keyframe (None = modo configurado da câmera)
+PATROL_CAPTURE_MODE = CAPTURE_MODE_KEYFRAME
+
+DEFAULT_CAMERA_SETTINGS = {
+    "capture_mode": DEFAULT_CAPTURE_MODE,
+    "analysis_fps": ANALYSIS_FPS,
+    # Filtro de movimento antes do YOLO
+    "motion_gate": True,
+    "motion_sensitivity": 25,          # diferença mínima de intensidade (0-255) por pixel
+    "motion_min_changed_ratio": 0.002,  # fração mínima de pixels alterados para rodar o YOLO
+    "motion_zone_only": True,          # considera só a zona do zones.json, se existir
+    "motion_max_skip_seconds": 10,     # força uma inferência periódica mesmo sem movimento
+    # Amostragem adaptativa à carga: limites da degradação por câmera
+    "adaptive_sampling": True,
+    "max_process_every": PROCESS_EVERY * 4,
+    "min_inference_width": 320,
+    # Detecção + tracking: YOLO só a cada N frames processados, um alerta por pessoa (id estável)
+    "tracking": False,
+    "tracking_keyframe_every": 3,
+    # Inferência só no retângulo da zona (com margem), recortado do frame original
+    "roi_crop": False,
+}
+
+# Inferência em lote compartilhada entre todas as câmeras
+USE_BATCH_INFERENCE = True
+BATCH_SIZE = 8
+BATCH_MAX_WAIT = 0.05  # segundos
+BATCH_STATS_INTERVAL = 60  # segundos
+
+# Streams persistentes: o ffmpeg de cada câmera continua aberto entre análises
+USE_PERSISTENT_STREAMS = True
+MAX_OPEN_STREAMS = 20
+STREAM_IDLE_TIMEOUT = 120  # segundos sem análise antes de fechar o stream
+ANALYSIS_WINDOW = 20  # segundos de análise por acionamento
+
+# Escolha do stream por custo de decodificação, resolução e falhas medidas
+# (tabela stream_stats); sem frames no prazo, passa para o próximo stream
+USE_STREAM_SELECTION = True
+STREAM_FIRST_FRAME_TIMEOUT = 10  # segundos
+KEYFRAME_FIRST_FRAME_TIMEOUT = 20  # segundos; no modo keyframe inclui esperar um GOP inteiro
+
+# Backend de inferência: "pytorch", "onnx" ou "openvino" (ver inference/backends.py)
+INFERENCE_BACKEND = BACKEND_PYTORCH
+INFERENCE_INT8 = False
+# ONNX/OpenVINO com forma dinâmica (lote e entrada variáveis). Estático (padrão)
+# fixa lote 1 e entrada INPUT_SIZE: recorte de ROI e amostragem adaptativa
+# continuam funcionando, mas sempre com a entrada cheia do modelo
+INFERENCE_DYNAMIC_SHAPES = False
+STATIC_INPUT = is_static(INFERENCE_BACKEND, INFERENCE_DYNAMIC_SHAPES)
+CALIBRATION_DIR = 'models/calibration'
+MODEL_PATH = 'models/yolov8n.pt'
+
+# Processos de inferência com frames em memória compartilhada
+USE_INFERENCE_PROCESSES = False
+INFERENCE_WORKERS = None  # None = núcleos / TORCH_THREADS_PER_WORKER
+TORCH_THREADS_PER_WORKER = 1
+INFERENCE_TIMEOUT = 30  # segundos esperando um worker antes de desistir do frame
+
+# Com processos de inferência o modelo só é carregado nos workers
+model = None if USE_INFERENCE_PROCESSES else load_model(
+    INFERENCE_BACKEND, MODEL_PATH, int8=INFERENCE_INT8, calibration_dir=CALIBRATION_DIR,
+    dynamic=INFERENCE_DYNAMIC_SHAPES
+)
+
+inference_engine = BatchInferenceEngine(
+    model,
+    batch_size=BATCH_SIZE,
+    max_wait=BATCH_MAX_WAIT,
+    stats_interval=BATCH_STATS_INTERVAL,
+    model_batch=model_batch_limit(INFERENCE_BACKEND, INFERENCE_DYNAMIC_SHAPES),
+    classes=[0],
+    conf=CONFIDENCE_THRESHOLD,
+    imgsz=INPUT_SIZE
+) if USE_BATCH_INFERENCE and model is not None else None
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+# Frames maiores que o slot de memória compartilhada (câmeras acima de 1080p no
+# modo "full") rodam num modelo local, carregado só se aparecer um
+_fallback_model = None
+_fallback_model_lock = threading.Lock()
+
+
+def get_process_pool():
+    # Criado só no primeiro uso: com "spawn" os filhos reimportam este módulo
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = InferenceProcessPool(
+                num_workers=INFERENCE_WORKERS,
+                torch_threads=TORCH_THREADS_PER_WORKER,
+                backend=INFERENCE_BACKEND,
+                model_path=MODEL_PATH,
+                int8=INFERENCE_INT8,
+                calibration_dir=CALIBRATION_DIR,
+                dynamic=INFERENCE_DYNAMIC_SHAPES,
+                max_batch=model_batch_limit(INFERENCE_BACKEND, INFERENCE_DYNAMIC_SHAPES) or 4,
+                classes=[0],
+                conf=CONFIDENCE_THRESHOLD,
+                imgsz=INPUT_SIZE
+            )
+        return _process_pool
+
+
+# Janela de agrupamento dos alertas de pessoa (segundos)
+coalescer.windows[EVENT_PERSON] = event_delay
+
+stream_sessions = StreamSessionManager(max_sessions=MAX_OPEN_STREAMS, idle_timeout=STREAM_IDLE_TIMEOUT)
+
+# Scheduler único de admissão: limita de fato as análises simultâneas e
+# atende alarmes antes das checagens de rotina
+camera_scheduler = AdmissionScheduler(MAX_ACTIVE_CAMERAS)
+
+# Ajusta frame skip e entrada do modelo conforme CPU, latência e câmeras ativas
+load_controller = LoadController(INPUT_SIZE, active_cameras=lambda: camera_scheduler.running)
+
+
+def _collect_runtime_metrics():
+    # Foto do estado atual, atualizada a cada scrape do /metrics
+    scheduler_stats = camera_scheduler.stats()
+    metrics.ACTIVE_CAMERAS.set(scheduler_stats["running"])
+    metrics.QUEUED_CAMERAS.set(scheduler_stats["queue_depth"])
+
+    sessions = stream_sessions.snapshot()
+    metrics.OPEN_STREAMS.set(len(sessions))
+    metrics.DECODED_FPS.clear()
+    for session in sessions:
+        reader = session.reader
+        if reader is not None:
+            # Uma série por stream e modo: a mesma câmera pode ter o extra e a principal abertos
+            stream = session.stream_db_id if session.stream_db_id is not None else ""
+            metrics.DECODED_FPS.labels(session.dguard_camera_id, session.recorder_guid, stream,
+                                       session.capture_mode).set(round(reader.fps, 2))
+
+
+metrics.registry.add_collector(_collect_runtime_metrics)
+
+# Inventário de câmeras em memória (recarregado quando a sincronização muda o banco)
+USE_CAMERA_REGISTRY = True
+camera_registry = CameraRegistry()
+if USE_CAMERA_REGISTRY:
+    camera_registry.load()
 
 # --- Carregar ZONES do arquivo JSON com keys convertidas para tupla
 with open('zones.json', 'r') as f:
     raw = json.load(f)
     ZONES = {literal_eval(k): v for k, v in raw.items()}
 
-
-def is_in_zone(center, config):
-    cx, cy = center
-
-    if config["type"] == "side":
-        (x1, y1), (x2, y2) = config["line"]
-
-        # Vetor da linha
-        dx = x2 - x1
-        dy = y2 - y1
-
-        # Vetor do ponto em relação ao ponto inicial da linha
-        dxp = cx - x1
-        dyp = cy - y1
-
-        # Produto vetorial (para saber de que lado da linha está)
-        cross = dx * dyp - dy * dxp
-
-        # Definir lado com base na direção do vetor
-        if config["side"] == "left":
-            resultado = cross > 0
-            return resultado
-        elif config["side"] == "right":
-            resultado = cross < 0
-            return resultado
-        elif config["side"] == "top":
-            resultado = cross > 0 if dy == 0 else cy < y1
-            return resultado
-        elif config["side"] == "bottom":
-            resultado = cross < 0 if dy == 0 else cy > y1
-            return resultado
-
-        print("[DEBUG] Nenhum lado válido encontrado, retornando False")
-        return False
-
-    elif config["type"] == "area":
-        polygon = np.array(config["polygon"], np.int32)
-        inside = cv2.pointPolygonTest(polygon, (cx, cy), False) >= 0
-        return inside
-
-    print("[DEBUG] Tipo desconhecido, retornando False")
-    return False
+# Zonas pré-processadas uma vez (semiplanos / máscaras) para o filtro vetorizado
+COMPILED_ZONES = compile_zones(ZONES)
+
+# Recorte da zona para inferência (só câmeras cuja zona cobre parte do frame)
+ZONE_ROIS = compile_rois(ZONES)
+
+# --- Configurações por câmera (mesmo formato de chave do zones.json)
+CAMERA_SETTINGS = {}
+if os.path.exists('camera_settings.json'):
+    with open('camera_settings.json', 'r') as f:
+        raw = json.load(f)
+        CAMERA_SETTINGS = {literal_eval(k): v for k, v in raw.items()}
+
+
+def get_camera_settings(dguard_camera_id, recorder_guid):
+    settings = dict(DEFAULT_CAMERA_SETTINGS)
+    settings.update(CAMERA_SETTINGS.get((dguard_camera_id, recorder_guid), {}))
+    return settings
+
+
+def _infer_in_process(frame, imgsz):
+    global _fallback_model
+    with _fallback_model_lock:
+        if _fallback_model is None:
+            logger.warning("[WORKERS] Frame maior que o slot de memória compartilhada: carregando modelo local")
+            _fallback_model = load_model(INFERENCE_BACKEND, MODEL_PATH, int8=INFERENCE_INT8,
+                                         calibration_dir=CALIBRATION_DIR, dynamic=INFERENCE_DYNAMIC_SHAPES)
+        # YOLO não é thread-safe: o modelo local atende um frame por vez
+        return boxes_to_arrays(_fallback_model(frame, classes=[0], conf=CONFIDENCE_THRESHOLD,
+                                               imgsz=imgsz or INPUT_SIZE, verbose=False))
+
+
+def run_inference(frame, camera_key=None, imgsz=None):
+    """Roda o YOLO (em processos, em lote ou direto) e devolve as pessoas como arrays (xyxy, conf)."""
+    # As caixas voltam nas coordenadas do frame, qualquer que seja a entrada do modelo;
+    # export estático só aceita INPUT_SIZE
+    imgsz = None if imgsz == INPUT_SIZE or STATIC_INPUT else imgsz
+    started = time.perf_counter()
+    if USE_INFERENCE_PROCESSES:
+        pool = get_process_pool()
+        if pool.fits(frame):
+            # Timeout finito: worker travado não prende a câmera nem o slot de admissão
+            try:
+                result = pool.infer(frame, camera_key, timeout=INFERENCE_TIMEOUT, imgsz=imgsz)
+            except (TimeoutError, FutureTimeoutError, RuntimeError) as e:
+                # Falha local (worker travado ou morto): perde o frame, sem evento de erro de stream no Station
+                reason = "worker" if isinstance(e, RuntimeError) else "timeout"
+                logger.error(f"[WORKERS] Inferência falhou para {camera_key}: {e}")
+                metrics.INFERENCE_FAILURES.labels(reason).inc()
+                return EMPTY_BOXES, EMPTY_CONF
+        else:
+            result = _infer_in_process(frame, imgsz)
+    elif inference_engine is not None:
+        result = boxes_to_arrays(inference_engine.infer(frame, camera_key, imgsz=imgsz))
+    else:
+        result = boxes_to_arrays(model(frame, classes=[0], conf=CONFIDENCE_THRESHOLD, imgsz=imgsz or INPUT_SIZE,
+                                       verbose=False))
+    elapsed = time.perf_counter() - started
+    load_controller.record_latency(elapsed)
+    metrics.INFERENCE_LATENCY.observe(elapsed)
+    return result
 
 
 def insert_rtsp_credentials(url_base, username, password):
@@ -107,95 +297,10 @@ def insert_rtsp_credentials(url_base, username, password):
     return urlunparse(parsed._replace(netloc=netloc))
 
 
-def get_rtsp_resolution(rtsp_url, camera_name=None, recorder_name=None):
-    cmd = [
-        "ffprobe", "-v", "error", "-select_streams", "v:0",
-        "-show_entries", "stream=width,height",
-        "-of", "json", rtsp_url
-    ]
-    try:
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    except OSError as e:
-        logger.error(f"[{camera_name} - {recorder_name}] Erro ao executar ffprobe (OSError): {e}")
-        return None
-    except Exception as e:
-        logger.error(f"[{camera_name} - {recorder_name}] Erro inesperado ao executar ffprobe: {e}")
-        return None
-
-
-    if result.returncode != 0:
-        logger.error(f"Erro ao executar ffprobe: {result.stderr.strip()}")
-        return None
-
-    try:
-        info = json.loads(result.stdout)
-        return info["streams"][0]["width"], info["streams"][0]["height"]
-    except (KeyError, IndexError, json.JSONDecodeError) as e:
-        logger.error(f"Não foi possível extrair resolução: {e}")
-        return None
-
-
-
-class FreshestFFmpegFrame(threading.Thread):
-    def __init__(self, ffmpeg_proc, width, height):
-        super().__init__()
-        self.proc = ffmpeg_proc
-        self.width = width
-        self.height = height
-        self.frame = None
-        self.lock = threading.Lock()
-        self.running = True
-        self.start()
-
-    def run(self):
-        frame_size = self.width * self.height * 3
-        while self.running:
-            raw_frame = self.proc.stdout.read(frame_size)
-            if not raw_frame:
-                break
-            if len(raw_frame) != frame_size:
-                continue  # Pula frames incompletos (geralmente no fim da transmissão)
-
-            frame = np.frombuffer(raw_frame, np.uint8).reshape((self.height, self.width, 3))
-            with self.lock:
-                self.frame = frame
-
-    def read(self):
-        with self.lock:
-            return self.frame.copy() if self.frame is not None else None
-
-    def stop(self):
-        self.running = False
-
-        if self.proc:
-            try:
-                self.proc.terminate()
-                self.proc.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                logger.warning(f"[FFMPEG] Processo não terminou a tempo. Forçando kill.")
-                self.proc.kill()
-            except Exception as e:
-                logger.error(f"[FFMPEG] Erro ao tentar parar FFmpeg: {e}")
-
-            if self.proc.stdout:
-                try:
-                    self.proc.stdout.close()
-                except Exception as e:
-                    logger.debug(f"[FFMPEG] Erro ao fechar stdout: {e}")
-            if self.proc.stderr:
-                try:
-                    self.proc.stderr.close()
-                except Exception as e:
-                    logger.debug(f"[FFMPEG] Erro ao fechar stderr: {e}")
-
-            self.proc = None
-
-        if self.is_alive():
-            self.join(timeout=5)
-
-
 class CameraThread(threading.Thread):
-    def __init__(self, rtsp_url, camera_name, camera_id, dguard_camera_id, recorder_guid, recorder_name):
+    def __init__(self, rtsp_url, camera_name, camera_id, dguard_camera_id, recorder_guid, recorder_name,
+                 stream_db_id=None, analysis_window=ANALYSIS_WINDOW, fallback_streams=(), capture_mode=None,
+                 report_errors=True):
         super().__init__()
         self.rtsp_url = rtsp_url
         self.camera_name = camera_name
@@ -203,181 +308,289 @@ class CameraThread(threading.Thread):
         self.dguard_camera_id = dguard_camera_id
         self.recorder_guid = recorder_guid
         self.recorder_name = recorder_name
+        self.stream_db_id = stream_db_id
+        # Streams ainda não tentados, na ordem da seleção: [(rtsp_url, stream_db_id)]
+        self.stream_candidates = [(rtsp_url, stream_db_id), *fallback_streams]
+        self.analysis_window = analysis_window
         self.running = True
+        # Erro de stream da análise (None sem erro); só vira evento no Station com report_errors
+        self.report_errors = report_errors
+        self.stream_error = None
         self.error_event_sent = False
+        self.settings = get_camera_settings(dguard_camera_id, recorder_guid)
+        if capture_mode:
+            self.settings["capture_mode"] = capture_mode
+
+        # Progresso acompanhado pelos jobs da API
+        self.status = CAMERA_STATUS_QUEUED
+        self.person_detected = False
+        # Fração dos frames checados que tinham movimento (None sem motion gate)
+        self.motion_ratio = None
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def adopt(self, other):
+        """Assume a configuração de outra análise da mesma câmera antes de começar a rodar."""
+        self.rtsp_url, self.stream_db_id = other.rtsp_url, other.stream_db_id
+        self.stream_candidates = list(other.stream_candidates)
+        self.analysis_window = other.analysis_window
+        self.settings = other.settings
+        self.report_errors = other.report_errors
 
     def trigger_error_event(self, reason):
-        if not self.error_event_sent:
-            logger.warning(f"[{self.camera_name} - {self.recorder_name}] Acionando evento por erro: {reason}")
-            set_event_schedule(self.dguard_camera_id, self.recorder_guid)
-            self.error_event_sent = True
+        if self.stream_error is not None:
+            return
+        self.stream_error = reason
+        if not self.report_errors:
+            # Visita de rotina (patrulha): o erro fica nas estatísticas, sem alarme no Station
+            logger.warning(f"[{self.camera_name} - {self.recorder_name}] Erro na análise de rotina: {reason}")
+            return
+        logger.warning(f"[{self.camera_name} - {self.recorder_name}] Acionando evento por erro: {reason}")
+        report_event(self.dguard_camera_id, self.recorder_guid, EVENT_STREAM_ERROR)
+        self.error_event_sent = True
 
     def run(self):
-        resolution = get_rtsp_resolution(self.rtsp_url, self.camera_name, self.recorder_name)
-        if not resolution:
-            self.trigger_error_event("Failed to get RTSP resolution")
-            return
+        self.status = CAMERA_STATUS_RUNNING
+        self.started_at = time.time()
+        try:
+            self._analyse()
+        finally:
+            self.finished_at = time.time()
+            if self.person_detected:
+                self.status = CAMERA_STATUS_DETECTED
+            elif self.stream_error is not None:
+                self.status = CAMERA_STATUS_ERROR
+            else:
+                self.status = CAMERA_STATUS_NO_DETECTION
+
+    def _acquire_next_stream(self, capture_mode):
+        """Abre o próximo stream candidato da câmera; streams que não abrem contam como falha."""
+        while self.stream_candidates:
+            rtsp_url, stream_db_id = self.stream_candidates.pop(0)
+            session = stream_sessions.acquire(
+                rtsp_url, self.camera_name, self.recorder_name, self.dguard_camera_id, self.recorder_guid,
+                capture_mode, self.settings["analysis_fps"], RESIZE_WIDTH, RESIZE_HEIGHT, stream_db_id,
+                error_listener=self.trigger_error_event
+            )
+            self.rtsp_url, self.stream_db_id = rtsp_url, stream_db_id
+            if session is not None:
+                return session
+            self._record_stream_result(False)
+            if self.stream_candidates:
+                logger.warning(f"[STREAM] {self.camera_name} ({self.recorder_name}): falha ao abrir o stream, "
+                               f"tentando o próximo")
+        return None
 
-        width, height = resolution
-        ffmpeg_cmd = [
-            "ffmpeg",
-            "-loglevel", "error",
-            "-fflags", "nobuffer",
-            "-flags", "low_delay",
-            "-rtsp_transport", "tcp",
-            "-i", self.rtsp_url,
-            "-f", "rawvideo",
-            "-pix_fmt", "bgr24",
-            "-"
-        ]
-
-        proc = subprocess.Popen(
-            ffmpeg_cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            bufsize=4096,
-            text=False
+    def _acquire_escalation_stream(self):
+        """Mesmo stream em KEYFRAME_ESCALATION_MODE, para confirmar um candidato visto no keyframe."""
+        return stream_sessions.acquire(
+            self.rtsp_url, self.camera_name, self.recorder_name, self.dguard_camera_id, self.recorder_guid,
+            KEYFRAME_ESCALATION_MODE, self.settings["analysis_fps"], RESIZE_WIDTH, RESIZE_HEIGHT, self.stream_db_id,
+            error_listener=self.trigger_error_event
         )
 
-        if proc.stdout is None or proc.stderr is None:
-            self.trigger_error_event("FFmpeg não iniciou corretamente")
+    def _record_stream_result(self, success, session=None):
+        if not USE_STREAM_SELECTION or self.stream_db_id is None:
+            return
+        decode_cost = decoded_fps = None
+        if session is not None and session.reader is not None:
+            decode_cost = session.decode_cost()
+            decoded_fps = session.reader.fps or None
+        try:
+            # Modo pedido para a análise; a confirmação após um keyframe não entra no custo
+            record_stream_result(self.stream_db_id, self.settings["capture_mode"], success, decode_cost, decoded_fps)
+        except Exception as e:
+            logger.error(f"[STREAM] Erro ao registrar estatísticas do stream de {self.camera_name}: {e}")
+
+    def _detect(self, frame, resized, roi, imgsz):
+        """Pessoas no frame, em coordenadas 640x360; com ROI roda só no recorte da zona."""
+        camera_key = (self.dguard_camera_id, self.recorder_guid)
+        if roi is None:
+            return run_inference(resized, camera_key, imgsz)
+
+        crop = roi.crop(frame)
+        xyxy, conf = run_inference(crop, camera_key, roi.imgsz(crop, imgsz))
+        return roi.to_zone_coords(xyxy, frame), conf
+
+    def _analyse(self):
+        analysis_started = time.time()
+        capture_mode = self.settings["capture_mode"]
+        base_process_every = 1 if capture_mode in SCALED_CAPTURE_MODES else PROCESS_EVERY
+        escalated = False
+        process_every, imgsz = base_process_every, INPUT_SIZE
+
+        session = self._acquire_next_stream(capture_mode)
+        if session is None:
+            self.trigger_error_event("Falha ao abrir o stream RTSP")
             return
 
-        freshest = FreshestFFmpegFrame(proc, width, height)
-
-        def log_ffmpeg_errors(stderr_pipe, camera_name, recorder_name, dguard_camera_id, recorder_guid):
-            pps_error_detected = False
-            ref_error_detected = False
-            disconnect_error_detected = False
-
-            for line in iter(stderr_pipe.readline, b''):
-                decoded_line = line.decode('utf-8', errors='ignore').strip()
+        freshest = session.reader
+        stream_opened = time.time()
+        stream_failed = False
+
+        zone = COMPILED_ZONES.get((self.dguard_camera_id, self.recorder_guid))
+        roi = ZONE_ROIS.get((self.dguard_camera_id, self.recorder_guid)) if self.settings["roi_crop"] else None
+
+        motion_gate = None
+        if self.settings["motion_gate"]:
+            motion_gate = MotionGate(
+                sensitivity=self.settings["motion_sensitivity"],
+                min_changed_ratio=self.settings["motion_min_changed_ratio"],
+                zone_config=zone if self.settings["motion_zone_only"] else None,
+                max_skip_seconds=self.settings["motion_max_skip_seconds"]
+            )
+
+        # No modo keyframe o próprio keyframe já é a amostra esparsa: sem tracking
+        tracker = IoUTracker() if self.settings["tracking"] and capture_mode != CAPTURE_MODE_KEYFRAME else None
+        keyframe_every = self.settings["tracking_keyframe_every"]
+        tracked_frames = 0
+        detector_runs = 0
+
+        frame_ref = None
+        first_frame = True
+        try:
+            # Stream pode já estar aberto: ignora frames anteriores ao acionamento
+            last_seq = freshest.latest_seq
+            last_processed_seq = -process_every
+            # Stream aberto antes desta análise: já estava aquecido
+            warm = session.opened_at is not None and session.opened_at < analysis_started
+            person_detected = False
+            last_total_detections = 0
 
-                # Tratamento PPS ausente
-                if "non-existing PPS" in decoded_line:
-                    if not pps_error_detected:
-                        logger.error(f"{camera_name} ({recorder_name}): PPS ausente no stream RTSP. Ignorando mensagens repetidas.")
-                        pps_error_detected = True
-                    continue
+            first_frame_timeout = (KEYFRAME_FIRST_FRAME_TIMEOUT if capture_mode == CAPTURE_MODE_KEYFRAME
+                                   else STREAM_FIRST_FRAME_TIMEOUT)
+            thread_start_time = time.time()
 
-                if pps_error_detected and any(x in decoded_line for x in [
-                    "decode_slice_header error",
-                    "no frame!",
-                    "Error submitting packet",
-                    "Invalid data found"
-                ]):
+            # A janela de análise só começa a contar no primeiro frame: conexão e espera pelo
+            # keyframe não consomem o dwell curto da patrulha (o prazo aqui é first_frame_timeout)
+            while self.running and (first_frame or time.time() - thread_start_time < self.analysis_window):
+                # Devolve o frame anterior ao ring e espera um frame novo (sem busy-wait)
+                freshest.release(frame_ref)
+                frame_ref = freshest.read_next(last_seq, timeout=1.0)
+
+                if frame_ref is None:
+                    if first_frame and (not freshest.is_alive()
+                                        or time.time() - stream_opened > first_frame_timeout):
+                        # Stream escolhido não entregou nenhum frame: failover para o próximo
+                        logger.warning(f"[STREAM] {self.camera_name} ({self.recorder_name}): "
+                                       f"nenhum frame em {time.time() - stream_opened:.0f}s")
+                        self._record_stream_result(False)
+                        stream_sessions.release(session, close=True, error_listener=self.trigger_error_event)
+                        session = self._acquire_next_stream(capture_mode)
+                        if session is None:
+                            self.trigger_error_event("Nenhum stream da câmera entregou frames")
+                            break
+                        freshest = session.reader
+                        last_seq = freshest.latest_seq
+                        stream_opened = time.time()
+                        continue
+                    if not freshest.is_alive():
+                        logger.warning(f"{self.camera_name} ({self.recorder_name}): stream do ffmpeg encerrado")
+                        stream_failed = True
+                        break
                     continue
 
-                # Tratamento referência de frame ausente
-                if "reference picture missing" in decoded_line or "Missing reference picture" in decoded_line:
-                    if not ref_error_detected:
-                        logger.error(f"{camera_name} ({recorder_name}): Referência de frame ausente. Ignorando mensagens repetidas.")
-                        ref_error_detected = True
-                    continue
+                last_seq = frame_ref.seq
+                frame = frame_ref.image
+                if first_frame:
+                    first_frame = False
+                    thread_start_time = time.time()
+                    metrics.TIME_TO_FIRST_FRAME.labels(str(warm).lower()).observe(time.time() - analysis_started)
 
-                if ref_error_detected and any(x in decoded_line for x in [
-                    "decode_slice_header error",
-                    "bytestream",
-                    "Missing reference picture",
-                    "no frame!",
-                    "Invalid data found"
-                ]):
-                    continue
+                if self.settings["adaptive_sampling"]:
+                    process_every, imgsz = load_controller.sampling(base_process_every, self.settings)
 
-                # Tratamento específico para desconexão remota -10054
-                if "Error number -10054" in decoded_line:
-                    if not disconnect_error_detected:
-                        logger.error(f"{camera_name} ({recorder_name}): Desconexão remota detectada (Error number -10054).")
-                        disconnect_error_detected = True
-                        set_event_schedule(dguard_camera_id, recorder_guid)
+                should_process = frame_ref.seq - last_processed_seq >= process_every
+                if not should_process and not SHOW_VIDEO:
                     continue
 
-                # Log geral para outras mensagens de erro e acionamento de evento
-                logger.error(f"{camera_name} ({recorder_name}) {decoded_line}")
-                set_event_schedule(dguard_camera_id, recorder_guid)
-
-        error_thread = threading.Thread(
-            target=log_ffmpeg_errors,
-            args=(proc.stderr, self.camera_name, self.recorder_name, self.dguard_camera_id, self.recorder_guid),
-            daemon=True
-        )
-        error_thread.start()
-
-        try:
-            frame_count = 0
-            last_sent = 0
-            person_detected = False
-            last_total_detections = 0
+                if frame.shape[1] != RESIZE_WIDTH or frame.shape[0] != RESIZE_HEIGHT:
+                    resized = cv2.resize(frame, (RESIZE_WIDTH, RESIZE_HEIGHT))
+                else:
+                    # Frame emprestado do ring: copia só se for desenhar em cima
+                    resized = frame.copy() if SHOW_VIDEO else frame
 
-            # no_frame_start = time.time()
-            # start_time = None
-            thread_start_time = time.time()
+                if not should_process:
+                    cv2.imshow(f'{self.camera_name}', resized)
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+                    continue
 
-            while self.running and (time.time() - thread_start_time < 20):
-                frame = freshest.read()
+                last_processed_seq = frame_ref.seq
+
+                if tracker is not None:
+                    # Detector só nos keyframes; entre eles os tracks são propagados sem inferência
+                    keyframe = tracked_frames % keyframe_every == 0
+                    tracked_frames += 1
+                    if keyframe and not (motion_gate and not motion_gate.should_infer(resized)):
+                        xyxy, conf = self._detect(frame, resized, roi, imgsz)
+                        tracker.update(xyxy, conf, frame_ref.timestamp)
+                        detector_runs += 1
+                    else:
+                        tracker.predict(frame_ref.timestamp)
+
+                    # Cada pessoa gera no máximo um alerta, mesmo atravessando a zona devagar
+                    for track in tracker.new_tracks_in_zone(zone):
+                        person_detected = True
+                        if report_event(self.dguard_camera_id, self.recorder_guid, EVENT_PERSON):
+                            logger.warning(f"Pessoa detectada! ({self.camera_name} - {self.recorder_name}) "
+                                           f"[track {track.id}]")
 
-                if frame is None:
-                    continue
-                # if frame is None:
-                #     if time.time() - no_frame_start > 10:
-                #         self.trigger_error_event("Sem frames válidos por 10s")
-                #         break
-                #     continue
-                # else:
-                #     if start_time is None:
-                #         start_time = time.time()
-                #     no_frame_start = time.time()
-
-                # if time.time() - start_time > 5:
-                #     break
-
-                frame_count += 1
-                resized = cv2.resize(frame, (RESIZE_WIDTH, RESIZE_HEIGHT))
-
-                if frame_count % PROCESS_EVERY != 0:
                     if SHOW_VIDEO:
+                        for track in tracker.tracks:
+                            x1, y1, x2, y2 = track.box.astype(int)
+                            cv2.rectangle(resized, (x1, y1), (x2, y2), (251, 226, 0), 5)
+                            cv2.putText(resized, f'person #{track.id}', (x1, y1 - 10),
+                                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (251, 226, 0), 2)
                         cv2.imshow(f'{self.camera_name}', resized)
                         if cv2.waitKey(1) & 0xFF == ord('q'):
                             break
                     continue
 
-                result = model(resized, classes=[0], verbose=False)
-
-                person_detected = False
-                total_detections = 0
-
-                for objects in result:
-                    for data in objects.boxes:
-                        conf = float(data.conf[0])
-                        cls_id = int(data.cls[0])
-                        label = model.names[cls_id]
-
-                        if label != 'person' or conf < CONFIDENCE_THRESHOLD:
-                            continue
-
-                        x1, y1, x2, y2 = map(int, data.xyxy[0])
-                        center = ((x1 + x2) // 2, (y1 + y2) // 2)
+                # Confirmação do candidato do keyframe não depende de movimento (pessoa parada também conta)
+                if motion_gate and not escalated and not motion_gate.should_infer(resized):
+                    continue
 
-                        zone_config = ZONES.get((self.dguard_camera_id, self.recorder_guid))
+                xyxy, conf = self._detect(frame, resized, roi, imgsz)
+                xyxy, conf = filter_detections(xyxy, conf, zone)
 
-                        if zone_config and not is_in_zone(center, zone_config):
-                            continue
+                total_detections = len(conf)
+                person_detected = total_detections > 0
 
-                        if SHOW_VIDEO:
-                            cv2.rectangle(resized, (x1, y1), (x2, y2), (251, 226, 0), 5)
-                            cv2.putText(resized, f'{label} {conf:.2f}', (x1, y1 - 10),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (251, 226, 0), 2)
-                        person_detected = True
-                        total_detections += 1
+                if SHOW_VIDEO:
+                    for (x1, y1, x2, y2), score in zip(xyxy.astype(int), conf):
+                        cv2.rectangle(resized, (x1, y1), (x2, y2), (251, 226, 0), 5)
+                        cv2.putText(resized, f'person {score:.2f}', (x1, y1 - 10),
+                                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (251, 226, 0), 2)
 
                 if total_detections != last_total_detections:
                     last_total_detections = total_detections
 
+                if person_detected and capture_mode == CAPTURE_MODE_KEYFRAME:
+                    # Candidato no keyframe: confirma no stream em taxa cheia antes de alertar
+                    escalation = self._acquire_escalation_stream()
+                    if escalation is not None:
+                        logger.info(f"[KEYFRAME] {self.camera_name} ({self.recorder_name}): pessoa no keyframe, "
+                                    f"confirmando em {KEYFRAME_ESCALATION_MODE}")
+                        freshest.release(frame_ref)
+                        frame_ref = None
+                        stream_sessions.release(session, close=not USE_PERSISTENT_STREAMS,
+                                                error_listener=self.trigger_error_event)
+                        session, freshest = escalation, escalation.reader
+                        capture_mode, escalated = KEYFRAME_ESCALATION_MODE, True
+                        last_seq = freshest.latest_seq
+                        last_processed_seq = last_seq - process_every
+                        thread_start_time = max(thread_start_time,
+                                                time.time() - self.analysis_window + KEYFRAME_ESCALATION_WINDOW)
+                        person_detected = False
+                        continue
+                    # Sem stream para confirmar: o keyframe decide sozinho
+
                 if person_detected:
-                    current_time = time.time()
-                    if current_time - last_sent >= event_delay:
+                    # Alertas repetidos da mesma câmera são agrupados no processo inteiro
+                    if report_event(self.dguard_camera_id, self.recorder_guid, EVENT_PERSON):
                         logger.warning(f"Pessoa detectada! ({self.camera_name} - {self.recorder_name})")
-                        last_sent = current_time
                     break
 
                 if SHOW_VIDEO:
@@ -385,119 +598,149 @@ class CameraThread(threading.Thread):
                     if cv2.waitKey(1) & 0xFF == ord('q'):
                         break
 
+            self.person_detected = person_detected
             status = "DETECÇÃO REALIZADA" if person_detected else "NENHUMA DETECÇÃO"
             logger.info(f"{status} para {self.camera_name} ({self.recorder_name})")
 
+            if tracker is not None:
+                logger.info(
+                    f"[TRACK] {self.camera_name} ({self.recorder_name}): detector em {detector_runs}/{tracked_frames} "
+                    f"frames, {tracker.created} pessoas rastreadas"
+                )
+
+            if motion_gate and motion_gate.checked:
+                self.motion_ratio = 1 - motion_gate.skipped / motion_gate.checked
+                logger.info(
+                    f"[MOTION] {self.camera_name} ({self.recorder_name}): "
+                    f"{motion_gate.skipped}/{motion_gate.checked} inferências puladas por falta de movimento"
+                )
+
 
         except Exception as e:
             logger.exception(f"Erro inesperado em {self.camera_name} ({self.recorder_name}): {e}")
             self.trigger_error_event("Erro inesperado na thread da câmera")
 
         finally:
-            freshest.stop()
+            freshest.release(frame_ref)
+            if session is not None and not first_frame:
+                # Custo medido só no modo configurado, sem misturar com o stream da confirmação
+                self._record_stream_result(not stream_failed, None if escalated else session)
+            stream_sessions.release(session, close=not USE_PERSISTENT_STREAMS,
+                                    error_listener=self.trigger_error_event)
             logger.info(f"[TERMINATED] Thread finalizada para {self.camera_name} ({self.recorder_name})")
 
 
-def get_selected_cameras(camera_recorder_list):
-    """
-    camera_recorder_list: list of tuples (camera_id:int, recorder_guid:str)
-    Retorna dados completos das câmeras (RTSP, nome, etc) do banco para as câmeras solicitadas.
-    """
-    conn = sqlite3.connect("database.db")
-    cursor = conn.cursor()
+# Acima disso a consulta usa uma tabela temporária em vez de uma cadeia de ORs
+SELECTION_OR_LIMIT = 20
+
 
+def _select_cameras(camera_recorder_list, stream_filter, extra_columns="", order_by=""):
     if not camera_recorder_list:
         return []
 
-    or_clauses = []
-    params = []
-    for cam_id, rec_guid in camera_recorder_list:
-        or_clauses.append("(c.camera_id = ? AND r.guid = ?)")
-        params.extend([cam_id, rec_guid])
-
-    query = f"""
-        SELECT
-            c.id,
-            c.camera_id AS dguard_camera_id,
-            c.name,
-            s.url,
-            s.username,
-            s.password,
-            r.guid,
-            r.name AS recorder_name
-        FROM cameras c
-        JOIN streams s ON s.camera_id = c.id AND s.stream_id = 0
-        JOIN recorders r ON c.recorder_id = r.id
-        WHERE {" OR ".join(or_clauses)} AND s.url != 'indisponível'
-    """
-
-    cursor.execute(query, params)
-    results = cursor.fetchall()
-    conn.close()
-    return results
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+
+        if len(camera_recorder_list) <= SELECTION_OR_LIMIT:
+            or_clauses = []
+            params = []
+            for cam_id, rec_guid in camera_recorder_list:
+                or_clauses.append("(c.camera_id = ? AND r.guid = ?)")
+                params.extend([cam_id, rec_guid])
+            selection_join = ""
+            selection_where = f"({' OR '.join(or_clauses)}) AND"
+        else:
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS selected_cameras (camera_id INTEGER, guid TEXT)")
+            cursor.execute("DELETE FROM selected_cameras")
+            cursor.executemany("INSERT INTO selected_cameras (camera_id, guid) VALUES (?, ?)", camera_recorder_list)
+            params = []
+            selection_join = "JOIN selected_cameras sel ON sel.camera_id = c.camera_id AND sel.guid = r.guid"
+            selection_where = ""
+
+        query = f"""
+            SELECT
+                c.id,
+                c.camera_id AS dguard_camera_id,
+                c.name,
+                s.url,
+                s.username,
+                s.password,
+                r.guid,
+                r.name AS recorder_name{extra_columns},
+                s.id AS stream_db_id
+            FROM cameras c
+            JOIN streams s ON s.camera_id = c.id AND {stream_filter}
+            JOIN recorders r ON c.recorder_id = r.id
+            {selection_join}
+            WHERE {selection_where} s.url != 'indisponível'
+            {order_by}
+        """
+
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    finally:
+        conn.close()
 
 
-def get_selected_cameras_with_fallback(camera_recorder_list):
-    conn = sqlite3.connect("database.db")
-    cursor = conn.cursor()
-
-    if not camera_recorder_list:
-        return []
+def get_selected_cameras(camera_recorder_list):
+    """
+    camera_recorder_list: list of tuples (camera_id:int, recorder_guid:str)
+    Retorna dados completos das câmeras (RTSP, nome, etc) do banco para as câmeras solicitadas.
+    """
+    return _select_cameras(camera_recorder_list, "s.stream_id = 0")
 
-    or_clauses = []
-    params = []
-    for cam_id, rec_guid in camera_recorder_list:
-        or_clauses.append("(c.camera_id = ? AND r.guid = ?)")
-        params.extend([cam_id, rec_guid])
 
+def get_selected_cameras_with_fallback(camera_recorder_list):
     # Buscar streams de ambas as IDs (0 e 1), e ordenar para termos sempre principal e extra
-    query = f"""
-        SELECT
-            c.id,
-            c.camera_id AS dguard_camera_id,
-            c.name,
-            s.url,
-            s.username,
-            s.password,
-            r.guid,
-            r.name AS recorder_name,
-            s.stream_id
-        FROM cameras c
-        JOIN streams s ON s.camera_id = c.id AND s.stream_id IN (0,1)
-        JOIN recorders r ON c.recorder_id = r.id
-        WHERE {" OR ".join(or_clauses)} AND s.url != 'indisponível'
-        ORDER BY c.id, s.stream_id DESC  -- Ordena para priorizar stream extra (1) antes da principal (0)
-    """
-
-    cursor.execute(query, params)
-    results = cursor.fetchall()
-    conn.close()
-    return results
+    return _select_cameras(
+        camera_recorder_list,
+        "s.stream_id IN (0,1)",
+        extra_columns=",\n                s.stream_id",
+        # Ordena para priorizar stream extra (1) antes da principal (0)
+        order_by="ORDER BY c.id, s.stream_id DESC"
+    )
 
 
 def start_monitoring_cameras(camera_recorder_list):
+    if USE_STREAM_SELECTION:
+        # Mesma escolha por custo/falhas do fluxo com fallback, na prioridade de rotina
+        return start_monitoring_cameras_with_fallback(camera_recorder_list, PRIORITY_ROUTINE)
+
     cameras = get_selected_cameras(camera_recorder_list)
     camera_threads = []
 
-    for (camera_id, dguard_camera_id, camera_name, rtsp_url, username, password, recorder_guid, recorder_name) in cameras:
+    for (camera_id, dguard_camera_id, camera_name, rtsp_url, username, password, recorder_guid, recorder_name, stream_db_id) in cameras:
         full_rtsp_url = insert_rtsp_credentials(rtsp_url, username, password)
-        cam_thread = CameraThread(full_rtsp_url, camera_name, camera_id, dguard_camera_id, recorder_guid, recorder_name)
+        cam_thread = CameraThread(full_rtsp_url, camera_name, camera_id, dguard_camera_id, recorder_guid, recorder_name,
+                                  stream_db_id)
         camera_threads.append(cam_thread)
 
-    with ThreadPoolExecutor(max_workers=MAX_ACTIVE_CAMERAS) as executor:
-        for cam_thread in camera_threads:
-            logger.info(f"Iniciando thread para câmera: {cam_thread.camera_name} ({cam_thread.recorder_name})")
-            executor.submit(cam_thread.run)
-
-    return camera_threads
+    return [camera_scheduler.submit(cam_thread, PRIORITY_ROUTINE) for cam_thread in camera_threads]
 
 
-def start_monitoring_cameras_with_fallback(camera_recorder_list):
-    cameras_raw = get_selected_cameras_with_fallback(camera_recorder_list)
+def list_inventory_cameras():
+    """(camera_id, recorder_guid) de todas as câmeras com stream principal ou extra."""
+    if USE_CAMERA_REGISTRY:
+        return [(c["dguard_camera_id"], c["recorder_guid"]) for c in camera_registry.all()]
 
+    conn = connect()
+    try:
+        return conn.execute("""
+            SELECT DISTINCT c.camera_id, r.guid
+            FROM cameras c
+            JOIN streams s ON s.camera_id = c.id
+            JOIN recorders r ON c.recorder_id = r.id
+            WHERE s.stream_id IN (0,1)
+        """).fetchall()
+    finally:
+        conn.close()
+
+
+def _group_camera_rows(cameras_raw):
     # Agrupar por câmera
     cameras_dict = {}
-    for (camera_id, dguard_camera_id, camera_name, rtsp_url, username, password, recorder_guid, recorder_name, stream_id) in cameras_raw:
+    for (camera_id, dguard_camera_id, camera_name, rtsp_url, username, password, recorder_guid, recorder_name, stream_id, stream_db_id) in cameras_raw:
         key = (camera_id, recorder_guid)
         if key not in cameras_dict:
             cameras_dict[key] = {
@@ -508,44 +751,96 @@ def start_monitoring_cameras_with_fallback(camera_recorder_list):
                 "recorder_name": recorder_name,
                 "streams": {}
             }
-        cameras_dict[key]["streams"][stream_id] = (rtsp_url, username, password)
+        cameras_dict[key]["streams"][stream_id] = (rtsp_url, username, password, stream_db_id)
+    return list(cameras_dict.values())
+
+
+def _legacy_stream_order(streams):
+    # Extra (1) antes da principal (0), sem olhar custo nem falhas
+    return [stream_id for stream_id in (1, 0) if stream_id in streams]
+
+
+def _select_stream_order(cameras, capture_mode=None):
+    """Ordem de tentativa dos streams de cada câmera: mais barato primeiro, alternativas em seguida."""
+    if not USE_STREAM_SELECTION:
+        return [_legacy_stream_order(cam_data["streams"]) for cam_data in cameras]
+
+    # Custos só se comparam dentro do mesmo modo de captura
+    modes = []
+    stream_db_ids = {}
+    for cam_data in cameras:
+        settings = get_camera_settings(cam_data["dguard_camera_id"], cam_data["recorder_guid"])
+        mode = capture_mode or settings["capture_mode"]
+        modes.append(mode)
+        stream_db_ids.setdefault(mode, []).extend(stream[-1] for stream in cam_data["streams"].values())
+    info = {}
+    for mode, ids in stream_db_ids.items():
+        try:
+            info[mode] = load_stream_selection_info(ids, mode)
+        except Exception as e:
+            logger.error(f"[STREAM] Erro ao ler estatísticas dos streams, usando ordem padrão: {e}")
+            info[mode] = {}
+
+    orders = []
+    for cam_data, mode in zip(cameras, modes):
+        streams = cam_data["streams"]
+        for rtsp_url, username, password, stream_db_id in streams.values():
+            known = info[mode].get(stream_db_id) or {}
+            if len(streams) > 1 and stream_db_id is not None and known.get("height") is None:
+                # Resolução desconhecida: ffprobe em segundo plano para a próxima seleção
+                refresh_in_background(stream_db_id, insert_rtsp_credentials(rtsp_url, username, password),
+                                      cam_data["camera_name"], cam_data["recorder_name"])
+        orders.append(rank_streams(streams, info[mode]))
+    return orders
+
+
+def start_monitoring_cameras_with_fallback(camera_recorder_list, priority=PRIORITY_ALARM,
+                                          analysis_window=ANALYSIS_WINDOW, capture_mode=None, report_errors=True):
+    if USE_CAMERA_REGISTRY:
+        # Resolução O(1) no inventário em memória, sem abrir conexão com o banco
+        cameras = camera_registry.get_many(camera_recorder_list)
+    else:
+        cameras = _group_camera_rows(get_selected_cameras_with_fallback(camera_recorder_list))
 
     # Criar instâncias de CameraThread
     camera_threads = []
     logger.info(f"Total de câmeras para iniciar: {len(camera_threads)}")
 
-    for cam_data in cameras_dict.values():
+    for cam_data, order in zip(cameras, _select_stream_order(cameras, capture_mode)):
         streams = cam_data["streams"]
-        if 1 in streams:
-            rtsp_url, username, password = streams[1]
-            logger.info(f"Usando STREAM EXTRA para {cam_data['camera_name']} ({cam_data['recorder_name']})")
-        elif 0 in streams:
-            rtsp_url, username, password = streams[0]
-            logger.info(f"Usando STREAM PRINCIPAL para {cam_data['camera_name']} ({cam_data['recorder_name']})")
-        else:
+        if not order:
             logger.warning(f"Nenhuma stream disponível para {cam_data['camera_name']} ({cam_data['recorder_name']})")
             continue
 
-        full_rtsp_url = insert_rtsp_credentials(rtsp_url, username, password)
+        candidates = []
+        for stream_id in order:
+            rtsp_url, username, password, stream_db_id = streams[stream_id]
+            candidates.append((insert_rtsp_credentials(rtsp_url, username, password), stream_db_id))
+        full_rtsp_url, stream_db_id = candidates[0]
+
+        stream_label = {0: "PRINCIPAL", 1: "EXTRA"}.get(order[0], order[0])
+        logger.info(f"Usando STREAM {stream_label} para {cam_data['camera_name']} ({cam_data['recorder_name']})"
+                    + (f" | alternativas: {order[1:]}" if order[1:] else ""))
 
         cam_thread = CameraThread(full_rtsp_url,
                                   cam_data["camera_name"],
                                   cam_data["camera_id"],
                                   cam_data["dguard_camera_id"],
                                   cam_data["recorder_guid"],
-                                  cam_data["recorder_name"])
+                                  cam_data["recorder_name"],
+                                  stream_db_id,
+                                  analysis_window,
+                                  candidates[1:],
+                                  capture_mode,
+                                  report_errors)
 
         camera_threads.append(cam_thread)
 
-    with ThreadPoolExecutor(max_workers=MAX_ACTIVE_CAMERAS) as executor:
-        total_cameras = len(camera_threads)
-        active_limit = min(MAX_ACTIVE_CAMERAS, total_cameras)
-        queue_size = total_cameras - active_limit
-
-        logger.info(f"[STATUS] Câmeras ativas: {active_limit} / {total_cameras} | Em fila: {queue_size}")
+    # Câmera já na fila não entra de novo: devolve a thread que vai rodar
+    camera_threads = [camera_scheduler.submit(cam_thread, priority) for cam_thread in camera_threads]
 
-        for cam_thread in camera_threads:
-            logger.info(f"Iniciando thread para câmera: {cam_thread.camera_name} ({cam_thread.recorder_name})")
-            executor.submit(cam_thread.start)
+    stats = camera_scheduler.stats()
+    logger.info(f"[STATUS] Câmeras ativas: {stats['running']} / {stats['max_concurrent']} | "
+                f"Em fila: {stats['queue_depth']} | Espera média: {stats['avg_wait_s']:.1f}s")
 
-    return camera_threads
\ No newline at end of file
+    return camera_threads
@@ -0,0 +1,278 @@
+"""
+Análise em lote de vídeos exportados do NVR, bem mais rápida que tempo real.
+
+Cada vídeo é dividido em trechos de --chunk-seconds que vão para um pool de
+processos; cada processo decodifica o seu trecho com o ffmpeg (seek direto no
+início do trecho e um frame a cada --stride segundos já em 640x360), roda o
+YOLO em lotes e aplica a zona da câmera do zones.json. O resultado é uma linha
+do tempo compacta: um segmento por intervalo contínuo com pessoa.
+
+Uso:
+    python -m offline.batch_analysis --videos export/cam13_*.mp4 --camera-id 13 \\
+        --recorder-guid "{978018FB-04D8-4B0A-B923-68072B0E575B}" --output timeline.csv
+    python -m offline.batch_analysis --manifest videos.json --workers 6 --stride 0.5 --output timeline.parquet
+
+Manifesto (JSON): lista de {"path", "camera_id", "recorder_guid", "start_time"
+opcional em ISO 8601 para converter os segmentos em horário real}.
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from detection.postprocess import boxes_to_arrays, filter_detections
+from detection.zones import CompiledZone, load_zones
+
+ANALYSIS_WIDTH = 640
+ANALYSIS_HEIGHT = 360
+CONFIDENCE_THRESHOLD = 0.5
+CHUNK_SECONDS = 300
+STRIDE_SECONDS = 1.0
+INFERENCE_BATCH = 8
+CALIBRATION_DIR = "models/calibration"  # frames das câmeras para o export INT8
+SEGMENT_GAP = 3.0  # segundos sem pessoa que ainda contam como o mesmo segmento
+
+TIMELINE_COLUMNS = [
+    "path", "camera_id", "recorder_guid", "start_s", "end_s", "start_time", "end_time",
+    "frames", "max_persons", "max_conf",
+]
+
+# Estado de cada processo do pool (modelo carregado uma vez por processo)
+_worker = {}
+
+
+def probe_duration(path):
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", path]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe falhou para {path}: {result.stderr.strip()}")
+    return float(json.loads(result.stdout)["format"]["duration"])
+
+
+def build_decode_cmd(path, start, length, stride, keyframes_only=False):
+    cmd = ["ffmpeg", "-loglevel", "error"]
+    if keyframes_only:
+        # Decodifica só keyframes: muito mais rápido, resolução temporal = GOP
+        cmd += ["-skip_frame", "nokey"]
+    # -ss antes do -i: seek pelo índice do container, sem decodificar o começo
+    cmd += [
+        "-ss", f"{start:.3f}", "-t", f"{length:.3f}", "-i", path, "-an",
+        "-vf", f"fps=1/{stride},scale={ANALYSIS_WIDTH}:{ANALYSIS_HEIGHT}",
+        "-f", "rawvideo", "-pix_fmt", "bgr24", "-",
+    ]
+    return cmd
+
+
+def _init_worker(backend, model_path, int8, calibration_dir, torch_threads, zones_path, conf, imgsz):
+    import torch
+    from inference.backends import load_model, model_batch_limit
+
+    torch.set_num_threads(torch_threads)
+    _worker["model"] = load_model(backend, model_path, int8=int8, calibration_dir=calibration_dir, imgsz=imgsz)
+    _worker["model_batch"] = model_batch_limit(backend)
+    _worker["zones"] = load_zones(zones_path) if os.path.exists(zones_path) else {}
+    _worker["predict"] = dict(classes=[0], conf=conf, imgsz=imgsz, verbose=False)
+
+
+def _detect(frames, zone):
+    # Export estático de ONNX/OpenVINO tem lote fixo: chama o modelo em pedaços
+    step = _worker["model_batch"] or len(frames)
+    results = []
+    for start in range(0, len(frames), step):
+        results += _worker["model"](frames[start:start + step], **_worker["predict"])
+    detections = []
+    for result in results:
+        xyxy, conf = filter_detections(*boxes_to_arrays(result), zone)
+        detections.append((len(conf), float(conf.max()) if len(conf) else 0.0))
+    return detections
+
+
+def analyse_chunk(task):
+    """Roda no processo do pool: devolve [(segundo no vídeo, pessoas, maior confiança)] só dos frames com pessoa."""
+    path, camera_key, start, length, stride, batch_size, keyframes_only = task
+    config = _worker["zones"].get(camera_key)
+    zone = CompiledZone(config) if config else None
+
+    frame_size = ANALYSIS_WIDTH * ANALYSIS_HEIGHT * 3
+    # stderr em arquivo: um pipe cheio travaria o ffmpeg enquanto lemos o stdout
+    stderr = tempfile.TemporaryFile()
+    proc = subprocess.Popen(build_decode_cmd(path, start, length, stride, keyframes_only),
+                            stdout=subprocess.PIPE, stderr=stderr, bufsize=frame_size)
+    hits = []
+    frames, timestamps = [], []
+    index = 0
+    started = time.perf_counter()
+    try:
+        while True:
+            data = proc.stdout.read(frame_size)
+            if len(data) < frame_size:
+                break
+            frames.append(np.frombuffer(data, np.uint8).reshape(ANALYSIS_HEIGHT, ANALYSIS_WIDTH, 3))
+            timestamps.append(start + index * stride)
+            index += 1
+            if len(frames) == batch_size:
+                hits += [(t, n, c) for t, (n, c) in zip(timestamps, _detect(frames, zone)) if n]
+                frames, timestamps = [], []
+        if frames:
+            hits += [(t, n, c) for t, (n, c) in zip(timestamps, _detect(frames, zone)) if n]
+    finally:
+        proc.stdout.close()
+        proc.wait()
+        stderr.seek(0)
+        messages = stderr.read().decode("utf-8", errors="ignore").strip().splitlines()
+        stderr.close()
+
+    # Decodificação que falhou não pode passar por trecho limpo sem pessoa
+    error = None
+    if proc.returncode != 0:
+        error = f"ffmpeg saiu com código {proc.returncode}: {messages[-1] if messages else 'sem mensagem'}"
+    return {"path": path, "start": start, "frames": index, "hits": hits, "seconds": time.perf_counter() - started,
+            "error": error}
+
+
+def build_segments(hits, stride, gap=SEGMENT_GAP):
+    """Junta frames com pessoa separados por até `gap` segundos num único segmento."""
+    segments = []
+    for timestamp, persons, conf in sorted(hits):
+        if segments and timestamp - segments[-1]["end_s"] <= max(gap, stride):
+            segment = segments[-1]
+            segment["end_s"] = timestamp
+            segment["frames"] += 1
+            segment["max_persons"] = max(segment["max_persons"], persons)
+            segment["max_conf"] = max(segment["max_conf"], conf)
+        else:
+            segments.append({"start_s": timestamp, "end_s": timestamp, "frames": 1,
+                             "max_persons": persons, "max_conf": conf})
+    return segments
+
+
+def load_jobs(args):
+    if args.manifest:
+        with open(args.manifest, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    else:
+        if args.camera_id is None or not args.recorder_guid:
+            raise SystemExit("Informe --camera-id e --recorder-guid (ou use --manifest)")
+        paths = [path for pattern in args.videos for path in sorted(glob.glob(pattern))]
+        entries = [{"path": path, "camera_id": args.camera_id, "recorder_guid": args.recorder_guid,
+                    "start_time": args.start_time} for path in paths]
+
+    missing = [entry["path"] for entry in entries if not os.path.exists(entry["path"])]
+    if missing:
+        raise SystemExit(f"Vídeos não encontrados: {missing}")
+    return entries
+
+
+def write_timeline(rows, output):
+    if output.endswith(".parquet"):
+        try:
+            import pandas as pd
+        except ImportError:
+            raise SystemExit("Saída em Parquet precisa do pandas (e pyarrow); use .csv")
+        pd.DataFrame(rows, columns=TIMELINE_COLUMNS).to_parquet(output, index=False)
+        return
+
+    with open(output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=TIMELINE_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detecção de pessoas em lote sobre vídeos exportados")
+    parser.add_argument("--videos", nargs="*", default=[], help="Arquivos de vídeo (aceita glob)")
+    parser.add_argument("--camera-id", type=int, default=None, help="camera_id do zones.json para --videos")
+    parser.add_argument("--recorder-guid", default=None)
+    parser.add_argument("--start-time", default=None, help="Horário real do início dos vídeos (ISO 8601)")
+    parser.add_argument("--manifest", default=None, help="JSON com path, camera_id, recorder_guid, start_time")
+    parser.add_argument("--output", default="timeline.csv", help=".csv ou .parquet")
+    parser.add_argument("--seek", type=float, default=0.0, help="Ignora os primeiros N segundos de cada vídeo")
+    parser.add_argument("--duration", type=float, default=None, help="Analisa no máximo N segundos por vídeo")
+    parser.add_argument("--stride", type=float, default=STRIDE_SECONDS, help="Segundos entre frames analisados")
+    parser.add_argument("--keyframes-only", action="store_true", help="Decodifica só keyframes")
+    parser.add_argument("--chunk-seconds", type=float, default=CHUNK_SECONDS)
+    parser.add_argument("--gap", type=float, default=SEGMENT_GAP, help="Segundos sem pessoa dentro de um segmento")
+    parser.add_argument("--workers", type=int, default=None, help="Processos (padrão: núcleos / --torch-threads)")
+    parser.add_argument("--torch-threads", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=INFERENCE_BATCH)
+    parser.add_argument("--conf", type=float, default=CONFIDENCE_THRESHOLD)
+    parser.add_argument("--backend", default="pytorch")
+    parser.add_argument("--int8", action="store_true")
+    parser.add_argument("--calibration", default=CALIBRATION_DIR, help="Frames para calibrar o export INT8")
+    parser.add_argument("--model", default="models/yolov8n.pt")
+    parser.add_argument("--zones", default="zones.json")
+    args = parser.parse_args()
+
+    from inference.backends import INPUT_SIZE
+
+    entries = load_jobs(args)
+    tasks = []
+    media_seconds = 0.0
+    for entry in entries:
+        duration = probe_duration(entry["path"])
+        end = duration if args.duration is None else min(duration, args.seek + args.duration)
+        media_seconds += max(0.0, end - args.seek)
+        camera_key = (entry["camera_id"], entry["recorder_guid"])
+        start = args.seek
+        while start < end:
+            length = min(args.chunk_seconds, end - start)
+            tasks.append((entry["path"], camera_key, start, length, args.stride, args.batch, args.keyframes_only))
+            start += length
+
+    workers = args.workers or max(1, (os.cpu_count() or 1) // args.torch_threads)
+    print(f"{len(entries)} vídeos, {media_seconds / 3600:.2f}h de gravação em {len(tasks)} trechos, "
+          f"{workers} processos")
+
+    hits_by_path = {entry["path"]: [] for entry in entries}
+    failed = []
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(args.backend, args.model, args.int8, args.calibration, args.torch_threads,
+                                       args.zones, args.conf, INPUT_SIZE)) as pool:
+        futures = [pool.submit(analyse_chunk, task) for task in tasks]
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            hits_by_path[result["path"]] += result["hits"]
+            line = (f"  [{done}/{len(tasks)}] {os.path.basename(result['path'])} @ {result['start']:.0f}s: "
+                    f"{result['frames']} frames em {result['seconds']:.1f}s, {len(result['hits'])} com pessoa")
+            if result["error"]:
+                failed.append(result)
+                line += f" | FALHOU: {result['error']}"
+            print(line)
+    elapsed = time.time() - started
+
+    rows = []
+    for entry in entries:
+        base_time = datetime.fromisoformat(entry["start_time"]) if entry.get("start_time") else None
+        for segment in build_segments(hits_by_path[entry["path"]], args.stride, args.gap):
+            rows.append({
+                "path": entry["path"],
+                "camera_id": entry["camera_id"],
+                "recorder_guid": entry["recorder_guid"],
+                **segment,
+                "max_conf": round(segment["max_conf"], 3),
+                "start_time": (base_time + timedelta(seconds=segment["start_s"])).isoformat() if base_time else "",
+                "end_time": (base_time + timedelta(seconds=segment["end_s"])).isoformat() if base_time else "",
+            })
+
+    write_timeline(rows, args.output)
+    speedup = media_seconds / elapsed if elapsed else 0.0
+    print(f"\n✅ {len(rows)} segmentos com pessoa gravados em {args.output} | "
+          f"{elapsed:.0f}s para {media_seconds:.0f}s de vídeo ({speedup:.1f}x tempo real)")
+    if failed:
+        # Trechos sem análise: a linha do tempo tem buracos nesses intervalos
+        print(f"⚠️ {len(failed)} trecho(s) com falha na decodificação:")
+        for result in sorted(failed, key=lambda r: (r["path"], r["start"])):
+            print(f"  {result['path']} @ {result['start']:.0f}s: {result['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 2.0     # segundos entre leituras de carga
+CPU_HIGH = 85.0           # % de CPU considerada saturação
+CPU_LOW = 60.0
+LATENCY_HIGH = 0.2        # segundos por inferência (incluindo fila do lote)
+LATENCY_LOW = 0.1
+STEP_UP_AFTER = 2         # leituras saturadas seguidas para degradar um nível
+STEP_DOWN_AFTER = 5       # leituras folgadas seguidas para voltar um nível
+
+# Níveis de degradação: (multiplicador do frame skip, escala da entrada do modelo)
+LEVELS = [
+    (1, 1.0),
+    (2, 1.0),
+    (2, 0.75),
+    (3, 0.75),
+    (4, 0.5),
+]
+
+
+def scale_imgsz(imgsz, scale, stride=32):
+    """Escala (altura, largura) da entrada do modelo mantendo múltiplos do stride."""
+    return tuple(max(stride, int(round(side * scale / stride)) * stride) for side in imgsz)
+
+
+class LoadController:
+    """
+    Observa CPU (psutil), latência de inferência e câmeras ativas e ajusta um
+    nível global de degradação: sob saturação aumenta o frame skip e reduz a
+    entrada do modelo; com folga volta aos valores normais. Cada câmera
+    aplica o nível dentro dos próprios limites (max_process_every,
+    min_inference_width) em sampling().
+    """
+
+    def __init__(self, base_imgsz, active_cameras=None, sample_interval=SAMPLE_INTERVAL):
+        self.base_imgsz = tuple(base_imgsz)
+        self.active_cameras = active_cameras or (lambda: 0)
+        self.sample_interval = sample_interval
+        self.level = 0
+        self.cpu = 0.0
+        self.latency = 0.0
+        self.active = 0
+        self.saturated_samples = 0
+        self.relaxed_samples = 0
+
+        self.lock = threading.Lock()
+        self.latency_total = 0.0
+        self.latency_count = 0
+
+        psutil.cpu_percent(interval=None)  # primeira leitura só inicializa o contador
+        self.thread = threading.Thread(target=self._loop, daemon=True, name="LoadController")
+        self.thread.start()
+
+    def record_latency(self, seconds):
+        with self.lock:
+            self.latency_total += seconds
+            self.latency_count += 1
+
+    def sampling(self, base_process_every, settings):
+        """(process_every, imgsz) para a câmera no nível de carga atual."""
+        skip_factor, scale = LEVELS[self.level]
+        process_every = min(base_process_every * skip_factor, max(base_process_every, settings["max_process_every"]))
+
+        imgsz = scale_imgsz(self.base_imgsz, scale)
+        if imgsz[1] < settings["min_inference_width"]:
+            imgsz = scale_imgsz(self.base_imgsz, min(1.0, settings["min_inference_width"] / self.base_imgsz[1]))
+        return process_every, imgsz
+
+    def _loop(self):
+        while True:
+            time.sleep(self.sample_interval)
+            try:
+                self._sample()
+            except Exception as e:
+                logger.exception(f"[LOAD] Erro ao medir carga: {e}")
+
+    def _sample(self):
+        self.cpu = psutil.cpu_percent(interval=None)
+        with self.lock:
+            if self.latency_count:
+                self.latency = self.latency_total / self.latency_count
+            self.latency_total = 0.0
+            self.latency_count = 0
+        self.active = self.active_cameras()
+
+        if self.active == 0:
+            # Sem câmeras em análise não há backlog: volta ao normal
+            self.saturated_samples = self.relaxed_samples = 0
+            self._set_level(0)
+            return
+
+        if self.cpu >= CPU_HIGH or self.latency >= LATENCY_HIGH:
+            self.saturated_samples += 1
+            self.relaxed_samples = 0
+            if self.saturated_samples >= STEP_UP_AFTER:
+                self.saturated_samples = 0
+                self._set_level(min(self.level + 1, len(LEVELS) - 1))
+        elif self.cpu < CPU_LOW and self.latency < LATENCY_LOW:
+            self.relaxed_samples += 1
+            self.saturated_samples = 0
+            if self.relaxed_samples >= STEP_DOWN_AFTER:
+                self.relaxed_samples = 0
+                self._set_level(max(self.level - 1, 0))
+        else:
+            self.saturated_samples = self.relaxed_samples = 0
+
+    def _set_level(self, level):
+        if level == self.level:
+            return
+        skip_factor, scale = LEVELS[level]
+        logger.info(
+            f"[LOAD] Nível {self.level} -> {level} (CPU {self.cpu:.0f}%, inferência {1000 * self.latency:.0f}ms, "
+            f"{self.active} câmeras ativas): frame skip x{skip_factor}, entrada {scale_imgsz(self.base_imgsz, scale)}"
+        )
+        self.level = level
+
+    def stats(self):
+        skip_factor, scale = LEVELS[self.level]
+        return {
+            "level": self.level,
+            "cpu_percent": self.cpu,
+            "avg_inference_ms": 1000 * self.latency,
+            "active_cameras": self.active,
+            "process_every_factor": skip_factor,
+            "imgsz": scale_imgsz(self.base_imgsz, scale),
+        }
@@ -0,0 +1,134 @@
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+from runtime.metrics import ADMISSION_WAIT
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_ALARM = 0      # acionamentos vindos do VMS
+PRIORITY_ROUTINE = 10   # checagens de rotina / patrulha
+PRIORITIES = {"alarm": PRIORITY_ALARM, "routine": PRIORITY_ROUTINE}
+
+# A cada AGING_SECONDS na fila a prioridade efetiva melhora um nível (evita starvation)
+AGING_SECONDS = 5
+WAIT_SAMPLES = 500
+
+
+class _Entry:
+    __slots__ = ("priority", "seq", "enqueued_at", "key", "task")
+
+    def __init__(self, priority, seq, key, task):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.key = key
+        self.task = task
+
+    def effective_priority(self, now):
+        return self.priority - (now - self.enqueued_at) / AGING_SECONDS
+
+
+class AdmissionScheduler:
+    """
+    Scheduler único do processo para análises de câmera: no máximo
+    max_concurrent CameraThreads rodando ao mesmo tempo, fila por prioridade
+    (alarme antes de rotina), FIFO entre iguais e envelhecimento para que
+    rotinas não fiquem esperando para sempre. A mesma câmera não entra duas
+    vezes na fila.
+    """
+
+    def __init__(self, max_concurrent=10):
+        self.max_concurrent = max_concurrent
+        self.cond = threading.Condition()
+        self.queue = []
+        self.queued_keys = {}
+        self.sequence = itertools.count()
+        self.running = 0
+        self.started = 0
+        self.finished = 0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+        self.stopping = False
+
+        self.workers = [
+            threading.Thread(target=self._worker_loop, daemon=True, name=f"CameraWorker-{index}")
+            for index in range(max_concurrent)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, cam_thread, priority=PRIORITY_ROUTINE):
+        """Enfileira a análise. Retorna a CameraThread que vai rodar (a já enfileirada, se for a mesma câmera)."""
+        key = (cam_thread.dguard_camera_id, cam_thread.recorder_guid)
+        with self.cond:
+            existing = self.queued_keys.get(key)
+            if existing is not None:
+                if priority < existing.priority:
+                    # Pedido mais urgente (alarme sobre visita de rotina): a análise enfileirada
+                    # passa a rodar com a configuração dele (modo de captura, janela, erros)
+                    existing.task.adopt(cam_thread)
+                    existing.priority = priority
+                return existing.task
+
+            entry = _Entry(priority, next(self.sequence), key, cam_thread)
+            self.queue.append(entry)
+            self.queued_keys[key] = entry
+            self.cond.notify()
+            return cam_thread
+
+    def _pop_locked(self):
+        now = time.monotonic()
+        best = min(self.queue, key=lambda e: (e.effective_priority(now), e.seq))
+        self.queue.remove(best)
+        del self.queued_keys[best.key]
+        return best
+
+    def _worker_loop(self):
+        while True:
+            with self.cond:
+                while not self.queue and not self.stopping:
+                    self.cond.wait()
+                if self.stopping:
+                    return
+                entry = self._pop_locked()
+                wait = time.monotonic() - entry.enqueued_at
+                self.waits.append(wait)
+                ADMISSION_WAIT.observe(wait)
+                self.running += 1
+                self.started += 1
+
+            cam_thread = entry.task
+            logger.info(f"Iniciando análise da câmera: {cam_thread.camera_name} ({cam_thread.recorder_name}) "
+                        f"após {wait:.1f}s na fila")
+            try:
+                cam_thread.run()
+            except Exception as e:
+                logger.exception(f"Erro ao executar análise de {cam_thread.camera_name}: {e}")
+            finally:
+                with self.cond:
+                    self.running -= 1
+                    self.finished += 1
+
+    def stats(self):
+        with self.cond:
+            waits = list(self.waits)
+            by_priority = {}
+            for entry in self.queue:
+                by_priority[entry.priority] = by_priority.get(entry.priority, 0) + 1
+            return {
+                "max_concurrent": self.max_concurrent,
+                "running": self.running,
+                "queue_depth": len(self.queue),
+                "queue_by_priority": by_priority,
+                "started": self.started,
+                "finished": self.finished,
+                "avg_wait_s": sum(waits) / len(waits) if waits else 0.0,
+                "max_wait_s": max(waits) if waits else 0.0,
+            }
+
+    def stop(self):
+        with self.cond:
+            self.stopping = True
+            self.cond.notify_all()
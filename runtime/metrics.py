@@ -0,0 +1,251 @@
+import bisect
+import math
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+FIRST_FRAME_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0)
+HTTP_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WAIT_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.children = {}
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        values = tuple(str(v) for v in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: esperado labels {self.labelnames}, recebido {values}")
+        with self.lock:
+            child = self.children.get(values)
+            if child is None:
+                child = self.children[values] = self._new_child()
+            return child
+
+    def remove(self, *values):
+        with self.lock:
+            self.children.pop(tuple(str(v) for v in values), None)
+
+    def clear(self):
+        with self.lock:
+            self.children.clear()
+
+    def _default(self):
+        # Métrica sem labels funciona direto: COUNTER.inc()
+        return self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            children = list(self.children.items())
+        for values, child in children:
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value):
+        self._default().set(value)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count", "lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def _render_child(self, values, child):
+        with child.lock:
+            counts = list(child.counts)
+            total, count = child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, values, [("le", _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Registro mínimo no formato texto do Prometheus. Coletores registrados com
+    add_collector() rodam a cada scrape para atualizar gauges que são só uma
+    foto do estado atual (streams abertos, fila de câmeras).
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        with self.lock:
+            self.collectors.append(collector)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics)
+            collectors = list(self.collectors)
+        for collector in collectors:
+            collector()
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def counter(name, documentation, labelnames=()):
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return registry.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+CAMERA_LABELS = ("camera_id", "recorder")
+
+FRAMES_DECODED = counter("detection_frames_decoded_total", "Frames decodificados pelo ffmpeg", CAMERA_LABELS)
+FRAMES_DROPPED = counter("detection_frames_dropped_total",
+                         "Frames decodificados que a análise não leu (sobrescritos ou sem slot livre no ring)",
+                         CAMERA_LABELS)
+DECODED_FPS = gauge("detection_decoded_fps", "FPS decodificado nos streams abertos",
+                    CAMERA_LABELS + ("stream", "mode"))
+OPEN_STREAMS = gauge("detection_open_streams", "Streams ffmpeg abertos")
+FFMPEG_STARTS = counter("detection_ffmpeg_starts_total", "Processos ffmpeg iniciados", CAMERA_LABELS)
+FFMPEG_RESTARTS = counter("detection_ffmpeg_restarts_total",
+                          "Streams reabertos porque o ffmpeg anterior morreu", CAMERA_LABELS)
+FFMPEG_ERRORS = counter("detection_ffmpeg_errors_total", "Erros reportados pelo ffmpeg", CAMERA_LABELS)
+TIME_TO_FIRST_FRAME = histogram("detection_time_to_first_frame_seconds",
+                                "Tempo do início da análise até o primeiro frame", ("warm",), FIRST_FRAME_BUCKETS)
+
+MOTION_GATE_CHECKED = counter("detection_motion_gate_checked_total", "Frames avaliados pelo motion gate")
+MOTION_GATE_SKIPPED = counter("detection_motion_gate_skipped_total",
+                              "Frames sem movimento que não foram para a inferência")
+INFERENCE_LATENCY = histogram("detection_inference_latency_seconds",
+                              "Latência de inferência por frame, incluindo fila do lote")
+INFERENCE_FAILURES = counter("detection_inference_failures_total",
+                             "Inferências perdidas por timeout ou worker morto", ("reason",))
+
+PATROL_ERRORS = counter("detection_patrol_errors_total",
+                        "Visitas da patrulha encerradas por erro de stream (sem evento no Station)", CAMERA_LABELS)
+ACTIVE_CAMERAS = gauge("detection_active_cameras", "Câmeras em análise")
+QUEUED_CAMERAS = gauge("detection_queued_cameras", "Câmeras esperando no scheduler de admissão")
+ADMISSION_WAIT = histogram("detection_admission_wait_seconds",
+                           "Espera na fila do scheduler de admissão", buckets=WAIT_BUCKETS)
+
+EVENTS_EMITTED = counter("detection_events_emitted_total",
+                         "Acionamentos emitidos (primeiro da janela de agrupamento)", ("kind",))
+EVENTS_SUPPRESSED = counter("detection_events_suppressed_total",
+                            "Acionamentos agrupados num evento já emitido", ("kind",))
+STATION_REQUEST_LATENCY = histogram("detection_station_request_seconds",
+                                    "Latência das chamadas à API do Station", ("method", "operation"), HTTP_BUCKETS)
+STATION_REQUEST_FAILURES = counter("detection_station_request_failures_total",
+                                   "Chamadas à API do Station com erro ou status inesperado", ("method", "operation"))
+
+
+def render():
+    return registry.render()
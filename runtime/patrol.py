@@ -0,0 +1,223 @@
+import logging
+import threading
+import time
+
+from runtime.admission import PRIORITY_ROUTINE
+from runtime.metrics import PATROL_ERRORS
+
+logger = logging.getLogger(__name__)
+
+PATROL_BUDGET = 5          # câmeras da patrulha em análise/fila ao mesmo tempo
+PATROL_TICK = 1.0          # segundos entre rodadas do agendador
+INVENTORY_REFRESH = 60     # segundos entre releituras do inventário
+
+# Tempo de análise por visita (segundos)
+DWELL_MIN = 5
+DWELL_BASE = 10
+DWELL_MAX = 20
+
+# Intervalo alvo entre visitas da mesma câmera (segundos)
+REVISIT_MIN = 30
+REVISIT_BASE = 120
+REVISIT_MAX = 900
+
+HIGH_MOTION_RATIO = 0.3    # fração de frames com movimento que conta como câmera "agitada"
+REVISIT_EWMA_ALPHA = 0.3
+
+
+class CameraPatrolState:
+    def __init__(self, key, now):
+        self.key = key
+        self.dwell = DWELL_BASE
+        self.revisit_target = REVISIT_BASE
+        self.next_due = now
+        self.thread = None
+        self.visits = 0
+        self.detections = 0
+        self.errors = 0
+        self.motion_ratio = None
+        self.last_started = None
+        self.revisit_last = None
+        self.revisit_avg = None
+        self.visit_duration_avg = None
+
+    def finish_visit(self, thread, now):
+        started = thread.started_at or now
+        finished = thread.finished_at or now
+        self.visits += 1
+        self.motion_ratio = thread.motion_ratio
+
+        # Intervalo realmente alcançado entre o início de duas visitas
+        if self.last_started is not None:
+            self.revisit_last = started - self.last_started
+            self.revisit_avg = self.revisit_last if self.revisit_avg is None else (
+                REVISIT_EWMA_ALPHA * self.revisit_last + (1 - REVISIT_EWMA_ALPHA) * self.revisit_avg
+            )
+        self.last_started = started
+
+        duration = finished - started
+        self.visit_duration_avg = duration if self.visit_duration_avg is None else (
+            REVISIT_EWMA_ALPHA * duration + (1 - REVISIT_EWMA_ALPHA) * self.visit_duration_avg
+        )
+
+        if thread.person_detected:
+            # Detecção recente: volta logo e olha por mais tempo
+            self.detections += 1
+            self.revisit_target = REVISIT_MIN
+            self.dwell = DWELL_MAX
+        elif thread.stream_error is not None:
+            self.errors += 1
+            PATROL_ERRORS.labels(*self.key).inc()
+            self.revisit_target = min(REVISIT_MAX, self.revisit_target * 2)
+            self.dwell = DWELL_BASE
+        elif self.motion_ratio is not None and self.motion_ratio >= HIGH_MOTION_RATIO:
+            self.revisit_target = max(REVISIT_MIN, self.revisit_target * 0.5)
+            self.dwell = min(DWELL_MAX, self.dwell * 1.5)
+        else:
+            # Câmera quieta: espaça as visitas e encurta a análise
+            self.revisit_target = min(REVISIT_MAX, self.revisit_target * 1.25)
+            self.dwell = max(DWELL_MIN, self.dwell * 0.8)
+
+        self.next_due = finished + self.revisit_target
+        self.thread = None
+
+    def to_dict(self, now):
+        camera_id, recorder_guid = self.key
+        return {
+            "camera_id": camera_id,
+            "recorder_guid": recorder_guid,
+            "in_progress": self.thread is not None,
+            "visits": self.visits,
+            "detections": self.detections,
+            "errors": self.errors,
+            "dwell_s": round(self.dwell, 1),
+            "target_revisit_s": round(self.revisit_target, 1),
+            "achieved_revisit_last_s": None if self.revisit_last is None else round(self.revisit_last, 1),
+            "achieved_revisit_avg_s": None if self.revisit_avg is None else round(self.revisit_avg, 1),
+            "motion_ratio": self.motion_ratio,
+            "overdue_s": round(max(0.0, now - self.next_due), 1) if self.thread is None else 0.0,
+        }
+
+
+class PatrolScheduler:
+    """
+    Patrulha contínua: percorre o inventário (ou um subconjunto) enviando
+    CameraThreads com prioridade de rotina ao scheduler de admissão, com no
+    máximo `budget` câmeras da patrulha em andamento. O intervalo entre
+    visitas e o tempo de análise se adaptam a detecções e movimento, e o
+    intervalo realmente alcançado fica em stats() para dimensionar hardware.
+    """
+
+    def __init__(self, start_cameras, list_cameras, budget=PATROL_BUDGET, tick=PATROL_TICK):
+        self.start_cameras = start_cameras
+        self.list_cameras = list_cameras
+        self.budget = budget
+        self.tick = tick
+        self.lock = threading.Lock()
+        self.states = {}
+        self.subset = None
+        self.started_at = None
+        self.last_inventory_refresh = 0.0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, cameras=None, budget=None):
+        """Inicia a patrulha; `cameras` limita a uma lista de (camera_id, recorder_guid)."""
+        with self.lock:
+            if budget:
+                self.budget = budget
+            self.subset = {tuple(key) for key in cameras} if cameras else None
+            self.last_inventory_refresh = 0.0
+            if self.running:
+                return False
+            self.stop_event.clear()
+            self.started_at = time.time()
+            self.thread = threading.Thread(target=self._loop, daemon=True, name="Patrol")
+            self.thread.start()
+        logger.info(f"[PATROL] Patrulha iniciada (orçamento: {self.budget} câmeras simultâneas)")
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+        logger.info("[PATROL] Patrulha interrompida")
+
+    def _refresh_inventory(self, now):
+        keys = {tuple(key) for key in self.list_cameras()}
+        if self.subset is not None:
+            keys &= self.subset
+
+        with self.lock:
+            for key in keys - self.states.keys():
+                self.states[key] = CameraPatrolState(key, now)
+            for key in self.states.keys() - keys:
+                if self.states[key].thread is None:
+                    del self.states[key]
+        self.last_inventory_refresh = now
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            now = time.time()
+            try:
+                if now - self.last_inventory_refresh >= INVENTORY_REFRESH:
+                    self._refresh_inventory(now)
+                self._schedule(now)
+            except Exception as e:
+                logger.exception(f"[PATROL] Erro no agendamento da patrulha: {e}")
+            self.stop_event.wait(self.tick)
+
+    def _schedule(self, now):
+        with self.lock:
+            in_flight = 0
+            for state in self.states.values():
+                if state.thread is not None:
+                    if state.thread.finished_at is not None:
+                        state.finish_visit(state.thread, now)
+                    else:
+                        in_flight += 1
+
+            free = self.budget - in_flight
+            if free <= 0:
+                return
+            # Mais atrasadas primeiro
+            due = sorted(
+                (s for s in self.states.values() if s.thread is None and s.next_due <= now),
+                key=lambda s: s.next_due
+            )[:free]
+
+        for state in due:
+            threads = self.start_cameras([state.key], PRIORITY_ROUTINE, state.dwell)
+            with self.lock:
+                if threads:
+                    state.thread = threads[0]
+                else:
+                    # Sem stream disponível no inventário: tenta bem mais tarde
+                    state.next_due = now + REVISIT_MAX
+
+    def stats(self):
+        now = time.time()
+        with self.lock:
+            cameras = [state.to_dict(now) for state in self.states.values()]
+            durations = [s.visit_duration_avg for s in self.states.values() if s.visit_duration_avg is not None]
+            budget = self.budget
+
+        achieved = [c["achieved_revisit_avg_s"] for c in cameras if c["achieved_revisit_avg_s"] is not None]
+        visit_duration = sum(durations) / len(durations) if durations else None
+        return {
+            "running": self.running,
+            "started_at": self.started_at,
+            "budget": budget,
+            "cameras": len(cameras),
+            "cameras_visited": sum(1 for c in cameras if c["visits"]),
+            "in_progress": sum(1 for c in cameras if c["in_progress"]),
+            "overdue": sum(1 for c in cameras if c["overdue_s"] > 0),
+            "avg_visit_duration_s": None if visit_duration is None else round(visit_duration, 1),
+            # Menor intervalo possível para cobrir todas as câmeras com o orçamento atual
+            "min_full_coverage_s": None if visit_duration is None else round(len(cameras) * visit_duration / budget, 1),
+            "achieved_revisit_avg_s": round(sum(achieved) / len(achieved), 1) if achieved else None,
+            "achieved_revisit_max_s": max(achieved) if achieved else None,
+            "per_camera": cameras,
+        }
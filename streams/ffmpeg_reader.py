@@ -0,0 +1,354 @@
+import json
+import logging
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+from events.coalescer import EVENT_STREAM_ERROR, report_event
+from runtime.metrics import FFMPEG_ERRORS, FRAMES_DECODED, FRAMES_DROPPED
+
+logger = logging.getLogger(__name__)
+
+# Modos de captura:
+#   "full"   -> ffmpeg entrega a resolução original e o resize é feito em Python (comportamento antigo)
+#   "scaled" -> ffmpeg já entrega a resolução de análise e descarta frames até analysis_fps
+#   "keyframe" -> decoder só decodifica keyframes (-skip_frame nokey), já na resolução de análise:
+#                 um frame por GOP, fração do custo de decodificação, para checagens rápidas
+CAPTURE_MODE_FULL = "full"
+CAPTURE_MODE_SCALED = "scaled"
+CAPTURE_MODE_KEYFRAME = "keyframe"
+CAPTURE_MODES = (CAPTURE_MODE_FULL, CAPTURE_MODE_SCALED, CAPTURE_MODE_KEYFRAME)
+# Modos em que o ffmpeg já entrega frames na resolução de análise
+SCALED_CAPTURE_MODES = (CAPTURE_MODE_SCALED, CAPTURE_MODE_KEYFRAME)
+
+
+def _parse_fps(rate):
+    try:
+        num, den = rate.split("/")
+        return float(num) / float(den) if float(den) else None
+    except (AttributeError, ValueError):
+        return None
+
+
+def probe_stream(rtsp_url, camera_name=None, recorder_name=None, timeout=None):
+    cmd = [
+        "ffprobe", "-v", "error", "-rtsp_transport", "tcp", "-select_streams", "v:0",
+        "-show_entries", "stream=width,height,codec_name,avg_frame_rate,r_frame_rate",
+        "-of", "json", rtsp_url
+    ]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logger.error(f"[{camera_name} - {recorder_name}] ffprobe não respondeu em {timeout}s")
+        return None
+    except OSError as e:
+        logger.error(f"[{camera_name} - {recorder_name}] Erro ao executar ffprobe (OSError): {e}")
+        return None
+    except Exception as e:
+        logger.error(f"[{camera_name} - {recorder_name}] Erro inesperado ao executar ffprobe: {e}")
+        return None
+
+    if result.returncode != 0:
+        logger.error(f"Erro ao executar ffprobe: {result.stderr.strip()}")
+        return None
+
+    try:
+        info = json.loads(result.stdout)
+        stream = info["streams"][0]
+        return {
+            "width": stream["width"],
+            "height": stream["height"],
+            "codec": stream.get("codec_name"),
+            "fps": _parse_fps(stream.get("avg_frame_rate")) or _parse_fps(stream.get("r_frame_rate")),
+        }
+    except (KeyError, IndexError, json.JSONDecodeError) as e:
+        logger.error(f"Não foi possível extrair resolução: {e}")
+        return None
+
+
+def get_rtsp_resolution(rtsp_url, camera_name=None, recorder_name=None, timeout=None):
+    info = probe_stream(rtsp_url, camera_name, recorder_name, timeout)
+    if not info:
+        return None
+    return info["width"], info["height"]
+
+
+def build_ffmpeg_cmd(rtsp_url, capture_mode=CAPTURE_MODE_FULL, analysis_fps=5, width=640, height=360,
+                     full_size=None):
+    """
+    full_size: (largura, altura) que o leitor espera no modo "full". Com a
+    resolução vinda do cache, força a saída nesse tamanho: se a câmera mudar
+    de resolução o frame é redimensionado em vez de desalinhar o pipe.
+    """
+    cmd = [
+        "ffmpeg",
+        "-loglevel", "error",
+        "-fflags", "nobuffer",
+        "-flags", "low_delay",
+    ]
+
+    if capture_mode == CAPTURE_MODE_KEYFRAME:
+        # Opção de entrada: o decoder descarta P/B-frames sem decodificá-los
+        cmd += ["-skip_frame", "nokey"]
+
+    cmd += [
+        "-rtsp_transport", "tcp",
+        "-i", rtsp_url,
+        "-an",
+    ]
+
+    if capture_mode == CAPTURE_MODE_SCALED:
+        # Reduz taxa e resolução no próprio ffmpeg para não trafegar pixels descartados
+        cmd += ["-vf", f"fps={analysis_fps},scale={width}:{height}"]
+    elif capture_mode == CAPTURE_MODE_KEYFRAME:
+        # Um frame por keyframe: sem passthrough o ffmpeg duplicaria frames até a taxa nominal
+        cmd += ["-vf", f"scale={width}:{height}", "-vsync", "passthrough"]
+    elif full_size:
+        cmd += ["-vf", f"scale={full_size[0]}:{full_size[1]}"]
+
+    cmd += [
+        "-f", "rawvideo",
+        "-pix_fmt", "bgr24",
+        "-"
+    ]
+    return cmd
+
+
+class FrameRef:
+    """Frame emprestado do ring buffer; devolva com FreshestFFmpegFrame.release()."""
+    __slots__ = ("seq", "timestamp", "image", "slot")
+
+    def __init__(self, seq, timestamp, image, slot):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.image = image
+        self.slot = slot
+
+
+class FreshestFFmpegFrame(threading.Thread):
+    """
+    Lê o stdout do ffmpeg direto para um ring de buffers pré-alocados (readinto),
+    sem alocar um bytes novo por frame. Cada frame recebe um número de sequência
+    e o horário de captura; read_next() bloqueia até existir um frame mais novo
+    e entrega uma view emprestada do buffer, sem cópia. Frames perdidos (ring
+    todo emprestado) ficam em `dropped`; sobrescritos antes da leitura, em `overwritten`.
+    """
+
+    def __init__(self, ffmpeg_proc, width, height, ring_size=4, metrics_labels=None):
+        super().__init__()
+        self.proc = ffmpeg_proc
+        self.width = width
+        self.height = height
+        self.frame_size = width * height * 3
+        self.buffers = [np.empty((height, width, 3), np.uint8) for _ in range(ring_size)]
+        self.borrowed = [0] * ring_size
+        self.scratch = np.empty((height, width, 3), np.uint8)
+        self.latest_slot = None
+        self.latest_seq = 0
+        self.latest_timestamp = None
+        self.dropped = 0       # ring todo emprestado: frame nem chegou a ser publicado
+        self.overwritten = 0   # publicados e sobrescritos antes de algum read_next()
+        # Intervalo médio entre frames decodificados (EWMA), para o FPS real do stream
+        self.frame_interval = None
+        self.last_frame_at = None
+        self.frames_metric = FRAMES_DECODED.labels(*metrics_labels) if metrics_labels else None
+        self.dropped_metric = FRAMES_DROPPED.labels(*metrics_labels) if metrics_labels else None
+        self.cond = threading.Condition()
+        self.running = True
+        self.start()
+
+    def _read_exact(self, buffer):
+        view = memoryview(buffer).cast("B")
+        filled = 0
+        while filled < self.frame_size:
+            n = self.proc.stdout.readinto(view[filled:])
+            if not n:
+                return filled
+            filled += n
+        return filled
+
+    def _free_slot(self):
+        for offset in range(1, len(self.buffers) + 1):
+            slot = ((self.latest_slot or 0) + offset) % len(self.buffers)
+            if slot != self.latest_slot and not self.borrowed[slot]:
+                return slot
+        return None
+
+    def run(self):
+        try:
+            while self.running:
+                with self.cond:
+                    slot = self._free_slot()
+
+                # Todos os buffers emprestados: consome o frame do pipe e descarta
+                target = self.buffers[slot] if slot is not None else self.scratch
+                if self._read_exact(target) != self.frame_size:
+                    break  # Fim da transmissão ou frame incompleto
+
+                self._track_frame()
+                if slot is None:
+                    self.dropped += 1
+                    if self.dropped_metric:
+                        self.dropped_metric.inc()
+                    continue
+
+                with self.cond:
+                    self.latest_slot = slot
+                    self.latest_seq += 1
+                    self.latest_timestamp = time.time()
+                    self.cond.notify_all()
+        except (ValueError, OSError):
+            pass  # stdout fechado durante stop()
+        finally:
+            with self.cond:
+                self.running = False
+                self.cond.notify_all()
+
+    def _track_frame(self):
+        now = time.monotonic()
+        if self.last_frame_at is not None:
+            interval = now - self.last_frame_at
+            self.frame_interval = interval if self.frame_interval is None else (
+                0.9 * self.frame_interval + 0.1 * interval
+            )
+        self.last_frame_at = now
+        if self.frames_metric:
+            self.frames_metric.inc()
+
+    @property
+    def fps(self):
+        if not self.frame_interval or not self.running:
+            return 0.0
+        return 1.0 / self.frame_interval
+
+    def read_next(self, after_seq=0, timeout=None):
+        """
+        Espera um frame com sequência maior que after_seq. Retorna um FrameRef
+        (view sem cópia, válida até release()) ou None em timeout/fim do stream.
+        """
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.latest_seq > after_seq or not self.running, timeout):
+                return None
+            if self.latest_seq <= after_seq:
+                return None
+            if after_seq:
+                # Frames sobrescritos no ring antes de o consumidor ler: a perda que importa para capacidade
+                skipped = self.latest_seq - after_seq - 1
+                if skipped > 0:
+                    self.overwritten += skipped
+                    if self.dropped_metric:
+                        self.dropped_metric.inc(skipped)
+            slot = self.latest_slot
+            self.borrowed[slot] += 1
+            return FrameRef(self.latest_seq, self.latest_timestamp, self.buffers[slot], slot)
+
+    def release(self, frame_ref):
+        if frame_ref is None:
+            return
+        with self.cond:
+            self.borrowed[frame_ref.slot] -= 1
+
+    def read(self):
+        with self.cond:
+            if self.latest_slot is None:
+                return None
+            return self.buffers[self.latest_slot].copy()
+
+    def stop(self):
+        self.running = False
+
+        if self.proc:
+            try:
+                self.proc.terminate()
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                logger.warning(f"[FFMPEG] Processo não terminou a tempo. Forçando kill.")
+                self.proc.kill()
+            except Exception as e:
+                logger.error(f"[FFMPEG] Erro ao tentar parar FFmpeg: {e}")
+
+            if self.proc.stdout:
+                try:
+                    self.proc.stdout.close()
+                except Exception as e:
+                    logger.debug(f"[FFMPEG] Erro ao fechar stdout: {e}")
+            if self.proc.stderr:
+                try:
+                    self.proc.stderr.close()
+                except Exception as e:
+                    logger.debug(f"[FFMPEG] Erro ao fechar stderr: {e}")
+
+            self.proc = None
+
+        if self.is_alive():
+            self.join(timeout=5)
+
+
+def log_ffmpeg_errors(stderr_pipe, camera_name, recorder_name, dguard_camera_id, recorder_guid, on_error=None):
+    """
+    Filtra o stderr do ffmpeg. Erros relevantes vão para on_error(motivo) quando
+    informado (a sessão repassa às análises anexadas); sem on_error, viram
+    evento de erro de stream direto no Station.
+    """
+    errors_metric = FFMPEG_ERRORS.labels(dguard_camera_id, recorder_guid)
+
+    def stream_error(reason):
+        if on_error is not None:
+            on_error(reason)
+        else:
+            report_event(dguard_camera_id, recorder_guid, EVENT_STREAM_ERROR)
+    pps_error_detected = False
+    ref_error_detected = False
+    disconnect_error_detected = False
+
+    for line in iter(stderr_pipe.readline, b''):
+        decoded_line = line.decode('utf-8', errors='ignore').strip()
+
+        # Tratamento PPS ausente
+        if "non-existing PPS" in decoded_line:
+            if not pps_error_detected:
+                logger.error(f"{camera_name} ({recorder_name}): PPS ausente no stream RTSP. Ignorando mensagens repetidas.")
+                errors_metric.inc()
+                pps_error_detected = True
+            continue
+
+        if pps_error_detected and any(x in decoded_line for x in [
+            "decode_slice_header error",
+            "no frame!",
+            "Error submitting packet",
+            "Invalid data found"
+        ]):
+            continue
+
+        # Tratamento referência de frame ausente
+        if "reference picture missing" in decoded_line or "Missing reference picture" in decoded_line:
+            if not ref_error_detected:
+                logger.error(f"{camera_name} ({recorder_name}): Referência de frame ausente. Ignorando mensagens repetidas.")
+                errors_metric.inc()
+                ref_error_detected = True
+            continue
+
+        if ref_error_detected and any(x in decoded_line for x in [
+            "decode_slice_header error",
+            "bytestream",
+            "Missing reference picture",
+            "no frame!",
+            "Invalid data found"
+        ]):
+            continue
+
+        # Tratamento específico para desconexão remota -10054
+        if "Error number -10054" in decoded_line:
+            if not disconnect_error_detected:
+                logger.error(f"{camera_name} ({recorder_name}): Desconexão remota detectada (Error number -10054).")
+                disconnect_error_detected = True
+                errors_metric.inc()
+                stream_error("Desconexão remota do stream (ffmpeg)")
+            continue
+
+        # Log geral para outras mensagens de erro e acionamento de evento
+        logger.error(f"{camera_name} ({recorder_name}) {decoded_line}")
+        errors_metric.inc()
+        stream_error(f"Erro do ffmpeg: {decoded_line}")
@@ -0,0 +1,61 @@
+import math
+import random
+import time
+
+MIN_DETECTION_HEIGHT = 360  # abaixo disso o frame é ampliado para a análise 640x360
+MAX_FAILURE_RATE = 0.5      # média móvel de falhas acima disso: stream vai para o fim da fila
+FAILURE_RETRY_AFTER = 3600  # segundos desde a última falha até o stream voltar a concorrer
+LEGACY_PREFERENCE = (1, 0)  # sem histórico: extra antes da principal, como antes
+EXPLORATION_RATE = 0.1      # chance de testar primeiro um stream ainda sem custo medido
+
+
+def _legacy_rank(stream_id):
+    if stream_id in LEGACY_PREFERENCE:
+        return LEGACY_PREFERENCE.index(stream_id)
+    return len(LEGACY_PREFERENCE) + stream_id
+
+
+def rank_streams(streams, info, min_height=MIN_DETECTION_HEIGHT, max_failure_rate=MAX_FAILURE_RATE,
+                 retry_after=FAILURE_RETRY_AFTER, exploration_rate=EXPLORATION_RATE):
+    """
+    Ordena os streams de uma câmera (stream_id -> (url, usuário, senha,
+    stream_db_id)) do mais barato ao mais caro entre os que atendem à
+    resolução mínima; os demais vêm depois como alternativas de failover.
+
+    Custo: CPU do ffmpeg por segundo de stream (decode_cost) quando todos os
+    candidatos já foram medidos; senão pixels por segundo da metadata. Streams
+    com falhas recentes ficam por último (até retry_after segundos depois da
+    última falha, quando voltam a ser testados), e streams sem informação nenhuma
+    mantêm a ordem antiga (extra, depois principal).
+
+    Como o custo medido só vale com todos os candidatos medidos, em uma fração
+    exploration_rate dos acionamentos um stream saudável ainda sem medição vai
+    para a frente; sem isso o perdedor da estimativa nunca seria medido.
+    """
+    entries = [(stream_id, info.get(stream_db_id) or {}) for stream_id, (*_, stream_db_id) in streams.items()]
+    measured = bool(entries) and all(stats.get("decode_cost") is not None for _, stats in entries)
+
+    now = time.time()
+    ranked = []
+    unmeasured = set()
+    for stream_id, stats in entries:
+        width, height = stats.get("width"), stats.get("height")
+        if measured:
+            cost = stats["decode_cost"]
+        elif width and height:
+            cost = width * height * (stats.get("fps") or 1)
+        else:
+            cost = math.inf
+        unreliable = (stats.get("failure_rate", 0.0) > max_failure_rate
+                      and now - (stats.get("last_failure_at") or 0) < retry_after)
+        below_min = height is not None and height < min_height
+        ranked.append(((unreliable, below_min, cost, _legacy_rank(stream_id)), stream_id))
+        if stats.get("decode_cost") is None and not unreliable and not below_min:
+            unmeasured.add(stream_id)
+
+    order = [stream_id for _, stream_id in sorted(ranked)]
+    if not measured and unmeasured and random.random() < exploration_rate:
+        explore = next(stream_id for stream_id in order if stream_id in unmeasured)
+        order.remove(explore)
+        order.insert(0, explore)
+    return order
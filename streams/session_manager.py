@@ -0,0 +1,293 @@
+import logging
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+
+import psutil
+
+from db.stream_metadata import PROBE_TIMEOUT, get_stream_metadata, invalidate_stream_metadata
+from runtime.metrics import FFMPEG_RESTARTS, FFMPEG_STARTS
+from streams.ffmpeg_reader import (
+    SCALED_CAPTURE_MODES,
+    FreshestFFmpegFrame,
+    build_ffmpeg_cmd,
+    get_rtsp_resolution,
+    log_ffmpeg_errors,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class StreamSession:
+    """
+    Pipeline ffmpeg aberto para uma câmera. Várias análises podem se anexar ao
+    mesmo stream já aquecido em vez de abrir uma nova conexão RTSP.
+    """
+
+    def __init__(self, key, rtsp_url, camera_name, recorder_name, dguard_camera_id, recorder_guid,
+                 capture_mode, analysis_fps, analysis_width, analysis_height, stream_db_id=None):
+        self.key = key
+        self.stream_db_id = stream_db_id
+        self.rtsp_url = rtsp_url
+        self.camera_name = camera_name
+        self.recorder_name = recorder_name
+        self.dguard_camera_id = dguard_camera_id
+        self.recorder_guid = recorder_guid
+        self.capture_mode = capture_mode
+        self.analysis_fps = analysis_fps
+        self.analysis_width = analysis_width
+        self.analysis_height = analysis_height
+
+        self.width = None
+        self.height = None
+        self.reader = None
+        self.opened_at = None
+        self.last_used = time.time()
+        self.refcount = 0
+        self.ready = threading.Event()
+        # Análises anexadas que recebem os erros do stderr do ffmpeg
+        self.error_listeners = []
+        self.listeners_lock = threading.Lock()
+
+    def open(self):
+        try:
+            return self._open()
+        finally:
+            self.ready.set()
+
+    def _open(self):
+        if self.capture_mode in SCALED_CAPTURE_MODES:
+            # Resolução já é conhecida, não precisa do ffprobe
+            self.width, self.height = self.analysis_width, self.analysis_height
+        else:
+            if self.stream_db_id is not None:
+                # Metadata em cache no database.db evita um handshake RTSP extra
+                metadata = get_stream_metadata(self.stream_db_id, self.rtsp_url, self.camera_name, self.recorder_name)
+                resolution = (metadata["width"], metadata["height"]) if metadata else None
+            else:
+                resolution = get_rtsp_resolution(self.rtsp_url, self.camera_name, self.recorder_name,
+                                                 timeout=PROBE_TIMEOUT)
+            if not resolution:
+                logger.error(f"[SESSION] {self.camera_name} ({self.recorder_name}): falha ao obter resolução RTSP")
+                return False
+            self.width, self.height = resolution
+
+        ffmpeg_cmd = build_ffmpeg_cmd(self.rtsp_url, self.capture_mode, self.analysis_fps,
+                                      self.analysis_width, self.analysis_height,
+                                      full_size=(self.width, self.height))
+
+        try:
+            proc = subprocess.Popen(
+                ffmpeg_cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=4096,
+                text=False
+            )
+        except OSError as e:
+            logger.error(f"[SESSION] {self.camera_name} ({self.recorder_name}): erro ao iniciar ffmpeg: {e}")
+            return False
+
+        if proc.stdout is None or proc.stderr is None:
+            logger.error(f"[SESSION] {self.camera_name} ({self.recorder_name}): FFmpeg não iniciou corretamente")
+            proc.kill()
+            return False
+
+        self.reader = FreshestFFmpegFrame(proc, self.width, self.height,
+                                          metrics_labels=(self.dguard_camera_id, self.recorder_guid))
+        FFMPEG_STARTS.labels(self.dguard_camera_id, self.recorder_guid).inc()
+
+        threading.Thread(
+            target=log_ffmpeg_errors,
+            args=(proc.stderr, self.camera_name, self.recorder_name, self.dguard_camera_id, self.recorder_guid,
+                  self._stream_error),
+            daemon=True
+        ).start()
+
+        self.opened_at = time.time()
+        logger.info(f"[SESSION] Stream aberto para {self.camera_name} ({self.recorder_name}) [{self.capture_mode}]")
+        return True
+
+    def add_error_listener(self, listener):
+        with self.listeners_lock:
+            self.error_listeners.append(listener)
+
+    def remove_error_listener(self, listener):
+        with self.listeners_lock:
+            if listener in self.error_listeners:
+                self.error_listeners.remove(listener)
+
+    def _stream_error(self, reason):
+        # Cada análise decide se o erro vira evento (patrulha não alarma); stream ocioso só loga
+        with self.listeners_lock:
+            listeners = list(self.error_listeners)
+        for listener in listeners:
+            listener(reason)
+
+    def is_alive(self):
+        return self.reader is not None and self.reader.is_alive()
+
+    def decode_cost(self):
+        """CPU do ffmpeg (segundos por segundo de stream) desde a abertura; None se não der para medir."""
+        if self.reader is None or self.reader.proc is None or self.opened_at is None:
+            return None
+        elapsed = time.time() - self.opened_at
+        if elapsed <= 0:
+            return None
+        try:
+            cpu = psutil.Process(self.reader.proc.pid).cpu_times()
+        except psutil.Error:
+            return None
+        return (cpu.user + cpu.system) / elapsed
+
+    def close(self):
+        if self.reader is not None:
+            if self.stream_db_id is not None and not self.reader.is_alive() and self.reader.latest_seq == 0:
+                # Nenhum frame chegou: a resolução em cache pode estar errada
+                try:
+                    invalidate_stream_metadata(self.stream_db_id)
+                except Exception as e:
+                    logger.error(f"[SESSION] Erro ao invalidar metadata de {self.camera_name}: {e}")
+            self.reader.stop()
+            self.reader = None
+            logger.info(f"[SESSION] Stream fechado para {self.camera_name} ({self.recorder_name})")
+
+
+class StreamSessionManager:
+    """
+    Mantém os streams abertos por câmera entre análises, com timeout de
+    ociosidade e despejo LRU quando o limite global de streams é atingido.
+    """
+
+    # Subclasses trocam a origem dos frames (ex.: arquivos no replay_benchmark)
+    session_class = StreamSession
+
+    def __init__(self, max_sessions=20, idle_timeout=120, reap_interval=5):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.running = True
+
+        self.reaper = threading.Thread(target=self._reap_loop, daemon=True, name="StreamSessionReaper")
+        self.reaper.start()
+
+    def acquire(self, rtsp_url, camera_name, recorder_name, dguard_camera_id, recorder_guid,
+                capture_mode, analysis_fps, analysis_width, analysis_height, stream_db_id=None,
+                error_listener=None):
+        key = (dguard_camera_id, recorder_guid, rtsp_url, capture_mode, analysis_fps)
+        to_close = []
+
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is not None and (not session.ready.is_set() or session.is_alive()):
+                session.refcount += 1
+                session.last_used = time.time()
+                self.sessions.move_to_end(key)
+                reuse = True
+            else:
+                reuse = False
+                if session is not None:
+                    # Stream morreu (queda de conexão etc.): descarta e abre de novo
+                    del self.sessions[key]
+                    to_close.append(session)
+                    FFMPEG_RESTARTS.labels(dguard_camera_id, recorder_guid).inc()
+
+                session = self.session_class(key, rtsp_url, camera_name, recorder_name, dguard_camera_id,
+                                             recorder_guid, capture_mode, analysis_fps, analysis_width,
+                                             analysis_height, stream_db_id)
+                session.refcount = 1
+                self.sessions[key] = session
+            if error_listener is not None:
+                session.add_error_listener(error_listener)
+                to_close.extend(self._evict_locked())
+
+        if reuse:
+            # Outra análise pode estar abrindo este stream agora; espera ficar pronto
+            session.ready.wait()
+            if not session.is_alive():
+                self.release(session, error_listener=error_listener)
+                return None
+            logger.info(f"[SESSION] Reutilizando stream aquecido de {camera_name} ({recorder_name})")
+            return session
+
+        for old in to_close:
+            old.close()
+
+        # Abre fora do lock: ffprobe/ffmpeg podem demorar
+        if not session.open():
+            with self.lock:
+                if self.sessions.get(key) is session:
+                    del self.sessions[key]
+            session.close()
+            return None
+        return session
+
+    def release(self, session, close=False, error_listener=None):
+        if session is None:
+            return
+        if error_listener is not None:
+            session.remove_error_listener(error_listener)
+        with self.lock:
+            session.refcount -= 1
+            session.last_used = time.time()
+            if close and session.refcount <= 0 and self.sessions.get(session.key) is session:
+                del self.sessions[session.key]
+            else:
+                close = False
+        if close:
+            session.close()
+
+    def _evict_locked(self):
+        evicted = []
+        if len(self.sessions) <= self.max_sessions:
+            return evicted
+
+        # Mais antigos primeiro (LRU); só fecha streams sem análise anexada
+        for key, session in list(self.sessions.items()):
+            if len(self.sessions) <= self.max_sessions:
+                break
+            if session.refcount <= 0:
+                del self.sessions[key]
+                evicted.append(session)
+
+        if len(self.sessions) > self.max_sessions:
+            logger.warning(f"[SESSION] Limite de {self.max_sessions} streams excedido: "
+                           f"{len(self.sessions)} streams em uso simultâneo")
+        return evicted
+
+    def _reap_loop(self):
+        while self.running:
+            time.sleep(self.reap_interval)
+            now = time.time()
+            idle = []
+            with self.lock:
+                for key, session in list(self.sessions.items()):
+                    if session.refcount > 0:
+                        continue
+                    if now - session.last_used >= self.idle_timeout or (session.reader and not session.is_alive()):
+                        del self.sessions[key]
+                        idle.append(session)
+            for session in idle:
+                session.close()
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.sessions.values())
+
+    def stats(self):
+        with self.lock:
+            return {
+                "open_sessions": len(self.sessions),
+                "attached_sessions": sum(1 for s in self.sessions.values() if s.refcount > 0),
+            }
+
+    def close_all(self):
+        self.running = False
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for session in sessions:
+            session.close()